@@ -0,0 +1,61 @@
+import argparse
+import json
+import sys
+
+
+def index_stages(results):
+    """
+    :param results: the harness's results
+    :return: dict of (scale, task_id or 'chain') -> measurements
+    """
+    stages = {}
+    for scale in results['scales']:
+        for stage in scale['stages']:
+            stages[(scale['scale'], stage['task_id'])] = stage
+        stages[(scale['scale'], 'chain')] = scale['chain']
+    return stages
+
+
+def compare(baseline, current, threshold=0.1, min_seconds=0.05):
+    """
+    Compares the median time and peak memory of each stage of two benchmark results
+    :param baseline: the baseline's results, e.g. from the target branch
+    :param current: the results to check
+    :param threshold: how much slower or larger, as a fraction, counts as a regression
+    :param min_seconds: stages faster than this in both are too noisy to compare
+    :return: tuple of report lines and regression lines
+    """
+    before, after = index_stages(baseline), index_stages(current)
+    lines, regressions = [], []
+    for key in sorted(set(before) & set(after), key=lambda key: (key[0], key[1] != 'chain', key[1])):
+        old, new = before[key], after[key]
+        time_ratio = new['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        memory_ratio = new['peak_rss_bytes'] / old['peak_rss_bytes'] if old['peak_rss_bytes'] else float('inf')
+        line = f"{key[0]}x {key[1]:<32} {old['seconds']:9.3f}s -> {new['seconds']:9.3f}s ({time_ratio - 1:+.1%})  " \
+               f"peak RSS {old['peak_rss_bytes'] / 2 ** 20:8.1f} -> {new['peak_rss_bytes'] / 2 ** 20:8.1f} MiB"
+        lines.append(line)
+        if max(old['seconds'], new['seconds']) >= min_seconds and time_ratio > 1 + threshold:
+            regressions.append(line)
+        elif memory_ratio > 1 + threshold:
+            regressions.append(line)
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares two benchmark results, failing on regressions")
+    parser.add_argument('baseline')
+    parser.add_argument('current')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fraction slower or larger that counts as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as baseline_file, open(args.current) as current_file:
+        lines, regressions = compare(json.load(baseline_file), json.load(current_file), args.threshold)
+    print('\n'.join(lines))
+    if regressions:
+        print(f"\n{len(regressions)} regressions:\n" + '\n'.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+import argparse
+import json
+import os
+import random
+import string
+from datetime import datetime, timedelta
+
+# The shape of 1x, roughly that of the udacity-dend sample: a month of events from about a hundred users listening to
+# a catalog of a thousand songs. Scale factors multiply every count but the number of days, so each day's partition
+# grows with the scale just as it would in production.
+BASE_SCALE = {
+    'songs': 1000,
+    'artists': 700,
+    'users': 100,
+    'events': 8000,
+}
+# Page weights of the sample's events; about four in five are NextSong
+PAGES = [('NextSong', 80), ('Home', 7), ('Login', 2), ('Logout', 2), ('Settings', 1), ('Help', 1), ('About', 1),
+         ('Upgrade', 1), ('Downgrade', 1), ('Save Settings', 1), ('Error', 1), ('Submit Downgrade', 1),
+         ('Submit Upgrade', 1)]
+# A share of the visits to these pages are made logged out. As in the sample, those events have an empty userId and no
+# user details, which a typed staging COPY would reject before the NextSong filter drops them.
+LOGGED_OUT_PAGES = {'Home', 'Login', 'About', 'Help'}
+LOGGED_OUT_SHARE = 0.3
+LOCATIONS = ['San Francisco-Oakland-Hayward, CA', 'Atlanta-Sandy Springs-Roswell, GA', 'Lansing-East Lansing, MI',
+             'Chicago-Naperville-Elgin, IL-IN-WI', 'New York-Newark-Jersey City, NY-NJ-PA',
+             'Portland-South Portland, ME', 'Houston-The Woodlands-Sugar Land, TX', 'Seattle-Tacoma-Bellevue, WA',
+             'Tampa-St. Petersburg-Clearwater, FL']
+USER_AGENTS = [
+    '"Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/36.0.1985.143 Safari/537.36"',
+    '"Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_4) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/36.0.1985.125 '
+    'Safari/537.36"',
+    'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:31.0) Gecko/20100101 Firefox/31.0',
+    '"Mozilla/5.0 (iPhone; CPU iPhone OS 7_1_2 like Mac OS X) AppleWebKit/537.51.2 (KHTML, like Gecko) Version/7.0 '
+    'Mobile/11D257 Safari/9537.53"',
+]
+WORDS = ['love', 'night', 'fire', 'heart', 'rain', 'dance', 'city', 'blue', 'dream', 'road', 'gold', 'river', 'light',
+         'shadow', 'summer', 'ghost', 'stone', 'wild', 'home', 'star', 'echo', 'falling', 'midnight', 'electric',
+         'velvet', 'paper', 'silver', 'ocean', 'thunder', 'garden', 'mirror', 'highway']
+EPOCH = datetime(1970, 1, 1)
+# The events columns in events_stage order, as in log_json_path.json
+EVENT_FIELDS = ['artist', 'auth', 'firstName', 'gender', 'itemInSession', 'lastName', 'length', 'level', 'location',
+                'method', 'page', 'registration', 'sessionId', 'song', 'status', 'ts', 'userAgent', 'userId']
+
+
+class SparkifyDataGenerator:
+    """
+    Generates Sparkify-shaped song_data and log_data JSON, laid out as in the udacity-dend bucket: one document per song
+    under song_data/A/B/C/, and one newline-delimited file of events per day under log_data/{year}/{month}/, plus the
+    log_json_path.json JSONPaths file for the events.
+
+    Everything is derived from the `seed`, so a scale and seed always produce byte-identical objects. Songs, users and
+    events are drawn from independent streams, so changing e.g. the number of days leaves the catalog unchanged.
+
+    `match_rate` is the share of NextSong events that are plays of a catalog song, with the catalog's exact title,
+    artist name and duration; the rest are plays of songs missing from the catalog, as most of the sample's are. Plays
+    are skewed towards a few popular songs and artists. The counts the pipeline should arrive at are kept in `stats` as
+    objects are generated.
+    """
+
+    def __init__(self, scale=1, seed=42, match_rate=0.1, start=datetime(2018, 11, 1), days=30):
+        """
+        :param scale: the scale factor, e.g. 1, 10 or 100
+        :param seed: the seed everything is derived from
+        :param match_rate: the share of NextSong events that match a catalog song
+        :param start: the first day of events
+        :param days: how many days of events to generate
+        """
+        if not 0 <= match_rate <= 1:
+            raise ValueError(f"match_rate must be between 0 and 1, not {match_rate!r}")
+        self.scale = scale
+        self.seed = seed
+        self.match_rate = match_rate
+        self.start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.days = days
+        self.counts = {name: max(1, int(count * scale)) for name, count in BASE_SCALE.items()}
+        self.stats = {'objects': 0, 'bytes': 0, 'songs': 0, 'events': 0, 'next_song_events': 0, 'matched_events': 0,
+                      'logged_out_events': 0}
+        self._catalog = None
+
+    def rng(self, stream):
+        """
+        :param stream: the name of the stream
+        :return: a Random seeded from the generator's seed and the stream's name
+        """
+        return random.Random(f"{self.seed}:{stream}")
+
+    @property
+    def end(self):
+        """The end (exclusive) of the generated events"""
+        return self.start + timedelta(days=self.days)
+
+    def catalog(self):
+        """
+        :return: tuple of the catalog's songs and the off-catalog songs that unmatched plays are of
+        """
+        if self._catalog is None:
+            self._catalog = (self.make_songs(self.rng('songs'), self.counts['songs'], 'SO'),
+                             self.make_songs(self.rng('missing'), self.counts['songs'], 'SX'))
+        return self._catalog
+
+    def make_songs(self, rng, count, prefix):
+        """
+        :param rng: the Random to draw from
+        :param count: how many songs to make
+        :param prefix: the song ids' prefix
+        :return: list of song documents
+        """
+        artists = []
+        for _ in range(self.counts['artists']):
+            located = rng.random() < 0.4
+            artists.append({
+                'artist_id': 'AR' + random_id(rng, 16),
+                'artist_name': title_case(rng, rng.randint(1, 3)),
+                'artist_latitude': round(rng.uniform(-60, 70), 5) if located else None,
+                'artist_longitude': round(rng.uniform(-160, 170), 5) if located else None,
+                'artist_location': rng.choice(LOCATIONS) if located else '',
+            })
+        songs = []
+        for _ in range(count):
+            artist = artists[zipf_index(rng, len(artists))]
+            songs.append(dict(num_songs=1, **artist,
+                              song_id=prefix + random_id(rng, 16),
+                              title=title_case(rng, rng.randint(1, 4)),
+                              duration=round(rng.uniform(90, 420), 5),
+                              year=rng.choice([0] * 4 + list(range(1960, 2019)))))
+        return songs
+
+    def users(self):
+        """
+        :return: list of the users who generate events
+        """
+        rng = self.rng('users')
+        users = []
+        for user_id in range(1, self.counts['users'] + 1):
+            users.append({
+                'userId': str(user_id),
+                'firstName': title_case(rng, 1),
+                'lastName': title_case(rng, 1),
+                'gender': rng.choice('MF'),
+                'level': 'paid' if rng.random() < 0.25 else 'free',
+                'location': rng.choice(LOCATIONS),
+                'userAgent': rng.choice(USER_AGENTS),
+                'registration': float(epoch_ms(self.start - timedelta(days=rng.randint(30, 400)))),
+            })
+        return users
+
+    def song_objects(self):
+        """
+        :return: generator of (key, body) of the catalog's song documents
+        """
+        for song in self.catalog()[0]:
+            track_id = 'TR' + song['song_id'][2:]
+            key = f"song_data/{track_id[2]}/{track_id[3]}/{track_id[4]}/{track_id}.json"
+            self.stats['songs'] += 1
+            yield key, json.dumps(song).encode('utf-8')
+
+    def event_objects(self):
+        """
+        :return: generator of (key, body) of each day's events
+        """
+        rng, users = self.rng('events'), self.users()
+        catalog, missing = self.catalog()
+        pages, weights = zip(*PAGES)
+        per_day = max(1, self.counts['events'] // self.days)
+        sessions, session_count = {}, 0
+
+        for day in range(self.days):
+            day_start = self.start + timedelta(days=day)
+            day_ms = epoch_ms(day_start)
+            offsets = sorted(rng.randrange(24 * 3600 * 1000) for _ in range(per_day))
+            lines = []
+            for offset in offsets:
+                user = users[zipf_index(rng, len(users))]
+                session_id, item = sessions.get(user['userId'], (None, 0))
+                if session_id is None or rng.random() < 0.05:
+                    session_count += 1
+                    session_id, item = session_count, 0
+                sessions[user['userId']] = (session_id, item + 1)
+
+                page = rng.choices(pages, weights)[0]
+                song = None
+                if page == 'NextSong':
+                    matched = rng.random() < self.match_rate
+                    pool = catalog if matched else missing
+                    song = pool[zipf_index(rng, len(pool))]
+                    self.stats['next_song_events'] += 1
+                    self.stats['matched_events'] += matched
+
+                event_user = user
+                if page in LOGGED_OUT_PAGES and rng.random() < LOGGED_OUT_SHARE:
+                    event_user = dict({field: None for field in user}, userId='', level=user['level'])
+                    self.stats['logged_out_events'] += 1
+
+                event = dict(event_user,
+                             artist=song['artist_name'] if song else None,
+                             auth='Logged In' if event_user['userId'] else 'Logged Out',
+                             itemInSession=item,
+                             length=song['duration'] if song else None,
+                             method='PUT' if page == 'NextSong' else 'GET',
+                             page=page,
+                             sessionId=session_id,
+                             song=song['title'] if song else None,
+                             status=200 if page != 'Error' else 404,
+                             ts=day_ms + offset)
+                lines.append(json.dumps({field: event[field] for field in EVENT_FIELDS}))
+            self.stats['events'] += len(lines)
+            yield f"log_data/{day_start:%Y}/{day_start:%m}/{day_start:%Y-%m-%d}-events.json", \
+                ('\n'.join(lines) + '\n').encode('utf-8')
+
+    @staticmethod
+    def jsonpaths_object():
+        """
+        :return: (key, body) of the JSONPaths file that maps events onto events_stage
+        """
+        paths = {'jsonpaths': [f"$['{field}']" for field in EVENT_FIELDS]}
+        return 'log_json_path.json', json.dumps(paths, indent=2).encode('utf-8')
+
+    def objects(self):
+        """
+        :return: generator of (key, body) of every object in the dataset
+        """
+        yield self.counted(*self.jsonpaths_object())
+        for key, body in self.song_objects():
+            yield self.counted(key, body)
+        for key, body in self.event_objects():
+            yield self.counted(key, body)
+
+    def counted(self, key, body):
+        """Adds an object to the object and byte counts"""
+        self.stats['objects'] += 1
+        self.stats['bytes'] += len(body)
+        return key, body
+
+
+def epoch_ms(value):
+    """
+    :param value: a naive UTC datetime
+    :return: milliseconds since the epoch, as in the events' ts
+    """
+    return int((value - EPOCH).total_seconds() * 1000)
+
+
+def random_id(rng, length):
+    """
+    :param rng: the Random to draw from
+    :param length: the id's length
+    :return: an id of upper case letters and digits
+    """
+    return ''.join(rng.choice(string.ascii_uppercase + string.digits) for _ in range(length))
+
+
+def title_case(rng, words):
+    """
+    :param rng: the Random to draw from
+    :param words: how many words
+    :return: a made up name or title
+    """
+    return ' '.join(rng.choice(WORDS).title() for _ in range(words))
+
+
+def zipf_index(rng, size, skew=1.2):
+    """
+    Picks an index with a long tail, so a few items are picked far more often than the rest
+    :param rng: the Random to draw from
+    :param size: the number of items
+    :param skew: the Pareto shape; smaller is more skewed
+    :return: an index in range(size)
+    """
+    return min(int(rng.paretovariate(skew)) - 1, size - 1) if rng.random() < 0.7 else rng.randrange(size)
+
+
+def write_dataset(generator, directory):
+    """
+    Writes a dataset to a directory, e.g. to serve from a local S3 stand-in
+    :param generator: the SparkifyDataGenerator
+    :param directory: the directory to write the objects under
+    :return: the generator's stats
+    """
+    for key, body in generator.objects():
+        path = os.path.join(directory, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as output:
+            output.write(body)
+    return generator.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates Sparkify song_data and log_data")
+    parser.add_argument('output', help="directory to write the dataset to")
+    parser.add_argument('--scale', type=float, default=1, help="scale factor, e.g. 1, 10 or 100")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--match-rate', type=float, default=0.1,
+                        help="share of NextSong events that match a catalog song")
+    parser.add_argument('--days', type=int, default=30)
+    args = parser.parse_args()
+
+    generator = SparkifyDataGenerator(args.scale, args.seed, args.match_rate, days=args.days)
+    print(json.dumps(write_dataset(generator, args.output), indent=2))
+
+
+if __name__ == '__main__':
+    main()
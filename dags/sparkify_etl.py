@@ -1,20 +1,18 @@
+import os
 from datetime import datetime, timedelta
 
 from airflow import DAG
-from airflow.hooks.base_hook import BaseHook
 from airflow.operators.dummy_operator import DummyOperator
-from airflow.operators.postgres_operator import PostgresOperator
 
-from operators import DataQualityOperator, LoadDimensionOperator, LoadFactOperator, StageToRedshiftOperator
-from helpers import SqlQueries
-from helpers import TestHelpers
+from operators import DataQualityOperator, LoadDimensionOperator, LoadFactOperator, LoadTimeDimensionOperator, \
+    MultiTargetLoadOperator, ParquetExportOperator, S3CompactionOperator, SchemaMigrationOperator, \
+    StageToRedshiftOperator, WindowCoverageOperator
+from helpers.pipeline_spec import load_pipeline_spec
+from sensors import S3ReadinessSensor
 
-IAM_ROLE = BaseHook.get_connection("redshift").extra_dejson.get('iam_role')
-
-S3_BUCKET = 'udacity-dend'
-LOG_KEY = 'log_data'
-SONG_KEY = 'song_data'
-LOG_JSONPATH = 's3://udacity-dend/log_json_path.json'
+# Tables, S3 keys and queries live in the pipeline spec. The IAM role for the COPYs is read from the redshift
+# connection when the stage tasks run, so parsing this file never touches the metadata database.
+PIPELINE_SPEC = load_pipeline_spec(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sparkify_pipeline.json'))
 
 default_args = {
     'owner': 'scott',
@@ -22,94 +20,194 @@ default_args = {
     'start_date': datetime(2019, 9, 26),
     'retries': 5,
     'retry_delay': timedelta(minutes=3),
-    'catchup': False,
     'email_on_retry': False,
 }
 
-with DAG('sparkify_etl',
-         default_args=default_args,
-         description='S3 -> Redshift ETL for Sparkify songs and event data',
-         schedule_interval='@hourly',
-         template_searchpath='/usr/local/airflow',
-         max_active_runs=1) as dag:
-
-    start_operator = DummyOperator(
-        task_id='start_execution',
-    )
-
-    create_tables_task = PostgresOperator(
-        task_id='create_tables',
-        postgres_conn_id='redshift',
-        sql='plugins/helpers/create_tables.sql'
-    )
-
-    stage_events_to_redshift = StageToRedshiftOperator(
-        task_id='Stage_events',
-        conn_id='redshift',
-        params={'iam_role': IAM_ROLE,
-                's3_bucket': S3_BUCKET,
-                's3_key': LOG_KEY,
-                'table': "events_stage",
-                'json_format': LOG_JSONPATH}
-    )
-
-    stage_songs_to_redshift = StageToRedshiftOperator(
-        task_id='Stage_songs',
-        conn_id='redshift',
-        params={'iam_role': IAM_ROLE,
-                's3_bucket': S3_BUCKET,
-                's3_key': SONG_KEY,
-                'table': "songs_stage"}
-    )
-
-    load_songplays_table = LoadFactOperator(
-        task_id='Load_songplays_fact_table',
-        conn_id="redshift",
-        sql=SqlQueries.songplay_table_insert,
-        params={'table': 'songplays', 'truncate': True}
-    )
-
-    load_user_dimension_table = LoadDimensionOperator(
-        task_id='Load_user_dim_table',
-        conn_id="redshift",
-        sql=SqlQueries.user_table_insert,
-        params={'table': 'users', 'truncate': True}
-    )
-
-    load_song_dimension_table = LoadDimensionOperator(
-        task_id='Load_song_dim_table',
-        conn_id="redshift",
-        sql=SqlQueries.song_table_insert,
-        params={'table': 'songs', 'truncate': True}
-    )
-
-    load_artist_dimension_table = LoadDimensionOperator(
-        task_id='Load_artist_dim_table',
-        conn_id="redshift",
-        sql=SqlQueries.artist_table_insert,
-        params={'table': 'artists', 'truncate': True}
-    )
-
-    load_time_dimension_table = LoadDimensionOperator(
-        task_id='Load_time_dim_table',
-        conn_id="redshift",
-        sql=SqlQueries.time_table_insert,
-        params={'table': 'time', 'truncate': True}
-    )
-
-    run_quality_checks = DataQualityOperator(
-        task_id='Run_data_quality_checks',
-        conn_id="redshift",
-        params={"tests_to_run": TestHelpers.tests_to_run}
-    )
-
-    finish_operator = DummyOperator(
-        task_id='end_execution')
-
-start_operator \
-    >> create_tables_task \
-    >> [stage_events_to_redshift, stage_songs_to_redshift] \
-    >> load_songplays_table \
-    >> [load_user_dimension_table, load_song_dimension_table, load_artist_dimension_table, load_time_dimension_table] \
-    >> run_quality_checks \
-    >> finish_operator
+
+def build_dag(spec, dag_id, schedule_interval, description, backfill=False):
+    """
+    Builds the Sparkify ETL from a compiled pipeline spec. Every load works on the run's execution window, i.e. one
+    schedule_interval, so the same pipeline serves both the hourly DAG and the backfill DAG, whose runs each coalesce
+    the spec's backfill_window_hours into one staging COPY, one set of windowed loads and one quality pass. The
+    backfill DAG records each window it loads as covered, and the hourly DAG skips runs whose hour has already been
+    covered.
+    :param spec: the compiled pipeline spec, from load_pipeline_spec
+    :param dag_id: the DAG id
+    :param schedule_interval: the schedule, which is also the size of each run's window
+    :param description: the DAG description
+    :param backfill: True to build the backfill DAG
+    :return: the DAG
+    """
+    s3_bucket, work_bucket = spec['s3']['bucket'], spec['s3']['work_bucket']
+    events, songs = spec['staging']['Stage_events'], spec['staging']['Stage_songs']
+    readiness = events['readiness']
+    dialect = spec.get('dialect', 'redshift')
+
+    with DAG(dag_id,
+             default_args=default_args,
+             description=description,
+             schedule_interval=schedule_interval,
+             catchup=False,
+             # The backfill DAG only loads the ranges it's triggered for, e.g. by `airflow backfill`
+             is_paused_upon_creation=backfill,
+             template_searchpath='/usr/local/airflow',
+             max_active_runs=1) as dag:
+
+        start_operator = DummyOperator(
+            task_id='start_execution',
+        )
+
+        migrate_schema_task = SchemaMigrationOperator(
+            task_id='migrate_schema',
+            conn_id='redshift',
+            params={'dialect': dialect}
+        )
+
+        wait_for_events = S3ReadinessSensor(
+            task_id='Wait_for_events',
+            params={'s3_bucket': s3_bucket,
+                    's3_key': events['s3_key'],
+                    'partition': events['partition'],
+                    'min_objects': readiness['min_objects'],
+                    'min_bytes': readiness['min_bytes']},
+            poke_interval=readiness['poke_interval'],
+            timeout=readiness['timeout']
+        )
+
+        stage_events_to_redshift = StageToRedshiftOperator(
+            task_id='Stage_events',
+            conn_id='redshift',
+            params={'s3_bucket': s3_bucket,
+                    's3_key': events['s3_key'],
+                    'table': events['table'],
+                    'json_format': events['json_format'],
+                    'partition': events['partition'],
+                    'partition_column': events['partition_column'],
+                    'filter': events.get('filter'),
+                    'columns': events.get('columns'),
+                    'manifest_bucket': work_bucket,
+                    'objects_from': wait_for_events.task_id,
+                    'backend': dialect}
+        )
+
+        compact_songs = S3CompactionOperator(
+            task_id='Compact_songs',
+            conn_id='redshift',
+            params={'s3_bucket': s3_bucket,
+                    's3_key': songs['s3_key'],
+                    'target_bucket': work_bucket,
+                    'target_prefix': songs['compacted_prefix'],
+                    'manifest_key': songs['manifest_key'],
+                    'slices': songs.get('slices'),
+                    'parts_per_slice': songs['parts_per_slice'],
+                    'backend': dialect}
+        )
+
+        stage_songs_to_redshift = StageToRedshiftOperator(
+            task_id='Stage_songs',
+            conn_id='redshift',
+            params={'s3_bucket': s3_bucket,
+                    's3_key': songs['s3_key'],
+                    'manifest_bucket': work_bucket,
+                    'manifest_key': songs['manifest_key'],
+                    'options': songs['options'],
+                    'table': songs['table'],
+                    'backend': dialect}
+        )
+
+        load_song_match_table = LoadDimensionOperator(
+            task_id='Load_song_match_lookup',
+            conn_id="redshift",
+            sql=spec['song_match']['sql'],
+            params={'table': spec['song_match']['table'], 'mode': 'append'}
+        )
+
+        load_songplays_table = LoadFactOperator(
+            task_id='Load_songplays_fact_table',
+            conn_id="redshift",
+            sql=spec['fact']['sql'],
+            params={'table': spec['fact']['table'],
+                    'mode': spec['fact']['mode'],
+                    'window_column': spec['fact']['window_column'],
+                    'plan_check': spec['fact'].get('plan_check')}
+        )
+
+        load_dimension_tables = MultiTargetLoadOperator(
+            task_id='Load_dimension_tables',
+            conn_id="redshift",
+            params={'targets': spec['dimensions'], 'dialect': dialect}
+        )
+
+        load_time_dimension_table = LoadTimeDimensionOperator(
+            task_id='Load_time_dim_table',
+            conn_id="redshift",
+            params={'table': spec['time']['table'], 'mode': spec['time']['mode'], 'dialect': dialect}
+        )
+
+        run_quality_checks = DataQualityOperator(
+            task_id='Run_data_quality_checks',
+            conn_id="redshift",
+            params={"tests_to_run": spec['quality']['tests'],
+                    "profile": spec['quality']['profile'],
+                    "max_workers": spec['quality']['max_workers'],
+                    "check_timeout": spec['quality']['check_timeout'],
+                    "checkpoint": spec['quality'].get('checkpoint', False),
+                    "dialect": dialect,
+                    "plan_check": spec['quality'].get('plan_check')}
+        )
+
+        # Validated tables are exported for downstream consumers, so they don't query the warehouse directly
+        export_tasks = [ParquetExportOperator(
+            task_id=task_id,
+            conn_id="redshift",
+            params={'table': export['table'],
+                    'target': f"s3://{work_bucket}/{export['prefix']}",
+                    'partition_column': export.get('partition_column'),
+                    'backend': dialect}
+        ) for task_id, export in spec.get('exports', {}).items()]
+
+        finish_operator = DummyOperator(
+            task_id='end_execution')
+
+        if backfill:
+            coverage_task = WindowCoverageOperator(
+                task_id='Mark_window_covered',
+                conn_id="redshift",
+                params={'mode': 'mark'}
+            )
+        else:
+            coverage_task = WindowCoverageOperator(
+                task_id='Check_window_coverage',
+                conn_id="redshift",
+                params={'mode': 'check'}
+            )
+
+    start_operator >> migrate_schema_task
+
+    if backfill:
+        migrate_schema_task >> [wait_for_events, compact_songs]
+        run_quality_checks >> coverage_task >> finish_operator
+    else:
+        migrate_schema_task >> coverage_task >> [wait_for_events, compact_songs]
+        run_quality_checks >> finish_operator
+
+    wait_for_events >> stage_events_to_redshift
+    compact_songs >> stage_songs_to_redshift >> load_song_match_table
+
+    [stage_events_to_redshift, load_song_match_table] \
+        >> load_songplays_table \
+        >> [load_dimension_tables, load_time_dimension_table] \
+        >> run_quality_checks
+
+    if export_tasks:
+        run_quality_checks >> export_tasks >> finish_operator
+
+    return dag
+
+
+dag = build_dag(PIPELINE_SPEC, 'sparkify_etl', '@hourly', 'S3 -> Redshift ETL for Sparkify songs and event data')
+
+# Backfill a range with e.g. `airflow backfill sparkify_etl_backfill -s 2019-01-01 -e 2019-12-31`
+backfill_dag = build_dag(PIPELINE_SPEC, 'sparkify_etl_backfill',
+                         timedelta(hours=PIPELINE_SPEC['backfill_window_hours']),
+                         'Backfills the Sparkify ETL in backfill_window_hours sized windows', backfill=True)
@@ -4,6 +4,8 @@ from airflow.plugins_manager import AirflowPlugin
 
 import operators
 import helpers
+import hooks
+import sensors
 
 
 # Defining the plugin class
@@ -13,7 +15,19 @@ class UdacityPlugin(AirflowPlugin):
         operators.StageToRedshiftOperator,
         operators.LoadFactOperator,
         operators.LoadDimensionOperator,
+        operators.MultiTargetLoadOperator,
+        operators.LoadTimeDimensionOperator,
         operators.DataQualityOperator,
+        operators.S3CompactionOperator,
+        operators.WindowCoverageOperator,
+        operators.SchemaMigrationOperator,
+        operators.ParquetExportOperator,
+    ]
+    hooks = [
+        hooks.InstrumentedPostgresHook
+    ]
+    sensors = [
+        sensors.S3ReadinessSensor
     ]
     helpers = [
         helpers.SqlQueries,
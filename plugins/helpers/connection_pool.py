@@ -0,0 +1,108 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+# psycopg2.extensions.TRANSACTION_STATUS_IDLE: connected and not in a transaction or running a query
+TRANSACTION_STATUS_IDLE = 0
+
+
+class ConnectionPool:
+    """
+    A small, thread-safe pool of reusable database connections opened from an Airflow DB-API hook. Connections are
+    opened lazily, up to `size`, and handed back to the pool after each query instead of being closed, so a batch of
+    checks pays the connection setup cost at most `size` times. A connection that comes back closed, or in any
+    transaction state but idle (e.g. after a timeout or a dropped connection), is closed and discarded instead, and a
+    fresh one is opened in its place when next needed.
+    """
+
+    def __init__(self, hook, size=1):
+        self.hook = hook
+        self.size = max(1, size)
+        self._idle = queue.Queue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool, opening a new one if none are idle and the pool is not yet full
+        :return: a DB-API connection in autocommit mode
+        """
+        slot = False
+        with self._lock:
+            if self._idle.empty() and self._opened < self.size:
+                self._opened += 1
+                slot = True
+        # None is a slot freed by a discarded connection
+        conn = None if slot else self._idle.get()
+        if conn is None:
+            try:
+                conn = self.hook.get_conn()
+                conn.autocommit = True
+            except Exception:
+                self._idle.put(None)
+                raise
+        try:
+            yield conn
+        finally:
+            if ConnectionPool.reusable(conn):
+                self._idle.put(conn)
+            else:
+                self.discard(conn)
+
+    @staticmethod
+    def reusable(conn):
+        """
+        :param conn: a connection handed back to the pool
+        :return: False if it's closed or not idle, e.g. still running a query after a timeout or in a broken state
+        """
+        if getattr(conn, 'closed', False):
+            return False
+        transaction_status = getattr(conn, 'get_transaction_status', None)
+        return transaction_status is None or transaction_status() == TRANSACTION_STATUS_IDLE
+
+    def discard(self, conn):
+        """
+        Closes a connection that can't be reused and hands its slot back, so a waiting or later borrower opens a fresh
+        one in its place
+        :param conn: the connection to discard
+        :return: None
+        """
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._idle.put(None)
+
+    def get_records(self, sql, timeout=None):
+        """
+        Runs a query on a pooled connection and returns all of its rows
+        :param sql: the query to run
+        :param timeout: optional statement timeout in seconds, enforced by the database
+        :return: list of result rows
+        """
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if timeout:
+                    cursor.execute(f"SET statement_timeout TO {int(timeout * 1000)}")
+                try:
+                    cursor.execute(sql)
+                    return cursor.fetchall()
+                finally:
+                    if timeout:
+                        cursor.execute("RESET statement_timeout")
+            finally:
+                cursor.close()
+
+    def close(self):
+        """
+        Closes every idle connection in the pool
+        :return: None
+        """
+        while not self._idle.empty():
+            conn = self._idle.get()
+            if conn is not None:
+                conn.close()
+        self._opened = 0
@@ -0,0 +1,123 @@
+class DimensionMerge:
+    """
+    Builds the statements that merge the results of a query into a table by natural key. The query is loaded into a temp
+    table and deduplicated by key, then rows whose hash of non-key columns differs are updated and rows with new keys
+    are inserted; everything else is left alone. Run the statements in one transaction with run_transaction; the row
+    counts of `update_sql` and `insert_sql` are the number of rows updated and inserted.
+
+    With `latest` set, the query returns one more column after the table's, e.g. the event's ts, and the row with its
+    highest value is kept for each key, so a user's latest level wins. Otherwise the first row in column order is kept.
+    """
+    latest_column = 'merge_latest'
+    columns_sql = """
+        SELECT column_name
+        FROM information_schema.columns
+        WHERE table_schema = '{}' AND table_name = '{}'
+        ORDER BY ordinal_position
+    """
+
+    def __init__(self, table, key, columns, latest=False):
+        """
+        :param table: the table to merge into
+        :param key: the natural key column, or list of columns
+        :param columns: every column of the table, in order
+        :param latest: True if the query's last column ranks the rows of a key, the highest being kept
+        """
+        self.table = table
+        self.keys = [key] if isinstance(key, str) else list(key)
+        self.columns = list(columns)
+        self.values = [column for column in self.columns if column not in self.keys]
+        self.latest = latest
+        self.raw_table = f"{table.split('.')[-1]}_merge_raw"
+        self.merge_table = f"{table.split('.')[-1]}_merge"
+
+    @staticmethod
+    def table_columns(hook, table):
+        """
+        :param hook: the hook to read the catalog with
+        :param table: the table, optionally qualified by its schema (public by default)
+        :return: the table's columns, in order
+        """
+        schema, _, name = table.rpartition('.')
+        return [row[0] for row in hook.get_records(DimensionMerge.columns_sql.format(schema or 'public', name))]
+
+    def statements(self, sql):
+        """
+        :param sql: the SELECT whose results should be merged, with columns in the same order as the table's (and the
+            ranking column last, with `latest`)
+        :return: list of the statements that stage, update, insert and clean up
+        """
+        if self.latest:
+            # Named by position, since the query's column names needn't match the table's
+            staged = [f"CREATE TEMP TABLE {self.raw_table} AS SELECT * FROM ({sql}) merge_source "
+                      f"({self.column_list(self.columns + [DimensionMerge.latest_column])})"]
+        else:
+            staged = [f"CREATE TEMP TABLE {self.raw_table} (LIKE {self.table})",
+                      f"INSERT INTO {self.raw_table} {sql}"]
+        return staged + [
+            f"CREATE TEMP TABLE {self.merge_table} (LIKE {self.table})",
+            self.dedupe_sql(),
+            self.update_sql(),
+            self.insert_sql(),
+            f"DROP TABLE {self.raw_table}",
+            f"DROP TABLE {self.merge_table}",
+        ]
+
+    @staticmethod
+    def summarize(row_counts):
+        """
+        :param row_counts: the row counts returned by run_transaction for `statements`
+        :return: dict of how many distinct keys were staged, and how many rows were inserted, updated and unchanged
+        """
+        staged, updated, inserted = row_counts[-5], row_counts[-4], row_counts[-3]
+        return {'staged': staged, 'inserted': inserted, 'updated': updated,
+                'unchanged': staged - inserted - updated}
+
+    def dedupe_sql(self):
+        columns = self.column_list(self.columns)
+        order = f'"{DimensionMerge.latest_column}" DESC, {columns}' if self.latest else columns
+        return f"""
+            INSERT INTO {self.merge_table}
+            SELECT {columns}
+            FROM (SELECT {columns},
+                         ROW_NUMBER() OVER (PARTITION BY {self.column_list(self.keys)}
+                                            ORDER BY {order}) AS merge_row
+                  FROM {self.raw_table}) ranked
+            WHERE merge_row = 1
+        """
+
+    def update_sql(self):
+        assignments = ', '.join(f'"{column}" = {self.merge_table}."{column}"' for column in self.values)
+        return f"""
+            UPDATE {self.table}
+            SET {assignments}
+            FROM {self.merge_table}
+            WHERE {self.key_join()}
+                AND {self.row_hash(self.table)} <> {self.row_hash(self.merge_table)}
+        """
+
+    def insert_sql(self):
+        return f"""
+            INSERT INTO {self.table} ({self.column_list(self.columns)})
+            SELECT {self.column_list(self.columns, self.merge_table)}
+            FROM {self.merge_table}
+            LEFT JOIN {self.table}
+                ON {self.key_join()}
+            WHERE {self.table}."{self.keys[0]}" IS NULL
+        """
+
+    def key_join(self):
+        return ' AND '.join(f'{self.table}."{key}" = {self.merge_table}."{key}"' for key in self.keys)
+
+    def row_hash(self, table):
+        """md5 of the non-key columns, with NULLs kept distinct from empty strings"""
+        if not self.values:
+            return "''"
+        parts = " || '|' || ".join(f"""COALESCE(CAST({table}."{column}" AS varchar), '\\N')"""
+                                   for column in self.values)
+        return f"md5({parts})"
+
+    @staticmethod
+    def column_list(columns, table=None):
+        prefix = f"{table}." if table else ''
+        return ', '.join(f'{prefix}"{column}"' for column in columns)
@@ -0,0 +1,110 @@
+from datetime import timedelta
+
+PARTITION_SIZES = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+
+def execution_window(context):
+    """
+    Gets the interval of data a run is responsible for, i.e. from its execution date up to the next one
+    :param context: the task context
+    :return: tuple of the window's start (inclusive) and end (exclusive)
+    """
+    start = context['execution_date']
+    end = context.get('next_execution_date') or start + PARTITION_SIZES['hour']
+    return start, end
+
+
+def partition_starts(start, end, partition):
+    """
+    Lists the start of every hour or day partition that overlaps a window
+    :param start: the window's start (inclusive)
+    :param end: the window's end (exclusive)
+    :param partition: the partition size, either 'hour' or 'day'
+    :return: list of partition start datetimes, in order
+    """
+    if partition not in PARTITION_SIZES:
+        raise ValueError(f"partition must be one of {sorted(PARTITION_SIZES)}, not {partition!r}")
+
+    current = start.replace(minute=0, second=0, microsecond=0)
+    if partition == 'day':
+        current = current.replace(hour=0)
+
+    starts = []
+    while current < end:
+        starts.append(current)
+        current += PARTITION_SIZES[partition]
+    return starts
+
+
+def partition_fields(partition_start):
+    """
+    Builds the fields available to a templated S3 key for a partition, e.g. 'log_data/{year}/{month}/{ds}-events.json'
+    :param partition_start: the start of the partition
+    :return: dict of year, month, day and hour (zero padded), ds and ds_nodash
+    """
+    return {
+        'year': partition_start.strftime('%Y'),
+        'month': partition_start.strftime('%m'),
+        'day': partition_start.strftime('%d'),
+        'hour': partition_start.strftime('%H'),
+        'ds': partition_start.strftime('%Y-%m-%d'),
+        'ds_nodash': partition_start.strftime('%Y%m%d'),
+    }
+
+
+def render_keys(s3_key, context, partition=None):
+    """
+    Renders a templated S3 key for a run: once per hour or day partition of its execution window using the fields from
+    `partition_fields`, or once with the task context's fields
+    :param s3_key: the templated key, e.g. 'log_data/{year}/{month}/{ds}-events.json'
+    :param context: the task context
+    :param partition: the partition size, 'hour' or 'day', or None to render the key once
+    :return: list of rendered keys, in partition order
+    """
+    if not partition:
+        return [s3_key.format(**context)]
+    return [s3_key.format(**{**context, **partition_fields(start)})
+            for start in partition_starts(*execution_window(context), partition)]
+
+
+def window_fields(start, end):
+    """
+    Builds the fields available to windowed SQL, e.g. SqlQueries.songplay_table_insert_window
+    :param start: the window's start (inclusive)
+    :param end: the window's end (exclusive)
+    :return: dict of window_start and window_end as quoted timestamp literals, and as epoch milliseconds
+    """
+    return {
+        'window_start': sql_timestamp(start),
+        'window_end': sql_timestamp(end),
+        'window_start_ms': int(start.timestamp() * 1000),
+        'window_end_ms': int(end.timestamp() * 1000),
+    }
+
+
+def sql_timestamp(value):
+    """
+    Formats a datetime as a SQL timestamp literal
+    :param value: the datetime to format
+    :return: the quoted timestamp literal
+    """
+    return f"'{value.strftime('%Y-%m-%d %H:%M:%S')}'"
+
+
+def window_predicate(column, start, end, column_type='timestamp'):
+    """
+    Builds a WHERE clause predicate selecting the rows of a window
+    :param column: the column holding each row's event time
+    :param start: the window's start (inclusive)
+    :param end: the window's end (exclusive)
+    :param column_type: 'timestamp' for timestamp columns or 'epoch_ms' for epoch milliseconds, e.g. events_stage.ts
+    :return: the predicate
+    """
+    if column_type == 'epoch_ms':
+        return f"{column} >= {int(start.timestamp() * 1000)} AND {column} < {int(end.timestamp() * 1000)}"
+    if column_type == 'timestamp':
+        return f"{column} >= {sql_timestamp(start)} AND {column} < {sql_timestamp(end)}"
+    raise ValueError(f"column_type must be 'timestamp' or 'epoch_ms', not {column_type!r}")
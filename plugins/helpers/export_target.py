@@ -0,0 +1,138 @@
+import os
+import shutil
+
+from airflow.hooks.S3_hook import S3Hook
+
+
+class LocalExportTarget:
+    """An export target on the local filesystem, e.g. for testing exports against a local Postgres"""
+
+    def __init__(self, root):
+        """
+        :param root: the directory exports are written under
+        """
+        self.root = root
+
+    def url(self, key):
+        """
+        :param key: a key relative to the root
+        :return: the key's path
+        """
+        return os.path.join(self.root, key)
+
+    def put_file(self, path, key):
+        """
+        Moves a finished local file into place, so readers never see a partial file
+        :param path: the local file
+        :param key: the key to store it under
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.url(key)), exist_ok=True)
+        shutil.move(path, self.url(key))
+
+    def put_string(self, data, key):
+        """
+        :param data: the text to write
+        :param key: the key to write it to
+        :return: None
+        """
+        os.makedirs(os.path.dirname(self.url(key)), exist_ok=True)
+        with open(self.url(key), 'w') as target_file:
+            target_file.write(data)
+
+    def read_string(self, key):
+        """
+        :param key: the key to read
+        :return: its contents, or None if there is no such key
+        """
+        if not os.path.exists(self.url(key)):
+            return None
+        with open(self.url(key)) as target_file:
+            return target_file.read()
+
+    def delete(self, keys):
+        """
+        :param keys: the keys to delete; missing ones are ignored
+        :return: None
+        """
+        for key in keys:
+            if os.path.exists(self.url(key)):
+                os.remove(self.url(key))
+
+
+class S3ExportTarget:
+    """An export target under an S3 prefix, reached through S3Hook so it can be tested against moto"""
+
+    def __init__(self, bucket, prefix, aws_conn_id='aws_default'):
+        """
+        :param bucket: the bucket exports are written to
+        :param prefix: the key prefix exports are written under
+        :param aws_conn_id: the AWS connection to write with
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.s3 = S3Hook(aws_conn_id=aws_conn_id)
+
+    def full_key(self, key):
+        """
+        :param key: a key relative to the prefix
+        :return: the key in the bucket
+        """
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def url(self, key):
+        """
+        :param key: a key relative to the prefix
+        :return: the key's s3:// URL
+        """
+        return f"s3://{self.bucket}/{self.full_key(key)}"
+
+    def put_file(self, path, key):
+        """
+        Uploads a finished local file and removes it
+        :param path: the local file
+        :param key: the key to store it under
+        :return: None
+        """
+        self.s3.load_file(path, self.full_key(key), self.bucket, replace=True)
+        os.remove(path)
+
+    def put_string(self, data, key):
+        """
+        :param data: the text to write
+        :param key: the key to write it to
+        :return: None
+        """
+        self.s3.load_string(data, self.full_key(key), self.bucket, replace=True)
+
+    def read_string(self, key):
+        """
+        :param key: the key to read
+        :return: its contents, or None if there is no such key
+        """
+        if not self.s3.check_for_key(self.full_key(key), self.bucket):
+            return None
+        return self.s3.read_key(self.full_key(key), self.bucket)
+
+    def delete(self, keys):
+        """
+        :param keys: the keys to delete; missing ones are ignored
+        :return: None
+        """
+        client = self.s3.get_conn()
+        for key in keys:
+            client.delete_object(Bucket=self.bucket, Key=self.full_key(key))
+
+
+def export_target(url, aws_conn_id='aws_default'):
+    """
+    :param url: where exports go, an s3://bucket/prefix URL or a local directory (optionally as a file:// URL)
+    :param aws_conn_id: the AWS connection to write to S3 with
+    :return: an S3ExportTarget or LocalExportTarget
+    """
+    if url.startswith('s3://'):
+        bucket, _, prefix = url[len('s3://'):].partition('/')
+        return S3ExportTarget(bucket, prefix, aws_conn_id)
+    if url.startswith('file://'):
+        url = url[len('file://'):]
+    return LocalExportTarget(url)
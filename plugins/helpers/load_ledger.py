@@ -0,0 +1,110 @@
+import json
+import os
+from datetime import datetime
+
+
+def quote(value):
+    """Escapes single quotes so a value can be embedded in a SQL string literal"""
+    return value.replace("'", "''")
+
+
+def changed_objects(objects, loaded):
+    """
+    Splits a listing into the objects not loaded yet and those whose ETag or size differs from when they were loaded.
+    Rows aren't tied to the object they were copied from, so a changed object can't be reloaded without duplicating
+    the rows of its earlier load.
+    :param objects: list of dicts with the key, etag and size of each object
+    :param loaded: dict of key -> (etag, size) for every object already loaded
+    :return: tuple of the list of new objects and the list of changed ones
+    """
+    new = [obj for obj in objects if obj['key'] not in loaded]
+    changed = [obj for obj in objects if obj['key'] in loaded and loaded[obj['key']] != (obj['etag'], obj['size'])]
+    return new, changed
+
+
+class TableLoadLedger:
+    """
+    A ledger of loaded S3 objects kept in a warehouse table. The rows for a load are inserted by the same transaction as
+    its COPY, so objects are only ever recorded once they have actually been loaded.
+    """
+    insert_batch_size = 500
+
+    def __init__(self, hook, table='stage_load_ledger'):
+        self.hook = hook
+        self.table = table
+
+    def loaded(self, target_table):
+        """
+        Gets the latest recorded ETag and size of every object loaded into a table
+        :param target_table: the staging table the objects were loaded into
+        :return: dict of key -> (etag, size)
+        """
+        records = self.hook.get_records(f"""
+            SELECT s3_key, etag, size
+            FROM {self.table}
+            WHERE target_table = '{target_table}'
+            ORDER BY loaded_at
+        """)
+        return {key: (etag, size) for key, etag, size in records}
+
+    def record_statements(self, target_table, objects):
+        """
+        Builds the statements that record objects as loaded, to be run in the same transaction as the COPY
+        :param target_table: the staging table the objects were loaded into
+        :param objects: list of dicts with the key, etag and size of each object
+        :return: list of INSERT statements
+        """
+        loaded_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        statements = []
+        for i in range(0, len(objects), self.insert_batch_size):
+            values = ',\n'.join(
+                f"('{target_table}', '{quote(obj['key'])}', '{obj['etag']}', {obj['size']}, '{loaded_at}')"
+                for obj in objects[i:i + self.insert_batch_size]
+            )
+            statements.append(f"INSERT INTO {self.table} (target_table, s3_key, etag, size, loaded_at) VALUES\n{values}")
+        return statements
+
+    def recorded(self, target_table, objects):
+        """Nothing to do once the COPY has committed; the ledger rows were written in the same transaction"""
+
+
+class FileLoadLedger:
+    """
+    A ledger of loaded S3 objects kept in a local JSON lines file, e.g. for local runs. Objects are appended to the file
+    only after the COPY has committed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def loaded(self, target_table):
+        """
+        Gets the latest recorded ETag and size of every object loaded into a table
+        :param target_table: the staging table the objects were loaded into
+        :return: dict of key -> (etag, size)
+        """
+        loaded = {}
+        if not os.path.exists(self.path):
+            return loaded
+        with open(self.path) as ledger_file:
+            for line in ledger_file:
+                entry = json.loads(line)
+                if entry['target_table'] == target_table:
+                    loaded[entry['key']] = (entry['etag'], entry['size'])
+        return loaded
+
+    def record_statements(self, target_table, objects):
+        """The file ledger has nothing to run inside the COPY transaction"""
+        return []
+
+    def recorded(self, target_table, objects):
+        """
+        Appends objects to the ledger file once their COPY has committed
+        :param target_table: the staging table the objects were loaded into
+        :param objects: list of dicts with the key, etag and size of each object
+        :return: None
+        """
+        loaded_at = datetime.utcnow().isoformat()
+        with open(self.path, 'a') as ledger_file:
+            for obj in objects:
+                ledger_file.write(json.dumps({'target_table': target_table, 'loaded_at': loaded_at, **obj}) + '\n')
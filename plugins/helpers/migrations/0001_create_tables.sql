@@ -88,3 +88,40 @@ CREATE TABLE IF NOT EXISTS public."time"
     weekday    varchar(256),
     CONSTRAINT time_pkey PRIMARY KEY (start_time)
 );
+
+CREATE TABLE IF NOT EXISTS public.song_match
+(
+    song_key  char(32)     NOT NULL,
+    song_id   varchar(256) NOT NULL,
+    artist_id varchar(256),
+    CONSTRAINT song_match_pkey PRIMARY KEY (song_key)
+);
+
+CREATE TABLE IF NOT EXISTS public.calendar
+(
+    start_time timestamp NOT NULL,
+    "hour"     int4,
+    "day"      int4,
+    week       int4,
+    "month"    varchar(256),
+    "year"     int4,
+    weekday    varchar(256),
+    CONSTRAINT calendar_pkey PRIMARY KEY (start_time)
+);
+
+CREATE TABLE IF NOT EXISTS public.stage_load_ledger
+(
+    target_table varchar(256)  NOT NULL,
+    s3_key       varchar(1024) NOT NULL,
+    etag         varchar(64)   NOT NULL,
+    size         int8          NOT NULL,
+    loaded_at    timestamp     NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.etl_window_coverage
+(
+    dag_id       varchar(256) NOT NULL,
+    window_start timestamp    NOT NULL,
+    window_end   timestamp    NOT NULL,
+    covered_at   timestamp    NOT NULL
+);
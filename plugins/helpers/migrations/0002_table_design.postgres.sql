@@ -0,0 +1,11 @@
+-- Generated from helpers.sparkify_tables: indexes standing in for the Redshift sort and distribution keys
+
+CREATE INDEX IF NOT EXISTS events_stage_sortkey_idx ON public.events_stage (ts);
+
+CREATE INDEX IF NOT EXISTS songplays_sortkey_idx ON public.songplays (start_time);
+
+CREATE INDEX IF NOT EXISTS artists_sortkey_idx ON public.artists (artist_id);
+
+CREATE INDEX IF NOT EXISTS stage_load_ledger_sortkey_idx ON public.stage_load_ledger (target_table, loaded_at);
+
+CREATE INDEX IF NOT EXISTS etl_window_coverage_sortkey_idx ON public.etl_window_coverage (window_start);
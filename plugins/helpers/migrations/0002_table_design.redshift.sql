@@ -0,0 +1,260 @@
+-- Generated from helpers.sparkify_tables: rebuilds each table with its distribution, sort key and encodings
+
+DROP TABLE IF EXISTS public.events_stage_redesign;
+
+CREATE TABLE IF NOT EXISTS public.events_stage_redesign
+(
+    artist          varchar(256)   ENCODE zstd,
+    auth            varchar(256)   ENCODE zstd,
+    first_name      varchar(256)   ENCODE zstd,
+    gender          varchar(256)   ENCODE zstd,
+    item_in_session int4           ENCODE az64,
+    last_name       varchar(256)   ENCODE zstd,
+    length          numeric(18, 0) ENCODE az64,
+    "level"         varchar(256)   ENCODE zstd,
+    location        varchar(256)   ENCODE zstd,
+    "method"        varchar(256)   ENCODE zstd,
+    page            varchar(256)   ENCODE zstd,
+    registration    numeric(18, 0) ENCODE az64,
+    session_id      int4           ENCODE az64,
+    song            varchar(256)   ENCODE zstd,
+    status          int4           ENCODE az64,
+    ts              int8           ENCODE raw,
+    user_agent      varchar(256)   ENCODE zstd,
+    user_id         int4           ENCODE az64
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (ts);
+
+INSERT INTO public.events_stage_redesign (artist, auth, first_name, gender, item_in_session, last_name, length, "level", location, "method", page, registration, session_id, song, status, ts, user_agent, user_id) SELECT artist, auth, first_name, gender, item_in_session, last_name, length, "level", location, "method", page, registration, session_id, song, status, ts, user_agent, user_id FROM public.events_stage;
+
+ALTER TABLE public.events_stage RENAME TO events_stage_old;
+
+ALTER TABLE public.events_stage_redesign RENAME TO events_stage;
+
+DROP TABLE public.events_stage_old;
+
+DROP TABLE IF EXISTS public.songs_stage_redesign;
+
+CREATE TABLE IF NOT EXISTS public.songs_stage_redesign
+(
+    num_songs        int4           ENCODE az64,
+    artist_id        varchar(256)   ENCODE zstd,
+    artist_name      varchar(256)   ENCODE zstd,
+    artist_latitude  numeric(18, 0) ENCODE az64,
+    artist_longitude numeric(18, 0) ENCODE az64,
+    artist_location  varchar(256)   ENCODE zstd,
+    song_id          varchar(256)   ENCODE zstd,
+    title            varchar(256)   ENCODE zstd,
+    duration         numeric(18, 0) ENCODE az64,
+    "year"           int4           ENCODE az64
+)
+DISTSTYLE EVEN;
+
+INSERT INTO public.songs_stage_redesign (num_songs, artist_id, artist_name, artist_latitude, artist_longitude, artist_location, song_id, title, duration, "year") SELECT num_songs, artist_id, artist_name, artist_latitude, artist_longitude, artist_location, song_id, title, duration, "year" FROM public.songs_stage;
+
+ALTER TABLE public.songs_stage RENAME TO songs_stage_old;
+
+ALTER TABLE public.songs_stage_redesign RENAME TO songs_stage;
+
+DROP TABLE public.songs_stage_old;
+
+DROP TABLE IF EXISTS public.songplays_redesign;
+
+CREATE TABLE IF NOT EXISTS public.songplays_redesign
+(
+    play_id    varchar(32)  ENCODE zstd NOT NULL,
+    start_time timestamp    ENCODE raw NOT NULL,
+    user_id    int4         ENCODE az64 NOT NULL,
+    "level"    varchar(256) ENCODE zstd,
+    song_id    varchar(256) ENCODE zstd,
+    artist_id  varchar(256) ENCODE zstd,
+    session_id int4         ENCODE az64,
+    location   varchar(256) ENCODE zstd,
+    user_agent varchar(256) ENCODE zstd,
+    CONSTRAINT songplays_redesign_pkey PRIMARY KEY (play_id)
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (start_time);
+
+INSERT INTO public.songplays_redesign (play_id, start_time, user_id, "level", song_id, artist_id, session_id, location, user_agent) SELECT play_id, start_time, user_id, "level", song_id, artist_id, session_id, location, user_agent FROM public.songplays;
+
+ALTER TABLE public.songplays RENAME TO songplays_old;
+
+ALTER TABLE public.songplays_redesign RENAME TO songplays;
+
+DROP TABLE public.songplays_old;
+
+DROP TABLE IF EXISTS public.users_redesign;
+
+CREATE TABLE IF NOT EXISTS public.users_redesign
+(
+    user_id    int4         ENCODE raw NOT NULL,
+    first_name varchar(256) ENCODE zstd,
+    last_name  varchar(256) ENCODE zstd,
+    gender     varchar(256) ENCODE zstd,
+    "level"    varchar(256) ENCODE zstd,
+    CONSTRAINT users_redesign_pkey PRIMARY KEY (user_id)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (user_id);
+
+INSERT INTO public.users_redesign (user_id, first_name, last_name, gender, "level") SELECT user_id, first_name, last_name, gender, "level" FROM public.users;
+
+ALTER TABLE public.users RENAME TO users_old;
+
+ALTER TABLE public.users_redesign RENAME TO users;
+
+DROP TABLE public.users_old;
+
+DROP TABLE IF EXISTS public.songs_redesign;
+
+CREATE TABLE IF NOT EXISTS public.songs_redesign
+(
+    song_id   varchar(256)   ENCODE raw NOT NULL,
+    title     varchar(256)   ENCODE zstd,
+    artist_id varchar(256)   ENCODE zstd,
+    "year"    int4           ENCODE az64,
+    duration  numeric(18, 0) ENCODE az64,
+    CONSTRAINT songs_redesign_pkey PRIMARY KEY (song_id)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (song_id);
+
+INSERT INTO public.songs_redesign (song_id, title, artist_id, "year", duration) SELECT song_id, title, artist_id, "year", duration FROM public.songs;
+
+ALTER TABLE public.songs RENAME TO songs_old;
+
+ALTER TABLE public.songs_redesign RENAME TO songs;
+
+DROP TABLE public.songs_old;
+
+DROP TABLE IF EXISTS public.artists_redesign;
+
+CREATE TABLE IF NOT EXISTS public.artists_redesign
+(
+    artist_id varchar(256)   ENCODE raw NOT NULL,
+    name      varchar(256)   ENCODE zstd,
+    location  varchar(256)   ENCODE zstd,
+    latitude  numeric(18, 0) ENCODE az64,
+    longitude numeric(18, 0) ENCODE az64
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (artist_id);
+
+INSERT INTO public.artists_redesign (artist_id, name, location, latitude, longitude) SELECT artist_id, name, location, latitude, longitude FROM public.artists;
+
+ALTER TABLE public.artists RENAME TO artists_old;
+
+ALTER TABLE public.artists_redesign RENAME TO artists;
+
+DROP TABLE public.artists_old;
+
+DROP TABLE IF EXISTS public.time_redesign;
+
+CREATE TABLE IF NOT EXISTS public.time_redesign
+(
+    start_time timestamp    ENCODE raw NOT NULL,
+    "hour"     int4         ENCODE az64,
+    "day"      int4         ENCODE az64,
+    week       int4         ENCODE az64,
+    "month"    varchar(256) ENCODE zstd,
+    "year"     int4         ENCODE az64,
+    weekday    varchar(256) ENCODE zstd,
+    CONSTRAINT time_redesign_pkey PRIMARY KEY (start_time)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (start_time);
+
+INSERT INTO public.time_redesign (start_time, "hour", "day", week, "month", "year", weekday) SELECT start_time, "hour", "day", week, "month", "year", weekday FROM public."time";
+
+ALTER TABLE public."time" RENAME TO time_old;
+
+ALTER TABLE public.time_redesign RENAME TO "time";
+
+DROP TABLE public.time_old;
+
+DROP TABLE IF EXISTS public.song_match_redesign;
+
+CREATE TABLE IF NOT EXISTS public.song_match_redesign
+(
+    song_key  char(32)     ENCODE raw NOT NULL,
+    song_id   varchar(256) ENCODE zstd NOT NULL,
+    artist_id varchar(256) ENCODE zstd,
+    CONSTRAINT song_match_redesign_pkey PRIMARY KEY (song_key)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (song_key);
+
+INSERT INTO public.song_match_redesign (song_key, song_id, artist_id) SELECT song_key, song_id, artist_id FROM public.song_match;
+
+ALTER TABLE public.song_match RENAME TO song_match_old;
+
+ALTER TABLE public.song_match_redesign RENAME TO song_match;
+
+DROP TABLE public.song_match_old;
+
+DROP TABLE IF EXISTS public.calendar_redesign;
+
+CREATE TABLE IF NOT EXISTS public.calendar_redesign
+(
+    start_time timestamp    ENCODE raw NOT NULL,
+    "hour"     int4         ENCODE az64,
+    "day"      int4         ENCODE az64,
+    week       int4         ENCODE az64,
+    "month"    varchar(256) ENCODE zstd,
+    "year"     int4         ENCODE az64,
+    weekday    varchar(256) ENCODE zstd,
+    CONSTRAINT calendar_redesign_pkey PRIMARY KEY (start_time)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (start_time);
+
+INSERT INTO public.calendar_redesign (start_time, "hour", "day", week, "month", "year", weekday) SELECT start_time, "hour", "day", week, "month", "year", weekday FROM public.calendar;
+
+ALTER TABLE public.calendar RENAME TO calendar_old;
+
+ALTER TABLE public.calendar_redesign RENAME TO calendar;
+
+DROP TABLE public.calendar_old;
+
+DROP TABLE IF EXISTS public.stage_load_ledger_redesign;
+
+CREATE TABLE IF NOT EXISTS public.stage_load_ledger_redesign
+(
+    target_table varchar(256)  ENCODE raw NOT NULL,
+    s3_key       varchar(1024) ENCODE zstd NOT NULL,
+    etag         varchar(64)   ENCODE zstd NOT NULL,
+    size         int8          ENCODE az64 NOT NULL,
+    loaded_at    timestamp     ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (target_table, loaded_at);
+
+INSERT INTO public.stage_load_ledger_redesign (target_table, s3_key, etag, size, loaded_at) SELECT target_table, s3_key, etag, size, loaded_at FROM public.stage_load_ledger;
+
+ALTER TABLE public.stage_load_ledger RENAME TO stage_load_ledger_old;
+
+ALTER TABLE public.stage_load_ledger_redesign RENAME TO stage_load_ledger;
+
+DROP TABLE public.stage_load_ledger_old;
+
+DROP TABLE IF EXISTS public.etl_window_coverage_redesign;
+
+CREATE TABLE IF NOT EXISTS public.etl_window_coverage_redesign
+(
+    dag_id       varchar(256) ENCODE zstd NOT NULL,
+    window_start timestamp    ENCODE raw NOT NULL,
+    window_end   timestamp    ENCODE az64 NOT NULL,
+    covered_at   timestamp    ENCODE az64 NOT NULL
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (window_start);
+
+INSERT INTO public.etl_window_coverage_redesign (dag_id, window_start, window_end, covered_at) SELECT dag_id, window_start, window_end, covered_at FROM public.etl_window_coverage;
+
+ALTER TABLE public.etl_window_coverage RENAME TO etl_window_coverage_old;
+
+ALTER TABLE public.etl_window_coverage_redesign RENAME TO etl_window_coverage;
+
+DROP TABLE public.etl_window_coverage_old;
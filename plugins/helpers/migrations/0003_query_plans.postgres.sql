@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS public.etl_query_plans
+(
+    dag_id                varchar(256)   NOT NULL,
+    task_id               varchar(256)   NOT NULL,
+    statement_fingerprint char(16)       NOT NULL,
+    plan_fingerprint      char(16)       NOT NULL,
+    total_cost            float8         NOT NULL,
+    plan                  varchar(65535),
+    captured_at           timestamp      NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_query_plans_sortkey_idx ON public.etl_query_plans (dag_id, task_id, captured_at);
@@ -0,0 +1,12 @@
+CREATE TABLE IF NOT EXISTS public.etl_query_plans
+(
+    dag_id                varchar(256)   ENCODE raw NOT NULL,
+    task_id               varchar(256)   ENCODE zstd NOT NULL,
+    statement_fingerprint char(16)       ENCODE zstd NOT NULL,
+    plan_fingerprint      char(16)       ENCODE zstd NOT NULL,
+    total_cost            float8         ENCODE zstd NOT NULL,
+    plan                  varchar(65535) ENCODE zstd,
+    captured_at           timestamp      ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, task_id, captured_at);
@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS public.etl_quality_results
+(
+    dag_id            varchar(256)  NOT NULL,
+    run_id            varchar(256)  NOT NULL,
+    try_number        int4          NOT NULL,
+    check_id          char(16)      NOT NULL,
+    check_name        varchar(1024) NOT NULL,
+    table_fingerprint char(16),
+    passed            boolean       NOT NULL,
+    recorded_at       timestamp     NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_quality_results_sortkey_idx ON public.etl_quality_results (dag_id, run_id, recorded_at);
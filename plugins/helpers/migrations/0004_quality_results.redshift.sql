@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS public.etl_quality_results
+(
+    dag_id            varchar(256)  ENCODE raw NOT NULL,
+    run_id            varchar(256)  ENCODE zstd NOT NULL,
+    try_number        int4          ENCODE az64 NOT NULL,
+    check_id          char(16)      ENCODE zstd NOT NULL,
+    check_name        varchar(1024) ENCODE zstd NOT NULL,
+    table_fingerprint char(16)      ENCODE zstd,
+    passed            boolean       ENCODE raw NOT NULL,
+    recorded_at       timestamp     ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, run_id, recorded_at);
@@ -0,0 +1,26 @@
+CREATE TABLE IF NOT EXISTS public.etl_quality_snapshots
+(
+    dag_id      varchar(256) NOT NULL,
+    run_id      varchar(256) NOT NULL,
+    table_name  varchar(256) NOT NULL,
+    fingerprint char(16)     NOT NULL,
+    row_count   int8         NOT NULL,
+    max_key     varchar(256),
+    passed      boolean      NOT NULL,
+    recorded_at timestamp    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_quality_snapshots_sortkey_idx ON public.etl_quality_snapshots (dag_id, table_name, recorded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_metrics
+(
+    dag_id       varchar(256) NOT NULL,
+    run_id       varchar(256) NOT NULL,
+    table_name   varchar(256) NOT NULL,
+    column_name  varchar(256),
+    metric       varchar(64)  NOT NULL,
+    metric_value float8       NOT NULL,
+    recorded_at  timestamp    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_quality_metrics_sortkey_idx ON public.etl_quality_metrics (dag_id, table_name, recorded_at);
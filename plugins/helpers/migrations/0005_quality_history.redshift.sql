@@ -0,0 +1,26 @@
+CREATE TABLE IF NOT EXISTS public.etl_quality_snapshots
+(
+    dag_id      varchar(256) ENCODE raw NOT NULL,
+    run_id      varchar(256) ENCODE zstd NOT NULL,
+    table_name  varchar(256) ENCODE zstd NOT NULL,
+    fingerprint char(16)     ENCODE zstd NOT NULL,
+    row_count   int8         ENCODE az64 NOT NULL,
+    max_key     varchar(256) ENCODE zstd,
+    passed      boolean      ENCODE raw NOT NULL,
+    recorded_at timestamp    ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, table_name, recorded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_metrics
+(
+    dag_id       varchar(256) ENCODE raw NOT NULL,
+    run_id       varchar(256) ENCODE zstd NOT NULL,
+    table_name   varchar(256) ENCODE zstd NOT NULL,
+    column_name  varchar(256) ENCODE zstd,
+    metric       varchar(64)  ENCODE zstd NOT NULL,
+    metric_value float8       ENCODE zstd NOT NULL,
+    recorded_at  timestamp    ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, table_name, recorded_at);
@@ -0,0 +1,80 @@
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Parquet types for Postgres type OIDs, from pg_type; anything else, e.g. json or uuid, is written as a string
+NUMERIC_OID = 1700
+STRING_OIDS = {18, 25, 1042, 1043}
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1082: pa.date32(),
+    1114: pa.timestamp('us'),
+    1184: pa.timestamp('us', tz='UTC'),
+}
+
+
+def arrow_schema(description):
+    """
+    Maps a psycopg2 cursor's description to a Parquet schema. Numerics with a declared precision become decimals, and
+    unconstrained ones doubles.
+    :param description: the cursor's description
+    :return: the pyarrow schema
+    """
+    fields = []
+    for column in description:
+        name, type_code, precision, scale = column[0], column[1], column[4], column[5]
+        if type_code == NUMERIC_OID:
+            arrow_type = pa.decimal128(precision, scale or 0) if precision and precision <= 38 else pa.float64()
+        elif type_code in STRING_OIDS:
+            arrow_type = pa.string()
+        else:
+            arrow_type = ARROW_TYPES.get(type_code, pa.string())
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def batch_table(rows, schema):
+    """
+    :param rows: a batch of rows, as tuples
+    :param schema: the schema from arrow_schema
+    :return: the batch as a pyarrow table
+    """
+    columns = []
+    for index, field in enumerate(schema):
+        values = [row[index] for row in rows]
+        if field.type == pa.float64():
+            values = [None if value is None else float(value) for value in values]
+        elif field.type == pa.string():
+            values = [None if value is None or isinstance(value, str) else str(value) for value in values]
+        columns.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def write_cursor(cursor, path, batch_rows=50000, compression='snappy'):
+    """
+    Writes a cursor's rows to a Parquet file one row group per batch, so only a batch is held in memory at a time. With
+    a server-side (named) cursor, each fetchmany reads just one batch from the server.
+    :param cursor: a cursor that has executed its query
+    :param path: the file to write
+    :param batch_rows: how many rows to fetch and write at a time
+    :param compression: the Parquet compression codec
+    :return: the number of rows written; if there were none, no file is written
+    """
+    rows = cursor.fetchmany(batch_rows)
+    if not rows:
+        return 0
+    schema = arrow_schema(cursor.description)
+    written = 0
+    writer = pq.ParquetWriter(path, schema, compression=compression)
+    try:
+        while rows:
+            writer.write_table(batch_table(rows, schema))
+            written += len(rows)
+            rows = cursor.fetchmany(batch_rows)
+    finally:
+        writer.close()
+    return written
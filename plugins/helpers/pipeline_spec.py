@@ -0,0 +1,47 @@
+import json
+
+from helpers.sql_queries import SqlQueries
+from helpers.test_helpers import TestHelpers
+
+REQUIRED_SECTIONS = ('s3', 'staging', 'song_match', 'fact', 'dimensions', 'time', 'quality')
+
+
+def load_pipeline_spec(path):
+    """
+    Loads and compiles a declarative pipeline spec such as dags/sparkify_pipeline.json
+    :param path: the spec's path
+    :return: the compiled spec
+    """
+    with open(path) as spec_file:
+        return compile_pipeline_spec(json.load(spec_file))
+
+
+def compile_pipeline_spec(spec):
+    """
+    Validates a pipeline spec and resolves its references: `sql` names become the SqlQueries statements, dimensions
+    are merged into their SqlQueries.dimension_targets specs and the quality `tests` name becomes the TestHelpers dict
+    :param spec: the parsed spec
+    :return: the compiled spec
+    """
+    missing = [section for section in REQUIRED_SECTIONS if section not in spec]
+    if missing:
+        raise ValueError(f"Pipeline spec is missing {missing}")
+
+    compiled = json.loads(json.dumps(spec))
+    for section in ('song_match', 'fact'):
+        compiled[section]['sql'] = resolve(SqlQueries, spec[section]['sql'])
+    compiled['dimensions'] = {table: dict(resolve(SqlQueries, 'dimension_targets')[table], **options)
+                              for table, options in spec['dimensions'].items()}
+    compiled['quality']['tests'] = resolve(TestHelpers, spec['quality']['tests'])
+    return compiled
+
+
+def resolve(helper, name):
+    """
+    :param helper: the helper class to look the name up on
+    :param name: the attribute name
+    :return: the attribute
+    """
+    if not hasattr(helper, name):
+        raise ValueError(f"{helper.__name__} has no {name!r}")
+    return getattr(helper, name)
@@ -0,0 +1,157 @@
+import hashlib
+from datetime import datetime
+
+from helpers.execution_window import sql_timestamp
+from helpers.load_ledger import quote
+
+
+def check_id(check):
+    """
+    :param check: a QualityCheck
+    :return: a short hash identifying the check by its name and its key, or its query if it has none
+    """
+    return hashlib.sha1(f"{check.name}\n{check.key or check.sql}".encode('utf-8')).hexdigest()[:16]
+
+
+class QualityCheckpoint:
+    """
+    Records the outcome of each quality check of a DAG run in the `table`, along with a fingerprint of the state of the
+    tables it read, so a retry of the run can skip the checks that already passed against tables that haven't changed
+    since and only re-run the checks that failed, errored or are stale.
+
+    Table state comes from catalog counters that change with every insert, update and delete, so fingerprinting is
+    cheap no matter how big the tables are: svv_table_info's row count (which includes deleted rows until a vacuum) and
+    size on Redshift, and pg_stat_user_tables' tuple counters on Postgres. A check that names no tables is never skipped.
+    """
+    table_state_sql = {
+        'redshift': """
+            SELECT "table", tbl_rows, size
+            FROM svv_table_info
+            WHERE "table" IN ({})
+        """,
+        'postgres': """
+            SELECT relname, n_tup_ins, n_tup_upd, n_tup_del, n_live_tup
+            FROM pg_stat_user_tables
+            WHERE relname IN ({})
+        """,
+    }
+    passed_sql = """
+        SELECT check_id, table_fingerprint, try_number
+        FROM {}
+        WHERE dag_id = '{}' AND run_id = '{}' AND passed
+    """
+    insert_sql = """
+        INSERT INTO {} (dag_id, run_id, try_number, check_id, check_name, table_fingerprint, passed, recorded_at)
+        VALUES ('{}', '{}', {}, '{}', '{}', {}, {}, {})
+    """
+
+    def __init__(self, hook, dag_id, run_id, try_number, dialect='redshift', table='etl_quality_results'):
+        """
+        :param hook: the hook to read table state and record results with
+        :param dag_id: the DAG id
+        :param run_id: the DAG run's id
+        :param try_number: the task's try number
+        :param dialect: 'redshift' or 'postgres', which picks where table state is read from
+        :param table: the table results are recorded in
+        """
+        if dialect not in QualityCheckpoint.table_state_sql:
+            raise ValueError(f"dialect must be one of {sorted(QualityCheckpoint.table_state_sql)}, not {dialect!r}")
+        self.hook = hook
+        self.dag_id = dag_id
+        self.run_id = run_id
+        self.try_number = try_number
+        self.dialect = dialect
+        self.table = table
+
+    @classmethod
+    def for_task(cls, hook, context, dialect='redshift', table='etl_quality_results'):
+        """
+        :param hook: the hook to read table state and record results with
+        :param context: the task context
+        :param dialect: 'redshift' or 'postgres'
+        :param table: the table results are recorded in
+        :return: a QualityCheckpoint for the task's DAG run and try
+        """
+        return cls(hook, context['dag'].dag_id, context['run_id'], context['ti'].try_number, dialect, table)
+
+    def table_fingerprints(self, tables):
+        """
+        :param tables: the tables to fingerprint
+        :return: dict of table -> a hash of its state, or 'missing' for tables the catalog has no state for
+        """
+        return QualityCheckpoint.catalog_fingerprints(self.hook, self.dialect, tables)
+
+    @staticmethod
+    def catalog_fingerprints(hook, dialect, tables):
+        """
+        :param hook: the hook to read the catalog with
+        :param dialect: 'redshift' or 'postgres'
+        :param tables: the tables to fingerprint
+        :return: dict of table -> a hash of its catalog counters, or 'missing' for tables the catalog has no state for
+        """
+        names = sorted({table.split('.')[-1] for table in tables})
+        if not names:
+            return {}
+        sql = QualityCheckpoint.table_state_sql[dialect].format(', '.join(f"'{quote(name)}'" for name in names))
+        states = {row[0].strip(): row[1:] for row in hook.get_records(sql)}
+        return {table: hashlib.sha1(repr(states[table.split('.')[-1]]).encode('utf-8')).hexdigest()[:16]
+                if table.split('.')[-1] in states else 'missing' for table in tables}
+
+    @staticmethod
+    def check_fingerprint(check, fingerprints):
+        """
+        :param check: a QualityCheck
+        :param fingerprints: dict of table -> fingerprint, from table_fingerprints
+        :return: a hash of the state of every table the check reads, or None if it names none
+        """
+        if not check.tables:
+            return None
+        state = '\n'.join(f"{table}:{fingerprints[table]}" for table in sorted(check.tables))
+        return hashlib.sha1(state.encode('utf-8')).hexdigest()[:16]
+
+    def passed(self):
+        """
+        :return: dict of check id -> (table fingerprint, try number) of the checks that passed on an earlier try
+        """
+        records = self.hook.get_records(QualityCheckpoint.passed_sql.format(self.table, self.dag_id, quote(self.run_id)))
+        return {record[0]: (record[1], record[2]) for record in records}
+
+    def plan(self, checks):
+        """
+        Splits checks into those to run and those that already passed against the tables' current state
+        :param checks: list of QualityCheck
+        :return: tuple of the checks to run, dict of check id -> the try each skipped check passed on, and dict of
+            check id -> fingerprint for every check
+        """
+        fingerprints = self.table_fingerprints([table for check in checks for table in check.tables])
+        check_fingerprints = {check_id(check): self.check_fingerprint(check, fingerprints) for check in checks}
+        passed = self.passed()
+
+        to_run, skipped = [], {}
+        for check in checks:
+            identity = check_id(check)
+            fingerprint = check_fingerprints[identity]
+            if fingerprint and identity in passed and passed[identity][0] == fingerprint:
+                skipped[identity] = passed[identity][1]
+            else:
+                to_run.append(check)
+        return to_run, skipped, check_fingerprints
+
+    def record(self, results, check_fingerprints):
+        """
+        Records the outcome of the checks that ran on this try
+        :param results: list of (QualityCheck, True if it passed)
+        :param check_fingerprints: dict of check id -> fingerprint, from plan
+        :return: None
+        """
+        if not results:
+            return
+        recorded_at = sql_timestamp(datetime.utcnow())
+        statements = []
+        for check, passed in results:
+            identity = check_id(check)
+            fingerprint = check_fingerprints.get(identity)
+            statements.append(QualityCheckpoint.insert_sql.format(
+                self.table, self.dag_id, quote(self.run_id), self.try_number, identity, quote(check.name[:1024]),
+                f"'{fingerprint}'" if fingerprint else 'NULL', 'TRUE' if passed else 'FALSE', recorded_at))
+        self.hook.run(statements)
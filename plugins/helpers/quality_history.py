@@ -0,0 +1,164 @@
+import hashlib
+import statistics
+from datetime import datetime
+
+from helpers.execution_window import sql_timestamp
+from helpers.load_ledger import quote
+from helpers.quality_checkpoint import QualityCheckpoint
+
+ANOMALY_ACTIONS = ('fail', 'warn')
+
+
+def delta_band(deltas, k=4.0, min_width=1.0):
+    """
+    Learns the band a table's row count delta usually falls in: the median delta plus or minus k scaled median absolute
+    deviations, which a few past outliers can't stretch the way they would a standard deviation
+    :param deltas: the row count deltas between past runs
+    :param k: how many deviations wide the band is on either side
+    :param min_width: the least the band may extend on either side, so a table that never changes can still grow a bit
+    :return: tuple of the band's lower and upper bounds
+    """
+    median = statistics.median(deltas)
+    deviation = statistics.median(abs(delta - median) for delta in deltas) * 1.4826
+    width = max(k * deviation, min_width)
+    return median - width, median + width
+
+
+class QualityHistory:
+    """
+    Keeps a history of quality metrics across runs. Each run records, for every table in tests_to_run's `history`, a
+    snapshot of its state in `snapshots_table`: its exact row count, the max of its `key` column (e.g. the max loaded
+    timestamp) and a fingerprint of the catalog counters QualityCheckpoint reads, which change with every insert, update
+    and delete. The row counts and null counts the run's checks arrive at are recorded in `metrics_table`.
+
+    The history lets the quality operator skip profiling a table whose fingerprint matches its last passing snapshot,
+    and flag a run whose row count delta falls outside the band learned from the deltas between earlier passing runs.
+    """
+    state_sql = "SELECT '{table}', COUNT(*), CAST(MAX({key}) AS varchar(256)) FROM {table}"
+    snapshots_sql = """
+        SELECT table_name, run_id, fingerprint, row_count, passed
+        FROM (SELECT table_name, run_id, fingerprint, row_count, passed,
+                     ROW_NUMBER() OVER (PARTITION BY table_name ORDER BY recorded_at DESC, run_id DESC) AS age
+              FROM {}
+              WHERE dag_id = '{}' AND run_id <> '{}' AND table_name IN ({})) snapshots
+        WHERE age <= {}
+        ORDER BY table_name, age
+    """
+    snapshot_insert_sql = """
+        INSERT INTO {} (dag_id, run_id, table_name, fingerprint, row_count, max_key, passed, recorded_at)
+        VALUES ('{}', '{}', '{}', '{}', {}, {}, {}, {})
+    """
+    metric_insert_sql = """
+        INSERT INTO {} (dag_id, run_id, table_name, column_name, metric, metric_value, recorded_at)
+        VALUES ('{}', '{}', '{}', {}, '{}', {}, {})
+    """
+
+    def __init__(self, hook, dag_id, run_id, snapshots_table='etl_quality_snapshots',
+                 metrics_table='etl_quality_metrics', history_runs=30, dialect='redshift'):
+        """
+        :param hook: the hook to read state and history with, and record them through
+        :param dag_id: the DAG id
+        :param run_id: the DAG run's id, whose own earlier snapshots (from earlier tries) are ignored
+        :param snapshots_table: the table snapshots are recorded in
+        :param metrics_table: the table metrics are recorded in
+        :param history_runs: how many past snapshots of each table to learn from
+        :param dialect: 'redshift' or 'postgres', which picks where the catalog counters are read from
+        """
+        if dialect not in QualityCheckpoint.table_state_sql:
+            raise ValueError(f"dialect must be one of {sorted(QualityCheckpoint.table_state_sql)}, not {dialect!r}")
+        self.hook = hook
+        self.dag_id = dag_id
+        self.run_id = run_id
+        self.snapshots_table = snapshots_table
+        self.metrics_table = metrics_table
+        self.history_runs = history_runs
+        self.dialect = dialect
+
+    @classmethod
+    def for_task(cls, hook, context, params):
+        """
+        :param hook: the hook to read state and history with
+        :param context: the task context
+        :param params: the task params, with the optional snapshots_table, metrics_table, history_runs and dialect
+        :return: a QualityHistory for the task's DAG run
+        """
+        return cls(hook, context['dag'].dag_id, context['run_id'],
+                   params.get('snapshots_table', 'etl_quality_snapshots'),
+                   params.get('metrics_table', 'etl_quality_metrics'),
+                   params.get('history_runs', 30),
+                   params.get('dialect', 'redshift'))
+
+    def table_states(self, config):
+        """
+        Reads every table's row count and max key in one query, and its catalog counters in another. The counters are
+        folded into the fingerprint with the row count and max key, which still tell apart the states of a table the
+        catalog has no counters for (e.g. an empty table on Redshift).
+        :param config: dict of table -> its history config, with the `key` column
+        :return: dict of table -> dict of its row_count, max_key and fingerprint
+        """
+        sql = '\nUNION ALL\n'.join(QualityHistory.state_sql.format(table=table, key=options['key'])
+                                   for table, options in config.items())
+        counters = QualityCheckpoint.catalog_fingerprints(self.hook, self.dialect, list(config))
+        states = {}
+        for table, row_count, max_key in self.hook.get_records(sql):
+            state = f"{counters.get(table, 'missing')}|{row_count}|{max_key}"
+            fingerprint = hashlib.sha1(state.encode('utf-8')).hexdigest()[:16]
+            states[table] = {'row_count': row_count, 'max_key': max_key, 'fingerprint': fingerprint}
+        return states
+
+    def snapshots(self, tables):
+        """
+        :param tables: the tables to read the history of
+        :return: dict of table -> list of its recent snapshots from other runs, newest first
+        """
+        history = {table: [] for table in tables}
+        if not tables:
+            return history
+        sql = QualityHistory.snapshots_sql.format(self.snapshots_table, self.dag_id, quote(self.run_id),
+                                                  ', '.join(f"'{table}'" for table in tables), self.history_runs)
+        for table, run_id, fingerprint, row_count, passed in self.hook.get_records(sql):
+            history[table].append({'run_id': run_id, 'fingerprint': fingerprint.strip(), 'row_count': row_count,
+                                   'passed': passed})
+        return history
+
+    @staticmethod
+    def last_passing(snapshots):
+        """
+        :param snapshots: a table's snapshots, newest first
+        :return: its newest passing snapshot, or None
+        """
+        return next((snapshot for snapshot in snapshots if snapshot['passed']), None)
+
+    @staticmethod
+    def row_count_band(snapshots, options):
+        """
+        :param snapshots: a table's snapshots, newest first
+        :param options: the table's history config, with the optional band, min_history and min_band_pct
+        :return: tuple of the bounds the next row count delta is expected in, or None if there's too little history
+        """
+        counts = [snapshot['row_count'] for snapshot in snapshots if snapshot['passed']]
+        deltas = [newer - older for newer, older in zip(counts, counts[1:])]
+        if not counts or len(deltas) < options.get('min_history', 5):
+            return None
+        min_width = max(1.0, counts[0] * options.get('min_band_pct', 1.0) / 100)
+        return delta_band(deltas, options.get('band', 4.0), min_width)
+
+    def record(self, states, metrics, table_passed):
+        """
+        Records the run's snapshots and metrics
+        :param states: dict of table -> state, from table_states
+        :param metrics: list of (table, column or None, metric, value)
+        :param table_passed: dict of table -> False if any of its checks failed
+        :return: None
+        """
+        recorded_at = sql_timestamp(datetime.utcnow())
+        run_id = quote(self.run_id)
+        statements = [QualityHistory.snapshot_insert_sql.format(
+            self.snapshots_table, self.dag_id, run_id, table, state['fingerprint'], state['row_count'],
+            f"'{quote(state['max_key'])}'" if state['max_key'] is not None else 'NULL',
+            'TRUE' if table_passed.get(table, True) else 'FALSE', recorded_at) for table, state in states.items()]
+        statements.extend(QualityHistory.metric_insert_sql.format(
+            self.metrics_table, self.dag_id, run_id, table, f"'{column}'" if column else 'NULL', metric, value,
+            recorded_at) for table, column, metric, value in metrics if value is not None)
+        if statements:
+            self.hook.run(statements)
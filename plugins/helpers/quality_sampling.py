@@ -0,0 +1,76 @@
+import math
+from statistics import NormalDist
+
+# The planner's row estimate for each table, kept up to date by ANALYZE (and on Redshift by auto analyze)
+ESTIMATE_SQL = {
+    'redshift': """
+        SELECT "table", tbl_rows
+        FROM svv_table_info
+        WHERE "table" IN ({})
+    """,
+    'postgres': """
+        SELECT relname, reltuples
+        FROM pg_class
+        WHERE relkind = 'r' AND relname IN ({})
+    """,
+}
+# Dialects that can sample without reading the whole table. Redshift has no TABLESAMPLE, and filtering on RANDOM()
+# still reads every block of the profiled columns, so a sample costs about as much as an exact profile; tables listed
+# for sampling are checked exactly there.
+SAMPLING_DIALECTS = ('postgres',)
+
+
+def estimate_rows(hook, tables, dialect='redshift'):
+    """
+    Reads the catalog's row estimates, which cost the same however big the tables are
+    :param hook: the hook to query the catalog with
+    :param tables: the tables to estimate
+    :param dialect: 'redshift' or 'postgres'
+    :return: dict of table -> estimated rows, for the tables the catalog has an estimate for
+    """
+    if dialect not in ESTIMATE_SQL:
+        raise ValueError(f"dialect must be one of {sorted(ESTIMATE_SQL)}, not {dialect!r}")
+    names = {table.split('.')[-1]: table for table in tables}
+    if not names:
+        return {}
+    records = hook.get_records(ESTIMATE_SQL[dialect].format(', '.join(f"'{name}'" for name in sorted(names))))
+    return {names[name.strip()]: float(rows) for name, rows in records if rows is not None and float(rows) > 0}
+
+
+def sample_fraction(estimated_rows, sample_rows):
+    """
+    :param estimated_rows: the table's estimated row count, or None if unknown
+    :param sample_rows: the number of rows to sample
+    :return: the fraction of the table to sample, or None if the table is small (or unknown) enough to check exactly
+    """
+    if not estimated_rows or estimated_rows <= sample_rows:
+        return None
+    return sample_rows / estimated_rows
+
+
+def sample_clause(fraction):
+    """
+    Samples a fraction of a table's rows. Postgres reads only a random fraction of its pages with TABLESAMPLE SYSTEM,
+    so the cost depends on the sample size alone.
+    :param fraction: the fraction of rows to sample
+    :return: the clause to follow the table name with
+    """
+    return f"TABLESAMPLE SYSTEM ({fraction * 100:.6f})"
+
+
+def wilson_interval(successes, trials, confidence=0.95):
+    """
+    The Wilson score interval for a proportion, which stays inside [0, 1] and behaves near 0% and 100%
+    :param successes: how many sampled rows matched, e.g. were null
+    :param trials: how many rows were sampled
+    :param confidence: the confidence level, e.g. 0.95
+    :return: tuple of the interval's lower and upper bounds, as fractions
+    """
+    if not trials:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / trials
+    denominator = 1 + z ** 2 / trials
+    centre = (p + z ** 2 / (2 * trials)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
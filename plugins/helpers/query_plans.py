@@ -0,0 +1,233 @@
+import hashlib
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+
+from helpers.execution_window import sql_timestamp
+from helpers.load_ledger import quote
+
+PLAN_CHECK_MODES = ('warn', 'fail')
+# Hash and merge joins with their kind, e.g. Hash Left Join or Merge Anti Join, and nested loops of any kind
+JOIN_TYPES = re.compile(r'\b(?:(?:Hash|Merge)(?: \w+){0,2} Join|Nested Loop)\b')
+# Redshift's redistribution and broadcast steps; DS_DIST_NONE and DS_DIST_ALL_NONE mean the join is collocated
+REDISTRIBUTION = re.compile(r'\bDS_(?:BCAST_INNER|DIST_ALL_INNER|DIST_INNER|DIST_OUTER|DIST_BOTH)\b')
+_COST = re.compile(r'\(cost=([\d.]+)\.\.([\d.]+)[^)]*\)')
+
+
+def parse_plan(lines):
+    """
+    Reduces EXPLAIN output, from Redshift or Postgres, to the shape of its plan: the indented node lines with their
+    costs and row estimates removed, so the shape only changes when the planner picks a different plan
+    :param lines: the lines of EXPLAIN output
+    :return: dict of the plan's normalized nodes, fingerprint and estimated total cost
+    """
+    nodes, total_cost = [], None
+    for line in lines:
+        cost = _COST.search(line)
+        if not cost:
+            continue
+        if total_cost is None:
+            total_cost = float(cost.group(2))
+        depth = len(line) - len(line.lstrip())
+        node = _COST.sub('', line).strip()
+        node = re.sub(r'^->\s*', '', node)
+        node = re.sub(r'^XN\s+', '', node)
+        nodes.append(f"{depth}:{' '.join(node.split())}")
+    return {
+        'nodes': nodes,
+        'fingerprint': hashlib.sha1('\n'.join(nodes).encode('utf-8')).hexdigest()[:16],
+        'total_cost': total_cost or 0.0,
+    }
+
+
+def plan_changes(previous, current, cost_ratio=2.0):
+    """
+    Compares a plan with the previous plan of the same statement
+    :param previous: the previous plan, from parse_plan
+    :param current: the current plan, from parse_plan
+    :param cost_ratio: how many times the previous estimated cost counts as a jump
+    :return: tuple of a list of regressions (new nested loops or redistribution steps, cost jumps) and a list of other
+        changes to the plan's shape
+    """
+    regressions, changes = [], []
+    previous_joins, current_joins = join_types(previous['nodes']), join_types(current['nodes'])
+    for join in current_joins - previous_joins:
+        if join == 'Nested Loop':
+            regressions.append(f"{join} appeared (was {dict(previous_joins) or 'no joins'})")
+        else:
+            changes.append(f"{join} appeared")
+
+    previous_steps = Counter(REDISTRIBUTION.findall('\n'.join(previous['nodes'])))
+    for step in Counter(REDISTRIBUTION.findall('\n'.join(current['nodes']))) - previous_steps:
+        regressions.append(f"new {step} step")
+
+    if previous['total_cost'] and current['total_cost'] >= previous['total_cost'] * cost_ratio:
+        regressions.append(f"estimated cost rose from {previous['total_cost']:.2f} to {current['total_cost']:.2f}")
+
+    if previous['fingerprint'] != current['fingerprint'] and not regressions and not changes:
+        changes.append("plan shape changed")
+    return regressions, changes
+
+
+def join_types(nodes):
+    """
+    :param nodes: normalized plan nodes
+    :return: Counter of the join types used
+    """
+    return Counter(join for node in nodes for join in JOIN_TYPES.findall(node))
+
+
+def truncate_bytes(text, max_bytes):
+    """
+    :param text: the text to truncate
+    :param max_bytes: the most UTF-8 bytes to keep, e.g. the length of the varchar it's stored in
+    :return: the text cut to at most max_bytes bytes, without splitting a character
+    """
+    return text.encode('utf-8')[:max_bytes].decode('utf-8', 'ignore')
+
+
+class PlanGuard:
+    """
+    Captures the plan of each statement a task runs with EXPLAIN, before it is executed, and compares it with the plan
+    last recorded for the same statement by the task (by fingerprint, so windowed runs of a query are compared with each
+    other). Regressions are logged as warnings in 'warn' mode or raise in 'fail' mode; other shape changes
+    are only logged.
+
+    A plan's fingerprint, estimated cost and nodes are saved to the `table` only when its shape changes or its cost
+    moves `cost_ratio` times up or down from the plan recorded last, so a stable statement keeps a single row and only
+    the latest row per statement is read back. Rows older than `retention_days` are deleted, except each statement's
+    latest.
+    """
+    max_plan_length = 65535
+    select_sql = """
+        SELECT statement_fingerprint, plan_fingerprint, total_cost, plan
+        FROM (SELECT statement_fingerprint, plan_fingerprint, total_cost, plan,
+                     ROW_NUMBER() OVER (PARTITION BY statement_fingerprint ORDER BY captured_at DESC) AS age
+              FROM {}
+              WHERE dag_id = '{}' AND task_id = '{}') plans
+        WHERE age = 1
+    """
+    prune_sql = """
+        DELETE FROM {table}
+        USING (SELECT statement_fingerprint, MAX(captured_at) AS captured_at
+               FROM {table}
+               WHERE dag_id = '{dag_id}' AND task_id = '{task_id}'
+               GROUP BY statement_fingerprint) latest
+        WHERE {table}.dag_id = '{dag_id}' AND {table}.task_id = '{task_id}'
+            AND {table}.statement_fingerprint = latest.statement_fingerprint
+            AND {table}.captured_at < latest.captured_at
+            AND {table}.captured_at < {cutoff}
+    """
+    insert_sql = """
+        INSERT INTO {} (dag_id, task_id, statement_fingerprint, plan_fingerprint, total_cost, plan, captured_at)
+        VALUES ('{}', '{}', '{}', '{}', {}, '{}', {})
+    """
+
+    def __init__(self, hook, log, dag_id, task_id, mode='warn', cost_ratio=2.0, table='etl_query_plans',
+                 retention_days=90):
+        """
+        :param hook: the hook to EXPLAIN with and record plans through
+        :param log: the task's logger
+        :param dag_id: the DAG id
+        :param task_id: the task id
+        :param mode: 'warn' or 'fail'
+        :param cost_ratio: how many times the previous estimated cost counts as a regression
+        :param table: the table plans are recorded in
+        :param retention_days: how many days superseded plans are kept
+        """
+        if mode not in PLAN_CHECK_MODES:
+            raise ValueError(f"plan_check must be one of {PLAN_CHECK_MODES}, not {mode!r}")
+        self.hook = hook
+        self.log = log
+        self.dag_id = dag_id
+        self.task_id = task_id
+        self.mode = mode
+        self.cost_ratio = cost_ratio
+        self.table = table
+        self.retention_days = retention_days
+        self._previous = None
+        self._pruned = False
+
+    @classmethod
+    def for_task(cls, hook, log, context, mode, cost_ratio=2.0, table='etl_query_plans', retention_days=90):
+        """
+        :param hook: the hook to EXPLAIN with
+        :param log: the task's logger
+        :param context: the task context
+        :param mode: the task's opt-in `plan_check` mode, 'warn' or 'fail'
+        :param cost_ratio: the task's `plan_cost_ratio`
+        :param table: the task's `plan_table`
+        :param retention_days: the task's `plan_retention_days`
+        :return: a PlanGuard for the task, or None if mode isn't set
+        """
+        if not mode:
+            return None
+        return cls(hook, log, context['dag'].dag_id, context['task'].task_id, mode, cost_ratio, table, retention_days)
+
+    def check(self, name, sql, fingerprint):
+        """
+        Explains a statement, compares its plan with the one recorded last and records it if it changed
+        :param name: a name for the statement in log messages
+        :param sql: the statement to explain
+        :param fingerprint: the statement's fingerprint, e.g. from statement_fingerprint
+        :return: the plan, from parse_plan
+        """
+        plan = parse_plan(row[0] for row in self.hook.get_records(f"EXPLAIN {sql}"))
+        previous = self.previous_plans().get(fingerprint)
+        self.log.info(f"Plan of {name}: {plan['fingerprint']}, estimated cost {plan['total_cost']:.2f}")
+
+        if previous:
+            regressions, changes = plan_changes(previous, plan, self.cost_ratio)
+            for change in changes:
+                self.log.info(f"Plan of {name} changed: {change}")
+            if regressions:
+                message = f"Plan of {name} regressed: {'; '.join(regressions)}\n" + '\n'.join(plan['nodes'])
+                if self.mode == 'fail':
+                    raise ValueError(message)
+                self.log.warning(message)
+
+        if self.changed(previous, plan):
+            self.record(fingerprint, plan)
+        return plan
+
+    def changed(self, previous, plan):
+        """
+        :param previous: the plan recorded last for the statement, or None
+        :param plan: the current plan
+        :return: whether the plan's shape changed or its cost moved at least cost_ratio times up or down
+        """
+        if not previous or previous['fingerprint'] != plan['fingerprint']:
+            return True
+        low, high = sorted((previous['total_cost'], plan['total_cost']))
+        return high >= low * self.cost_ratio if low else high > 0
+
+    def record(self, fingerprint, plan):
+        """
+        Records a statement's plan, and on the first record of the run deletes the task's plans past retention that
+        have been superseded
+        :param fingerprint: the statement's fingerprint
+        :param plan: the plan, from parse_plan
+        :return: None
+        """
+        now = datetime.utcnow()
+        statements = [PlanGuard.insert_sql.format(
+            self.table, self.dag_id, self.task_id, fingerprint, plan['fingerprint'], plan['total_cost'],
+            quote(truncate_bytes('\n'.join(plan['nodes']), PlanGuard.max_plan_length)), sql_timestamp(now))]
+        if not self._pruned:
+            statements.append(PlanGuard.prune_sql.format(
+                table=self.table, dag_id=self.dag_id, task_id=self.task_id,
+                cutoff=sql_timestamp(now - timedelta(days=self.retention_days))))
+            self._pruned = True
+        self.hook.run(statements)
+        self._previous[fingerprint] = plan
+
+    def previous_plans(self):
+        """
+        :return: dict of statement fingerprint -> the latest plan recorded for it by this task
+        """
+        if self._previous is None:
+            records = self.hook.get_records(PlanGuard.select_sql.format(self.table, self.dag_id, self.task_id))
+            self._previous = {statement: {'fingerprint': plan_fingerprint, 'total_cost': float(total_cost),
+                                          'nodes': plan.split('\n')}
+                              for statement, plan_fingerprint, total_cost, plan in records}
+        return self._previous
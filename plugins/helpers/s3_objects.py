@@ -0,0 +1,29 @@
+import json
+
+
+def list_objects(s3_client, bucket, prefix):
+    """
+    Lists every object under an S3 prefix along with its ETag and size
+    :param s3_client: a boto3 S3 client, e.g. from S3Hook.get_conn()
+    :param bucket: the bucket to list
+    :param prefix: the key prefix to list
+    :return: list of dicts with the key, etag and size of each object, in key order
+    """
+    objects = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            objects.append({'key': obj['Key'], 'etag': obj['ETag'].strip('"'), 'size': obj['Size']})
+    return objects
+
+
+def build_manifest(bucket, objects):
+    """
+    Builds a Redshift COPY manifest that loads exactly the given objects
+    :param bucket: the bucket the objects are in
+    :param objects: list of dicts with the key and size of each object
+    :return: the manifest as a JSON string
+    """
+    return json.dumps({'entries': [{'url': f"s3://{bucket}/{obj['key']}",
+                                    'mandatory': True,
+                                    'meta': {'content_length': obj['size']}} for obj in objects]})
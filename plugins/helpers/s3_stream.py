@@ -0,0 +1,230 @@
+import codecs
+import gzip
+import io
+import json
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+
+_JSONPATH_TOKEN = re.compile(r"""\.([A-Za-z_]\w*)|\[\s*'([^']*)'\s*\]|\[\s*"([^"]*)"\s*\]|\[\s*(\d+)\s*\]""")
+_DONE = object()
+
+
+def compile_jsonpath(expression):
+    """
+    Parses a JSONPath expression as used in Redshift JSONPaths files, e.g. $['artist'], $.song.title or $['tags'][0]
+    :param expression: the expression
+    :return: list of the keys and list indexes to follow from the document root
+    """
+    if not expression.startswith('$'):
+        raise ValueError(f"JSONPath {expression!r} must start with $")
+    steps, pos = [], 1
+    while pos < len(expression):
+        match = _JSONPATH_TOKEN.match(expression, pos)
+        if not match:
+            raise ValueError(f"Can't parse JSONPath {expression!r} at position {pos}")
+        name, single, double, index = match.groups()
+        steps.append(int(index) if index is not None else next(step for step in (name, single, double)
+                                                                 if step is not None))
+        pos = match.end()
+    return steps
+
+
+def parse_jsonpaths(content):
+    """
+    :param content: the contents of a JSONPaths file, e.g. log_json_path.json
+    :return: list of compiled paths, one per column
+    """
+    return [compile_jsonpath(expression) for expression in json.loads(content)['jsonpaths']]
+
+
+def extract(document, steps):
+    """
+    Follows compiled JSONPath steps through a document
+    :param document: the parsed JSON document
+    :param steps: the steps from compile_jsonpath
+    :return: the value, or None if any step is missing
+    """
+    value = document
+    for step in steps:
+        try:
+            value = value[step]
+        except (KeyError, IndexError, TypeError):
+            return None
+    return value
+
+
+def iter_documents(chunks, max_document_bytes=4 * 1024 * 1024):
+    """
+    Decodes a stream of concatenated or newline-delimited JSON documents without reading it all into memory
+    :param chunks: iterable of byte strings
+    :param max_document_bytes: the largest document to buffer; Redshift's COPY has the same 4 MB limit
+    :return: generator of documents
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos == len(buffer):
+                break
+            try:
+                document, pos = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                break
+            yield document
+        buffer = buffer[pos:]
+        if len(buffer) > max_document_bytes:
+            raise ValueError(f"JSON document larger than {max_document_bytes} bytes, or malformed JSON")
+
+    buffer += text_decoder.decode(b'', final=True)
+    if buffer.strip():
+        yield json.loads(buffer)
+
+
+def text_value(value):
+    """
+    Renders a value for COPY's text format
+    :param value: a JSON value
+    :return: the escaped field
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, (bool, dict, list)):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class S3JsonStreamLoader:
+    """
+    Loads S3 objects of JSON documents into a Postgres table through COPY FROM STDIN, for targets without Redshift's
+    COPY from S3. Objects are fetched by a pool of `workers` threads and streamed through a generator pipeline of
+    chunks -> documents -> rows -> batches of at most `batch_bytes`, which are copied in as they arrive. At most
+    `workers * 2` batches are queued, so memory use depends on the batch size and worker count, never on the input.
+
+    Documents are mapped to the table's columns the way Redshift's FORMAT AS JSON does: by the JSONPaths file given, or
+    with 'auto' by matching top level keys to column names, ignoring case.
+    """
+    chunk_size = 64 * 1024
+
+    def __init__(self, s3_client, columns, jsonpaths=None, compressed=False, workers=4, batch_bytes=8 * 1024 * 1024):
+        """
+        :param s3_client: a boto3 S3 client, e.g. from S3Hook.get_conn()
+        :param columns: the table's columns, in order
+        :param jsonpaths: compiled paths from parse_jsonpaths, one per column, or None for 'auto'
+        :param compressed: True if the objects are gzipped
+        :param workers: how many objects to fetch at once
+        :param batch_bytes: the largest batch to send in one COPY
+        """
+        if jsonpaths is not None and len(jsonpaths) != len(columns):
+            raise ValueError(f"The JSONPaths file has {len(jsonpaths)} paths but the table has {len(columns)} columns")
+        self.s3_client = s3_client
+        self.columns = list(columns)
+        self.jsonpaths = jsonpaths
+        self.compressed = compressed
+        self.workers = max(1, workers)
+        self.batch_bytes = batch_bytes
+
+    def copy(self, cursor, table, sources):
+        """
+        Streams objects into a table
+        :param cursor: the cursor to COPY with
+        :param table: the table to load
+        :param sources: list of (bucket, key) of the objects to load
+        :return: the number of rows loaded
+        """
+        column_list = ', '.join(f'"{column}"' for column in self.columns)
+        rows = 0
+        with closing(self.batches(sources)) as batches:
+            for batch, batch_rows in batches:
+                cursor.copy_expert(f"COPY {table} ({column_list}) FROM STDIN", io.StringIO(batch))
+                rows += batch_rows
+        return rows
+
+    def batches(self, sources):
+        """
+        Fetches objects in parallel and yields their rows in bounded batches, in whatever order they are ready
+        :param sources: list of (bucket, key)
+        :return: generator of (COPY text, row count)
+        """
+        pending = queue.Queue(maxsize=self.workers * 2)
+        stop = threading.Event()
+
+        def produce(bucket, key):
+            if stop.is_set():
+                return
+            try:
+                for batch in self.object_batches(bucket, key):
+                    if not self._put(pending, batch, stop):
+                        return
+                self._put(pending, _DONE, stop)
+            except Exception as error:
+                self._put(pending, error, stop)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for bucket, key in sources:
+                executor.submit(produce, bucket, key)
+            try:
+                remaining = len(sources)
+                while remaining:
+                    item = pending.get()
+                    if item is _DONE:
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    else:
+                        yield item
+            finally:
+                stop.set()
+
+    def object_batches(self, bucket, key):
+        """
+        :param bucket: the object's bucket
+        :param key: the object's key
+        :return: generator of (COPY text, row count) for one object
+        """
+        body = self.s3_client.get_object(Bucket=bucket, Key=key)['Body']
+        stream = gzip.GzipFile(fileobj=body) if self.compressed or key.endswith('.gz') else body
+        chunks = iter(lambda: stream.read(self.chunk_size), b'')
+
+        lines, size = [], 0
+        for row in self.rows(iter_documents(chunks)):
+            lines.append(row)
+            size += len(row)
+            if size >= self.batch_bytes:
+                yield ''.join(lines), len(lines)
+                lines, size = [], 0
+        if lines:
+            yield ''.join(lines), len(lines)
+
+    def rows(self, documents):
+        """
+        :param documents: iterable of JSON documents
+        :return: generator of COPY text rows
+        """
+        for document in documents:
+            if not isinstance(document, dict):
+                raise ValueError(f"Expected a JSON object, got {type(document).__name__}")
+            if self.jsonpaths is None:
+                by_name = {name.lower(): value for name, value in document.items()}
+                values = [by_name.get(column.lower()) for column in self.columns]
+            else:
+                values = [extract(document, steps) for steps in self.jsonpaths]
+            yield '\t'.join(text_value(value) for value in values) + '\n'
+
+    @staticmethod
+    def _put(pending, item, stop):
+        """Queues an item, giving up if the consumer has stopped"""
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
@@ -0,0 +1,62 @@
+import hashlib
+import os
+import re
+from collections import namedtuple
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+Migration = namedtuple('Migration', ['version', 'name', 'sql', 'fingerprint'])
+
+
+def fingerprint(sql):
+    """
+    Hashes a migration's DDL, ignoring comments and whitespace so reformatting a file doesn't count as a change
+    :param sql: the DDL
+    :return: the hex digest
+    """
+    normalized = re.sub(r'--[^\n]*', '', sql)
+    normalized = ' '.join(normalized.split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def load_migrations(path=MIGRATIONS_DIR, dialect='redshift'):
+    """
+    Reads the versioned migrations in a directory. Each is a SQL file named like 0002_add_calendar.sql, applied in
+    order of its numeric version; a migration must never be edited once applied, so changes go in a new file. A
+    migration that differs by dialect has a file per dialect instead, e.g. 0002_table_design.redshift.sql and
+    0002_table_design.postgres.sql.
+    :param path: the directory of migration files
+    :param dialect: 'redshift' or 'postgres', to pick between dialect-specific files
+    :return: list of Migrations, in version order
+    """
+    files = {}
+    for file_name in sorted(os.listdir(path)):
+        match = re.match(r'^(\d+)_(\w+?)(?:\.(redshift|postgres))?\.sql$', file_name)
+        if not match or match.group(3) not in (None, dialect):
+            continue
+        version = match.group(1)
+        if version in files and bool(match.group(3)) == bool(files[version][2]):
+            raise ValueError(f"Duplicate migration version {version} in {path}")
+        if version not in files or match.group(3):
+            files[version] = (match.group(2), file_name, match.group(3))
+
+    migrations = []
+    for version, (name, file_name, _) in files.items():
+        with open(os.path.join(path, file_name)) as sql_file:
+            sql = sql_file.read()
+        migrations.append(Migration(version, name, sql, fingerprint(sql)))
+    return sorted(migrations, key=lambda migration: int(migration.version))
+
+
+def pending_migrations(migrations, applied):
+    """
+    Compares the migrations on disk with those recorded as applied
+    :param migrations: list of Migrations
+    :param applied: dict of version -> fingerprint of every applied migration
+    :return: list of the Migrations not yet applied, in order
+    """
+    edited = [migration.version for migration in migrations
+              if migration.version in applied and applied[migration.version] != migration.fingerprint]
+    if edited:
+        raise ValueError(f"Migrations {edited} were changed after being applied; add a new migration instead")
+    return [migration for migration in migrations if migration.version not in applied]
@@ -0,0 +1,159 @@
+from helpers.table_design import Column, TableSpec
+
+# Staging tables are spread evenly, and events_stage is sorted on ts so windowed loads skip the blocks outside their
+# window. The dimensions are small enough to copy to every node, so the fact's joins to them never redistribute rows.
+# songplays is spread evenly rather than on song_id, which is NULL for most plays and would pile them onto one slice.
+SPARKIFY_TABLES = [
+    TableSpec('events_stage', [
+        Column('artist', 'varchar(256)'),
+        Column('auth', 'varchar(256)'),
+        Column('first_name', 'varchar(256)'),
+        Column('gender', 'varchar(256)'),
+        Column('item_in_session', 'int4'),
+        Column('last_name', 'varchar(256)'),
+        Column('length', 'numeric(18, 0)'),
+        Column('level', 'varchar(256)'),
+        Column('location', 'varchar(256)'),
+        Column('method', 'varchar(256)'),
+        Column('page', 'varchar(256)'),
+        Column('registration', 'numeric(18, 0)'),
+        Column('session_id', 'int4'),
+        Column('song', 'varchar(256)'),
+        Column('status', 'int4'),
+        Column('ts', 'int8'),
+        Column('user_agent', 'varchar(256)'),
+        Column('user_id', 'int4'),
+    ], diststyle='even', sortkey=['ts']),
+
+    TableSpec('songs_stage', [
+        Column('num_songs', 'int4'),
+        Column('artist_id', 'varchar(256)'),
+        Column('artist_name', 'varchar(256)'),
+        Column('artist_latitude', 'numeric(18, 0)'),
+        Column('artist_longitude', 'numeric(18, 0)'),
+        Column('artist_location', 'varchar(256)'),
+        Column('song_id', 'varchar(256)'),
+        Column('title', 'varchar(256)'),
+        Column('duration', 'numeric(18, 0)'),
+        Column('year', 'int4'),
+    ], diststyle='even'),
+
+    TableSpec('songplays', [
+        Column('play_id', 'varchar(32)', nullable=False),
+        Column('start_time', 'timestamp', nullable=False),
+        Column('user_id', 'int4', nullable=False),
+        Column('level', 'varchar(256)'),
+        Column('song_id', 'varchar(256)'),
+        Column('artist_id', 'varchar(256)'),
+        Column('session_id', 'int4'),
+        Column('location', 'varchar(256)'),
+        Column('user_agent', 'varchar(256)'),
+    ], primary_key=['play_id'], diststyle='even', sortkey=['start_time']),
+
+    TableSpec('users', [
+        Column('user_id', 'int4', nullable=False),
+        Column('first_name', 'varchar(256)'),
+        Column('last_name', 'varchar(256)'),
+        Column('gender', 'varchar(256)'),
+        Column('level', 'varchar(256)'),
+    ], primary_key=['user_id'], diststyle='all', sortkey=['user_id']),
+
+    TableSpec('songs', [
+        Column('song_id', 'varchar(256)', nullable=False),
+        Column('title', 'varchar(256)'),
+        Column('artist_id', 'varchar(256)'),
+        Column('year', 'int4'),
+        Column('duration', 'numeric(18, 0)'),
+    ], primary_key=['song_id'], diststyle='all', sortkey=['song_id']),
+
+    TableSpec('artists', [
+        Column('artist_id', 'varchar(256)', nullable=False),
+        Column('name', 'varchar(256)'),
+        Column('location', 'varchar(256)'),
+        Column('latitude', 'numeric(18, 0)'),
+        Column('longitude', 'numeric(18, 0)'),
+    ], diststyle='all', sortkey=['artist_id']),
+
+    TableSpec('time', [
+        Column('start_time', 'timestamp', nullable=False),
+        Column('hour', 'int4'),
+        Column('day', 'int4'),
+        Column('week', 'int4'),
+        Column('month', 'varchar(256)'),
+        Column('year', 'int4'),
+        Column('weekday', 'varchar(256)'),
+    ], primary_key=['start_time'], diststyle='all', sortkey=['start_time']),
+
+    TableSpec('song_match', [
+        Column('song_key', 'char(32)', nullable=False),
+        Column('song_id', 'varchar(256)', nullable=False),
+        Column('artist_id', 'varchar(256)'),
+    ], primary_key=['song_key'], diststyle='all', sortkey=['song_key']),
+
+    TableSpec('calendar', [
+        Column('start_time', 'timestamp', nullable=False),
+        Column('hour', 'int4'),
+        Column('day', 'int4'),
+        Column('week', 'int4'),
+        Column('month', 'varchar(256)'),
+        Column('year', 'int4'),
+        Column('weekday', 'varchar(256)'),
+    ], primary_key=['start_time'], diststyle='all', sortkey=['start_time']),
+
+    TableSpec('stage_load_ledger', [
+        Column('target_table', 'varchar(256)', nullable=False),
+        Column('s3_key', 'varchar(1024)', nullable=False),
+        Column('etag', 'varchar(64)', nullable=False),
+        Column('size', 'int8', nullable=False),
+        Column('loaded_at', 'timestamp', nullable=False),
+    ], diststyle='even', sortkey=['target_table', 'loaded_at']),
+
+    TableSpec('etl_window_coverage', [
+        Column('dag_id', 'varchar(256)', nullable=False),
+        Column('window_start', 'timestamp', nullable=False),
+        Column('window_end', 'timestamp', nullable=False),
+        Column('covered_at', 'timestamp', nullable=False),
+    ], diststyle='all', sortkey=['window_start']),
+
+    TableSpec('etl_query_plans', [
+        Column('dag_id', 'varchar(256)', nullable=False),
+        Column('task_id', 'varchar(256)', nullable=False),
+        Column('statement_fingerprint', 'char(16)', nullable=False),
+        Column('plan_fingerprint', 'char(16)', nullable=False),
+        Column('total_cost', 'float8', nullable=False),
+        Column('plan', 'varchar(65535)'),
+        Column('captured_at', 'timestamp', nullable=False),
+    ], diststyle='even', sortkey=['dag_id', 'task_id', 'captured_at']),
+
+    TableSpec('etl_quality_results', [
+        Column('dag_id', 'varchar(256)', nullable=False),
+        Column('run_id', 'varchar(256)', nullable=False),
+        Column('try_number', 'int4', nullable=False),
+        Column('check_id', 'char(16)', nullable=False),
+        Column('check_name', 'varchar(1024)', nullable=False),
+        Column('table_fingerprint', 'char(16)'),
+        Column('passed', 'boolean', nullable=False),
+        Column('recorded_at', 'timestamp', nullable=False),
+    ], diststyle='even', sortkey=['dag_id', 'run_id', 'recorded_at']),
+
+    TableSpec('etl_quality_snapshots', [
+        Column('dag_id', 'varchar(256)', nullable=False),
+        Column('run_id', 'varchar(256)', nullable=False),
+        Column('table_name', 'varchar(256)', nullable=False),
+        Column('fingerprint', 'char(16)', nullable=False),
+        Column('row_count', 'int8', nullable=False),
+        Column('max_key', 'varchar(256)'),
+        Column('passed', 'boolean', nullable=False),
+        Column('recorded_at', 'timestamp', nullable=False),
+    ], diststyle='even', sortkey=['dag_id', 'table_name', 'recorded_at']),
+
+    TableSpec('etl_quality_metrics', [
+        Column('dag_id', 'varchar(256)', nullable=False),
+        Column('run_id', 'varchar(256)', nullable=False),
+        Column('table_name', 'varchar(256)', nullable=False),
+        Column('column_name', 'varchar(256)'),
+        Column('metric', 'varchar(64)', nullable=False),
+        Column('metric_value', 'float8', nullable=False),
+        Column('recorded_at', 'timestamp', nullable=False),
+    ], diststyle='even', sortkey=['dag_id', 'table_name', 'recorded_at']),
+]
@@ -1,7 +1,27 @@
 class SqlQueries:
-    songplay_table_insert = ("""
+    # Compact key a song is matched on: a hash of its normalized title, artist name and duration. Computed over
+    # songs_stage into the persistent song_match lookup, and over events_stage when songplays are loaded.
+    song_match_key = ("md5(lower(trim({title})) || '|' || lower(trim({artist})) || '|' || "
+                      "CAST(CAST({duration} AS numeric(18, 0)) AS varchar))")
+
+    song_match_insert = (f"""
+        SELECT staged.song_key, staged.song_id, staged.artist_id
+        FROM (SELECT song_key, song_id, artist_id,
+                     ROW_NUMBER() OVER (PARTITION BY song_key ORDER BY song_id) AS match_row
+              FROM (SELECT {song_match_key.format(title='title', artist='artist_name', duration='duration')} AS song_key,
+                           song_id,
+                           artist_id
+                    FROM songs_stage) keyed) staged
+        LEFT JOIN song_match
+            ON song_match.song_key = staged.song_key
+        WHERE staged.match_row = 1
+            AND staged.song_key IS NOT NULL
+            AND song_match.song_key IS NULL
+    """)
+
+    songplay_table_insert = (f"""
         SELECT
-                md5(events.session_id || events.start_time) songplay_id,
+                md5(CAST(events.session_id AS varchar) || CAST(events.start_time AS varchar)) songplay_id,
                 events.start_time, 
                 events.user_id, 
                 events.level, 
@@ -10,13 +30,32 @@ class SqlQueries:
                 events.session_id,
                 events.location, 
                 events.user_agent
-                FROM (SELECT TIMESTAMP 'epoch' + ts/1000 * interval '1 second' AS start_time, *
+                FROM (SELECT TIMESTAMP 'epoch' + ts/1000 * interval '1 second' AS start_time,
+                     {song_match_key.format(title='song', artist='artist', duration='length')} AS song_key, *
             FROM events_stage
             WHERE page='NextSong') events
-            LEFT JOIN songs_stage songs
-            ON events.song = songs.title
-                AND events.artist = songs.artist_name
-                AND events.length = songs.duration
+            LEFT JOIN song_match songs
+            ON events.song_key = songs.song_key
+    """)
+
+    songplay_table_insert_window = (f"""
+        SELECT
+                md5(CAST(events.session_id AS varchar) || CAST(events.start_time AS varchar)) songplay_id,
+                events.start_time, 
+                events.user_id, 
+                events.level, 
+                songs.song_id, 
+                songs.artist_id, 
+                events.session_id,
+                events.location, 
+                events.user_agent
+                FROM (SELECT TIMESTAMP 'epoch' + ts/1000 * interval '1 second' AS start_time,
+                     {song_match_key.format(title='song', artist='artist', duration='length')} AS song_key, *
+            FROM events_stage
+            WHERE page='NextSong'
+                AND ts >= {{window_start_ms}} AND ts < {{window_end_ms}}) events
+            LEFT JOIN song_match songs
+            ON events.song_key = songs.song_key
     """)
 
     user_table_insert = ("""
@@ -35,8 +74,56 @@ class SqlQueries:
         FROM songs_stage
     """)
 
+    # The date part of the day of the week, counted from Sunday as 0; Postgres has no dayofweek
+    weekday_part = {
+        'redshift': 'dayofweek',
+        'postgres': 'dow',
+    }
+
     time_table_insert = ("""
         SELECT start_time, extract(hour from start_time), extract(day from start_time), extract(week from start_time), 
-               extract(month from start_time), extract(year from start_time), extract(dayofweek from start_time)
+               extract(month from start_time), extract(year from start_time), extract({weekday} from start_time)
         FROM songplays
     """)
+
+    time_table_insert_incremental = ("""
+        SELECT DISTINCT songplays.start_time, extract(hour from songplays.start_time),
+               extract(day from songplays.start_time), extract(week from songplays.start_time),
+               extract(month from songplays.start_time), extract(year from songplays.start_time),
+               extract({weekday} from songplays.start_time)
+        FROM songplays
+        LEFT JOIN {table} loaded
+            ON loaded.start_time = songplays.start_time
+        WHERE loaded.start_time IS NULL
+            AND {window_filter}
+    """)
+
+    # Dimension loads grouped by the table they read from, for MultiTargetLoadOperator. `columns` lists every source
+    # column the target needs, including those used in its `filter` and `latest`. A `select` is formatted with the
+    # dialect's `weekday` part. When merged, a user's row is taken from their latest event, so level changes stick.
+    dimension_targets = {
+        'users': {
+            'source': 'events_stage',
+            'columns': ['user_id', 'first_name', 'last_name', 'gender', 'level', 'page', 'ts'],
+            'select': 'distinct user_id, first_name, last_name, gender, level',
+            'filter': "page='NextSong'",
+            'latest': 'ts',
+        },
+        'songs': {
+            'source': 'songs_stage',
+            'columns': ['song_id', 'title', 'artist_id', 'year', 'duration'],
+            'select': 'distinct song_id, title, artist_id, year, duration',
+        },
+        'artists': {
+            'source': 'songs_stage',
+            'columns': ['artist_id', 'artist_name', 'artist_location', 'artist_latitude', 'artist_longitude'],
+            'select': 'distinct artist_id, artist_name, artist_location, artist_latitude, artist_longitude',
+        },
+        'time': {
+            'source': 'songplays',
+            'columns': ['start_time'],
+            'select': """start_time, extract(hour from start_time), extract(day from start_time),
+               extract(week from start_time), extract(month from start_time), extract(year from start_time),
+               extract({weekday} from start_time)""",
+        },
+    }
@@ -0,0 +1,289 @@
+import re
+from collections import OrderedDict, namedtuple
+
+DIALECTS = ('redshift', 'postgres')
+DISTSTYLES = ('auto', 'even', 'key', 'all')
+# Words used as table or column names here that must be quoted in DDL
+RESERVED = {'day', 'hour', 'level', 'method', 'month', 'time', 'year'}
+# Redshift's pg_class.reldiststyle codes
+REDSHIFT_DISTSTYLES = {0: 'even', 1: 'key', 8: 'all', 9: 'auto', 10: 'auto', 11: 'auto'}
+TYPE_ALIASES = {
+    'int2': 'smallint',
+    'int4': 'integer',
+    'int': 'integer',
+    'int8': 'bigint',
+    'bool': 'boolean',
+    'float8': 'double precision',
+    'float4': 'real',
+    'timestamp': 'timestamp without time zone',
+}
+
+Column = namedtuple('Column', ['name', 'type', 'nullable', 'encoding'])
+Column.__new__.__defaults__ = (True, None)
+
+
+def identifier(name):
+    """Quotes a name for DDL if it is a reserved word"""
+    return f'"{name}"' if name in RESERVED else name
+
+
+def normalize_type(column_type):
+    """
+    Spells a column type the way the catalog reports it, e.g. varchar(256) -> character varying(256), so a spec can be
+    compared with an existing table
+    :param column_type: the type as written in a spec
+    :return: the normalized type
+    """
+    column_type = re.sub(r'\s+', ' ', column_type.strip().lower())
+    column_type = re.sub(r'\s*,\s*', ',', column_type)
+    match = re.match(r'^(varchar|char)\s*(\(\d+\))?$', column_type)
+    if match:
+        base = 'character varying' if match.group(1) == 'varchar' else 'character'
+        return base + (match.group(2) or '')
+    return TYPE_ALIASES.get(column_type, column_type)
+
+
+class TableSpec:
+    """
+    Describes a table declaratively: its columns and primary key, and its physical design on Redshift, i.e. its
+    distribution style and key, compound sort key and column encodings. The same spec renders Redshift DDL or, for
+    Postgres, plain DDL plus indexes on the sort and distribution keys, and plans the statements that bring an existing
+    table in line with it.
+    """
+
+    def __init__(self, name, columns, primary_key=None, diststyle='auto', distkey=None, sortkey=None, schema='public'):
+        """
+        :param name: the table name
+        :param columns: list of Columns, in order
+        :param primary_key: list of the primary key's columns, if any
+        :param diststyle: 'auto', 'even', 'key' (which needs `distkey`) or 'all'
+        :param distkey: the distribution key column
+        :param sortkey: list of the compound sort key's columns, if any
+        :param schema: the table's schema
+        """
+        self.name = name
+        self.columns = list(columns)
+        self.primary_key = list(primary_key or [])
+        self.diststyle = 'key' if distkey else diststyle
+        self.distkey = distkey
+        self.sortkey = list(sortkey or [])
+        self.schema = schema
+
+        names = [column.name for column in self.columns]
+        if self.diststyle not in DISTSTYLES:
+            raise ValueError(f"diststyle for {name} must be one of {DISTSTYLES}, not {diststyle!r}")
+        if self.diststyle == 'key' and not distkey:
+            raise ValueError(f"A distkey is required for {name} to use diststyle 'key'")
+        unknown = [column for column in self.primary_key + self.sortkey + [distkey] if column and column not in names]
+        if unknown:
+            raise ValueError(f"{name} has no columns {unknown}")
+
+    @property
+    def qualified_name(self):
+        return f"{self.schema}.{identifier(self.name)}"
+
+    def encoding(self, column):
+        """
+        Picks a column's encoding: the one in its spec, otherwise RAW for the leading sort key column, which Redshift
+        needs uncompressed to skip blocks effectively, AZ64 for numeric and time types and ZSTD for everything else
+        :param column: the Column
+        :return: the encoding
+        """
+        if column.encoding:
+            return column.encoding.lower()
+        if self.sortkey and column.name == self.sortkey[0]:
+            return 'raw'
+        column_type = normalize_type(column.type)
+        if column_type.startswith(('smallint', 'integer', 'bigint', 'numeric', 'decimal', 'date', 'timestamp')):
+            return 'az64'
+        if column_type == 'boolean':
+            return 'raw'
+        return 'zstd'
+
+    def create_ddl(self, dialect='redshift', name=None):
+        """
+        Renders the table's DDL
+        :param dialect: 'redshift' or 'postgres'
+        :param name: a different name to create the table under, e.g. for a deep copy
+        :return: list of statements: the CREATE TABLE, followed on Postgres by its indexes
+        """
+        if dialect not in DIALECTS:
+            raise ValueError(f"dialect must be one of {DIALECTS}, not {dialect!r}")
+        name = name or self.name
+        width = max(len(identifier(column.name)) for column in self.columns)
+        type_width = max(len(column.type) for column in self.columns)
+
+        lines = []
+        for column in self.columns:
+            line = f"    {identifier(column.name).ljust(width)} {column.type.ljust(type_width)}"
+            if dialect == 'redshift':
+                line += f" ENCODE {self.encoding(column)}"
+            if not column.nullable:
+                line += " NOT NULL"
+            lines.append(line.rstrip())
+        if self.primary_key:
+            lines.append(f"    CONSTRAINT {name}_pkey PRIMARY KEY ({self.column_list(self.primary_key)})")
+
+        table = f"{self.schema}.{identifier(name)}"
+        ddl = f"CREATE TABLE IF NOT EXISTS {table}\n(\n" + ',\n'.join(lines) + "\n)"
+        if dialect == 'postgres':
+            return [ddl] + [statement for index, statement in self.index_ddl(name).items()]
+
+        ddl += f"\nDISTSTYLE {self.diststyle.upper()}"
+        if self.distkey:
+            ddl += f"\nDISTKEY ({identifier(self.distkey)})"
+        if self.sortkey:
+            ddl += f"\nCOMPOUND SORTKEY ({self.column_list(self.sortkey)})"
+        return [ddl]
+
+    def index_ddl(self, name=None):
+        """
+        Builds the Postgres indexes that stand in for the sort and distribution keys
+        :param name: a different table name to index, e.g. for a deep copy
+        :return: ordered dict of index name -> CREATE INDEX statement
+        """
+        name = name or self.name
+        indexes = OrderedDict()
+        for suffix, columns in (('sortkey', self.sortkey), ('distkey', [self.distkey] if self.distkey else [])):
+            if columns and columns != self.primary_key[:len(columns)]:
+                index = f"{name}_{suffix}_idx"
+                indexes[index] = (f"CREATE INDEX IF NOT EXISTS {index} "
+                                  f"ON {self.schema}.{identifier(name)} ({self.column_list(columns)})")
+        return indexes
+
+    def migration_plan(self, layout, dialect='redshift'):
+        """
+        Plans the statements that bring an existing table in line with the spec. Missing columns are added in place. On
+        Redshift, a table whose distribution, sort key, column types or encodings differ is rebuilt by a deep copy into a
+        table created from the spec, which is renamed into place; on Postgres, missing indexes are created. Run the plan
+        in one transaction, e.g. as a migration.
+        :param layout: the table's current layout from read_layout, or None if it doesn't exist
+        :param dialect: 'redshift' or 'postgres'
+        :return: list of statements, empty if the table already matches
+        """
+        if layout is None:
+            return self.create_ddl(dialect)
+
+        current = layout['columns']
+        missing = [column for column in self.columns if column.name not in current]
+        if dialect == 'postgres':
+            statements = [self.add_column_sql(column, dialect) for column in missing]
+            return statements + [statement for index, statement in self.index_ddl().items()
+                                 if index not in layout['indexes']]
+
+        if self.layout_differs(layout):
+            return self.deep_copy_sql([column.name for column in self.columns if column.name in current])
+        return [self.add_column_sql(column, dialect) for column in missing]
+
+    def layout_differs(self, layout):
+        """
+        :param layout: the table's current Redshift layout from read_layout
+        :return: True if its distribution, sort key or the type or encoding of any existing column differs from the spec
+        """
+        if layout['diststyle'] != self.diststyle or layout['distkey'] != self.distkey:
+            return True
+        if layout['sortkey'] != self.sortkey:
+            return True
+        for column in self.columns:
+            current = layout['columns'].get(column.name)
+            if current and (current['type'] != normalize_type(column.type) or
+                            current['encoding'] != self.encoding(column).replace('raw', 'none')):
+                return True
+        return False
+
+    def deep_copy_sql(self, columns):
+        """
+        :param columns: the columns the existing table shares with the spec
+        :return: the statements that rebuild the table from the spec and copy its rows across
+        """
+        redesign, old = f"{self.name}_redesign", f"{self.name}_old"
+        column_list = self.column_list(columns)
+        return [
+            f"DROP TABLE IF EXISTS {self.schema}.{redesign}",
+            *self.create_ddl('redshift', name=redesign),
+            f"INSERT INTO {self.schema}.{redesign} ({column_list}) SELECT {column_list} FROM {self.qualified_name}",
+            f"ALTER TABLE {self.qualified_name} RENAME TO {old}",
+            f"ALTER TABLE {self.schema}.{redesign} RENAME TO {identifier(self.name)}",
+            f"DROP TABLE {self.schema}.{old}",
+        ]
+
+    def add_column_sql(self, column, dialect='redshift'):
+        encode = f" ENCODE {self.encoding(column)}" if dialect == 'redshift' else ''
+        return f"ALTER TABLE {self.qualified_name} ADD COLUMN {identifier(column.name)} {column.type}{encode}"
+
+    @staticmethod
+    def column_list(columns):
+        return ', '.join(identifier(column) for column in columns)
+
+
+def read_layout(hook, spec, dialect='redshift'):
+    """
+    Reads a table's current layout from the catalog
+    :param hook: the hook to query the catalog with
+    :param spec: the table's TableSpec
+    :param dialect: 'redshift' or 'postgres'
+    :return: dict of its columns (name -> type and encoding), diststyle, distkey, sortkey and indexes, or None if the
+        table doesn't exist
+    """
+    if dialect == 'postgres':
+        records = hook.get_records(f"""
+            SELECT attname, format_type(atttypid, atttypmod)
+            FROM pg_attribute
+            WHERE attrelid = to_regclass('{spec.qualified_name}')
+                AND attnum > 0
+                AND NOT attisdropped
+            ORDER BY attnum
+        """)
+        if not records:
+            return None
+        indexes = hook.get_records(f"""
+            SELECT indexname
+            FROM pg_indexes
+            WHERE schemaname = '{spec.schema}' AND tablename = '{spec.name}'
+        """)
+        return {'columns': OrderedDict((name, {'type': column_type, 'encoding': 'none'}) for name, column_type in records),
+                'diststyle': None, 'distkey': None, 'sortkey': [], 'indexes': {row[0] for row in indexes}}
+
+    # pg_table_def only lists tables on the search_path
+    records = hook.get_records(f"""
+        SELECT "column", type, encoding, distkey, sortkey
+        FROM pg_table_def
+        WHERE schemaname = '{spec.schema}' AND tablename = '{spec.name}'
+    """)
+    if not records:
+        return None
+    diststyle = hook.get_records(f"""
+        SELECT reldiststyle
+        FROM pg_class
+        JOIN pg_namespace ON pg_namespace.oid = pg_class.relnamespace
+        WHERE nspname = '{spec.schema}' AND relname = '{spec.name}'
+    """)[0][0]
+    return {
+        'columns': OrderedDict((name, {'type': normalize_type(column_type), 'encoding': encoding.lower()})
+                               for name, column_type, encoding, distkey, sortkey in records),
+        'diststyle': REDSHIFT_DISTSTYLES.get(diststyle, 'auto'),
+        'distkey': next((name for name, _, _, distkey, _ in records if distkey), None),
+        'sortkey': [name for name, _, _, _, sortkey in sorted(records, key=lambda record: record[4]) if sortkey > 0],
+        'indexes': set(),
+    }
+
+
+def schema_ddl(specs, dialect='redshift'):
+    """
+    Renders the DDL of several tables as one script, e.g. to compare against a golden file
+    :param specs: list of TableSpecs
+    :param dialect: 'redshift' or 'postgres'
+    :return: the script
+    """
+    return '\n\n'.join(f"{statement};" for spec in specs for statement in spec.create_ddl(dialect)) + '\n'
+
+
+def plan_schema(hook, specs, dialect='redshift'):
+    """
+    Plans the statements that bring every table in line with its spec, e.g. to review and save as the next migration
+    :param hook: the hook to read the current layouts with
+    :param specs: list of TableSpecs
+    :param dialect: 'redshift' or 'postgres'
+    :return: list of statements
+    """
+    return [statement for spec in specs for statement in spec.migration_plan(read_layout(hook, spec, dialect), dialect)]
@@ -0,0 +1,23 @@
+def swap_statements(table, sql, dialect='redshift'):
+    """
+    Builds the statements that rebuild a table from a query in a shadow copy and then publish it by renaming it into
+    place. Run them in one transaction: readers keep seeing the old contents until the commit, and the old table is
+    dropped outright instead of leaving deleted rows behind to vacuum. Views on the table must be late binding (WITH NO
+    SCHEMA BINDING on Redshift), as the old table they would otherwise depend on is dropped.
+    :param table: the table to rebuild
+    :param sql: the SELECT that produces the table's new contents
+    :param dialect: 'redshift', where LIKE keeps the distribution and sort keys, or 'postgres', where the shadow also
+        copies the table's indexes and constraints
+    :return: list of statements
+    """
+    name = table.split('.')[-1]
+    shadow, old = f"{table}_shadow", f"{table}_old"
+    like = f"LIKE {table} INCLUDING ALL" if dialect == 'postgres' else f"LIKE {table}"
+    return [
+        f"DROP TABLE IF EXISTS {shadow}",
+        f"CREATE TABLE {shadow} ({like})",
+        f"INSERT INTO {shadow} {sql}",
+        f"ALTER TABLE {table} RENAME TO {name}_old",
+        f"ALTER TABLE {shadow} RENAME TO {name}",
+        f"DROP TABLE {old}",
+    ]
@@ -0,0 +1,35 @@
+from contextlib import closing, contextmanager
+
+
+@contextmanager
+def transaction(hook):
+    """
+    Opens a connection from a hook and yields a cursor whose statements are committed together when the block exits,
+    or rolled back if it raises
+    :param hook: the DB-API hook to get the connection from
+    :return: a cursor
+    """
+    with closing(hook.get_conn()) as conn:
+        try:
+            with closing(conn.cursor()) as cursor:
+                yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def run_transaction(hook, statements):
+    """
+    Runs statements in order on one connection and commits them as a single transaction, rolling back if any fail.
+    Unlike hook.run, the number of rows each statement affected is returned.
+    :param hook: the DB-API hook to get the connection from
+    :param statements: list of SQL statements
+    :return: list of the row count of each statement
+    """
+    with transaction(hook) as cursor:
+        row_counts = []
+        for statement in statements:
+            cursor.execute(statement)
+            row_counts.append(cursor.rowcount)
+    return row_counts
@@ -0,0 +1,5 @@
+from hooks.instrumented_postgres import InstrumentedPostgresHook
+
+__all__ = [
+    'InstrumentedPostgresHook'
+]
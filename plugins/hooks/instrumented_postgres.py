@@ -0,0 +1,189 @@
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+from datetime import datetime
+
+from airflow.configuration import conf
+from airflow.hooks.postgres_hook import PostgresHook
+
+
+def statement_fingerprint(sql):
+    """
+    Identifies a statement by its shape, with literals and whitespace normalized away, so every run of e.g. a windowed
+    load shares one fingerprint
+    :param sql: the statement
+    :return: a 16 character hex digest
+    """
+    normalized = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    normalized = re.sub(r'\b\d+(?:\.\d+)?\b', '?', normalized)
+    normalized = ' '.join(normalized.lower().split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16]
+
+
+class StatsdClient:
+    """Sends StatsD timers and counters over UDP. Metrics are fire and forget, so send failures are ignored."""
+
+    def __init__(self, host='localhost', port=8125, prefix='airflow'):
+        self.address = (host, int(port))
+        self.prefix = prefix
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def timing(self, name, milliseconds):
+        self.send(f"{self.prefix}.{name}:{milliseconds:.3f}|ms")
+
+    def incr(self, name, count=1):
+        self.send(f"{self.prefix}.{name}:{count}|c")
+
+    def send(self, metric):
+        try:
+            self.socket.sendto(metric.encode('utf-8'), self.address)
+        except OSError:
+            pass
+
+    @staticmethod
+    def from_config():
+        """
+        :return: a client for Airflow's own StatsD settings in the [scheduler] section, or None if statsd_on is off
+        """
+        if not conf.getboolean('scheduler', 'statsd_on'):
+            return None
+        return StatsdClient(conf.get('scheduler', 'statsd_host'), conf.getint('scheduler', 'statsd_port'),
+                            conf.get('scheduler', 'statsd_prefix'))
+
+
+class InstrumentedPostgresHook(PostgresHook):
+    """
+    A PostgresHook that records every statement run on its connections, whether through run, get_records, copy_expert
+    or a cursor from get_conn, e.g. in helpers.transaction. Each record has the task and run identity, the statement's
+    fingerprint and text, its wall time, the rows it affected and whether it succeeded.
+
+    Records are sent as they happen as StatsD timers and counters named
+    `<statsd_prefix>.sql.<dag_id>.<task_id>.<fingerprint>.duration|rows|errors`, when Airflow's statsd_on is set, and
+    appended to the JSON lines file at `sql_metrics_path` in the [sparkify] section of airflow.cfg (or
+    AIRFLOW__SPARKIFY__SQL_METRICS_PATH) if there is one. push_metrics pushes them all to XCom as `sql_metrics`.
+    """
+    max_statement_length = 1000
+
+    def __init__(self, *args, context=None, statsd=None, metrics_path=None, **kwargs):
+        super(InstrumentedPostgresHook, self).__init__(*args, **kwargs)
+        context = context or {}
+        self.context = context
+        self.identity = {
+            'dag_id': context['dag'].dag_id if context.get('dag') else None,
+            'task_id': context['task'].task_id if context.get('task') else None,
+            'run_id': context.get('run_id'),
+            'try_number': context['ti'].try_number if context.get('ti') else None,
+        }
+        self.statsd = statsd if statsd is not None else StatsdClient.from_config()
+        if metrics_path is None and conf.has_option('sparkify', 'sql_metrics_path'):
+            metrics_path = conf.get('sparkify', 'sql_metrics_path')
+        self.metrics_path = metrics_path
+        self.records = []
+        self._lock = threading.Lock()
+
+    def get_conn(self):
+        return InstrumentedConnection(super(InstrumentedPostgresHook, self).get_conn(), self)
+
+    def record(self, sql, seconds, rows, succeeded=True):
+        """
+        Records one statement and emits it to StatsD and the JSON lines sink
+        :param sql: the statement
+        :param seconds: its wall time
+        :param rows: the rows it affected, or -1 if unknown
+        :param succeeded: False if it raised
+        :return: the record
+        """
+        entry = dict(self.identity,
+                     fingerprint=statement_fingerprint(sql),
+                     statement=' '.join(sql.split())[:self.max_statement_length],
+                     seconds=round(seconds, 6),
+                     rows=rows,
+                     succeeded=succeeded,
+                     finished_at=datetime.utcnow().isoformat())
+        with self._lock:
+            self.records.append(entry)
+            if self.metrics_path:
+                with open(self.metrics_path, 'a') as metrics_file:
+                    metrics_file.write(json.dumps(entry) + '\n')
+
+        if self.statsd:
+            name = f"sql.{entry['dag_id']}.{entry['task_id']}.{entry['fingerprint']}"
+            self.statsd.timing(f"{name}.duration", seconds * 1000)
+            if rows is not None and rows >= 0:
+                self.statsd.incr(f"{name}.rows", rows)
+            if not succeeded:
+                self.statsd.incr(f"{name}.errors")
+        return entry
+
+    def push_metrics(self):
+        """
+        Pushes every record so far to XCom as `sql_metrics`, and logs the slowest statements
+        :return: None
+        """
+        for entry in sorted(self.records, key=lambda record: record['seconds'], reverse=True)[:5]:
+            self.log.info(f"{entry['seconds']:.3f}s, {entry['rows']} rows: {entry['statement'][:120]}")
+        if self.context.get('ti'):
+            self.context['ti'].xcom_push(key='sql_metrics', value=self.records)
+
+
+class InstrumentedConnection:
+    """Wraps a DB-API connection so its cursors are instrumented; everything else is passed through"""
+
+    def __init__(self, conn, hook):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_hook', hook)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._hook)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._conn.__exit__(*exc_info)
+
+
+class InstrumentedCursor:
+    """Wraps a DB-API cursor, timing execute and copy_expert and recording their row counts"""
+
+    def __init__(self, cursor, hook):
+        self._cursor = cursor
+        self._hook = hook
+
+    def execute(self, sql, *args, **kwargs):
+        return self._timed(sql, self._cursor.execute, sql, *args, **kwargs)
+
+    def copy_expert(self, sql, *args, **kwargs):
+        return self._timed(sql, self._cursor.copy_expert, sql, *args, **kwargs)
+
+    def _timed(self, sql, method, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            self._hook.record(sql, time.monotonic() - started, -1, succeeded=False)
+            raise
+        self._hook.record(sql, time.monotonic() - started, getattr(self._cursor, 'rowcount', -1))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
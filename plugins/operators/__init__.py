@@ -1,11 +1,23 @@
 from operators.stage_redshift import StageToRedshiftOperator
 from operators.load_fact import LoadFactOperator
 from operators.load_dimension import LoadDimensionOperator
+from operators.load_multi import MultiTargetLoadOperator
+from operators.load_time import LoadTimeDimensionOperator
 from operators.data_quality import DataQualityOperator
+from operators.compact_s3 import S3CompactionOperator
+from operators.window_coverage import WindowCoverageOperator
+from operators.schema_migration import SchemaMigrationOperator
+from operators.export_parquet import ParquetExportOperator
 
 __all__ = [
     'StageToRedshiftOperator',
     'LoadFactOperator',
     'LoadDimensionOperator',
-    'DataQualityOperator'
+    'MultiTargetLoadOperator',
+    'LoadTimeDimensionOperator',
+    'DataQualityOperator',
+    'S3CompactionOperator',
+    'WindowCoverageOperator',
+    'SchemaMigrationOperator',
+    'ParquetExportOperator'
 ]
\ No newline at end of file
@@ -0,0 +1,157 @@
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+
+from airflow.hooks.S3_hook import S3Hook
+from airflow.hooks.postgres_hook import PostgresHook
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from helpers.s3_objects import build_manifest, list_objects
+
+
+class S3CompactionOperator(BaseOperator):
+    """
+    Merges the many small JSON objects under an S3 prefix (e.g. song_data, which holds one tiny document per song) into a
+    few gzip-compressed, newline-delimited JSON parts, so that COPY reads a handful of objects instead of tens of
+    thousands. The number of parts is the cluster's slice count times `parts_per_slice`, so every slice gets an even
+    share of the load; the slice count is read from stv_slices unless `slices` is given. Postgres has no slices, so
+    with `backend` set to 'postgres' it defaults to `postgres_slices`, the stage operator's default number of workers.
+
+    Objects are streamed into one part at a time in `chunk_size` byte chunks, so memory use is bounded no matter how
+    much data there is. A COPY manifest listing the parts is written to `manifest_key` for StageToRedshiftOperator to
+    consume. If the source listing hasn't changed since the last compaction, the existing parts are reused.
+    """
+    ui_color = '#5C9EAD'
+    template_fields = ("s3_key", "target_prefix", "manifest_key")
+    backends = ('redshift', 'postgres')
+    postgres_slices = 4
+
+    @apply_defaults
+    def __init__(self,
+                 conn_id="redshift",
+                 params=None,
+                 *args,
+                 **kwargs):
+        super(S3CompactionOperator, self).__init__(*args, **kwargs)
+
+        if params is None:
+            params = {}
+        self.conn_id = conn_id
+        self.aws_conn_id = params.get('aws_conn_id', 'aws_default')
+        self.s3_bucket = params.get('s3_bucket', None)
+        self.s3_key = params.get('s3_key', None)
+        self.target_bucket = params.get('target_bucket', None)
+        self.target_prefix = params.get('target_prefix', None)
+        self.manifest_key = params.get('manifest_key', None)
+        self.slices = params.get('slices', None)
+        self.parts_per_slice = params.get('parts_per_slice', 1)
+        self.chunk_size = params.get('chunk_size', 1024 * 1024)
+        self.backend = params.get('backend', 'redshift')
+
+        if self.backend not in S3CompactionOperator.backends:
+            raise ValueError(f"backend must be one of {S3CompactionOperator.backends}, not {self.backend!r}")
+
+    def execute(self, context):
+        s3 = S3Hook(aws_conn_id=self.aws_conn_id)
+        client = s3.get_conn()
+        objects = list_objects(client, self.s3_bucket, self.s3_key)
+        self.log.info(f"Found {len(objects)} objects under s3://{self.s3_bucket}/{self.s3_key}")
+
+        source_key = f"{self.manifest_key}.source"
+        fingerprint = S3CompactionOperator.listing_fingerprint(objects)
+        if s3.check_for_key(source_key, self.target_bucket) and \
+                s3.read_key(source_key, self.target_bucket) == fingerprint:
+            self.log.info(f"Source is unchanged, reusing the parts listed in {self.manifest_key}")
+            return self.manifest_key
+
+        num_parts = self.get_slice_count() * self.parts_per_slice
+        parts = []
+        for number, part_objects in enumerate(S3CompactionOperator.assign_parts(objects, num_parts)):
+            if part_objects:
+                parts.append(self.write_part(s3, client, number, part_objects))
+
+        s3.load_string(build_manifest(self.target_bucket, parts), self.manifest_key, self.target_bucket, replace=True)
+        s3.load_string(fingerprint, source_key, self.target_bucket, replace=True)
+        self.log.info(f"Compacted {len(objects)} objects into {len(parts)} parts listed in {self.manifest_key}")
+        return self.manifest_key
+
+    def get_slice_count(self):
+        """
+        Gets the number of slices in the cluster, which the number of parts should be a multiple of
+        :return: the configured slice count, or on Redshift the number of rows in stv_slices
+        """
+        if self.slices:
+            return self.slices
+        if self.backend == 'postgres':
+            return S3CompactionOperator.postgres_slices
+        redshift = PostgresHook(postgres_conn_id=self.conn_id)
+        return redshift.get_records("SELECT COUNT(*) FROM stv_slices")[0][0]
+
+    def write_part(self, s3, client, number, part_objects):
+        """
+        Streams a part's objects into a gzip-compressed, newline-delimited JSON temp file and uploads it
+        :param s3: the S3Hook to upload with
+        :param client: the boto3 client to read the source objects with
+        :param number: the part number, used in its key
+        :param part_objects: list of dicts with the key of each source object
+        :return: dict with the key and size of the uploaded part
+        """
+        key = f"{self.target_prefix}/part-{number:05d}.json.gz"
+        with tempfile.NamedTemporaryFile(suffix='.json.gz', delete=False) as part_file:
+            try:
+                with gzip.GzipFile(fileobj=part_file, mode='wb') as gzip_file:
+                    for obj in part_objects:
+                        self.copy_object(client, obj['key'], gzip_file)
+                part_file.close()
+                s3.load_file(part_file.name, key, self.target_bucket, replace=True)
+                return {'key': key, 'size': os.path.getsize(part_file.name)}
+            finally:
+                os.remove(part_file.name)
+
+    def copy_object(self, client, key, out):
+        """
+        Streams one source object into a part, making sure it ends in a newline so documents stay one per line
+        :param client: the boto3 client to read the object with
+        :param key: the object's key
+        :param out: the file object to write to
+        :return: None
+        """
+        body = client.get_object(Bucket=self.s3_bucket, Key=key)['Body']
+        last_byte = b'\n'
+        for chunk in body.iter_chunks(self.chunk_size):
+            if chunk:
+                out.write(chunk)
+                last_byte = chunk[-1:]
+        if last_byte != b'\n':
+            out.write(b'\n')
+
+    @staticmethod
+    def assign_parts(objects, num_parts):
+        """
+        Spreads objects across parts so each part ends up with roughly the same number of bytes, by giving each object,
+        largest first, to the part with the fewest bytes so far
+        :param objects: list of dicts with the key and size of each object
+        :param num_parts: how many parts to spread the objects across
+        :return: list of num_parts lists of objects, each sorted by key
+        """
+        parts = [[] for _ in range(num_parts)]
+        part_sizes = [(0, number) for number in range(num_parts)]
+        for obj in sorted(objects, key=lambda o: o['size'], reverse=True):
+            size, smallest = heapq.heappop(part_sizes)
+            parts[smallest].append(obj)
+            heapq.heappush(part_sizes, (size + obj['size'], smallest))
+        return [sorted(part, key=lambda o: o['key']) for part in parts]
+
+    @staticmethod
+    def listing_fingerprint(objects):
+        """
+        Fingerprints a listing by the key, ETag and size of every object in it
+        :param objects: list of dicts with the key, etag and size of each object
+        :return: hex digest of the listing
+        """
+        listing = json.dumps([[obj['key'], obj['etag'], obj['size']] for obj in objects])
+        return hashlib.sha256(listing.encode('utf-8')).hexdigest()
@@ -1,8 +1,19 @@
-from airflow.hooks.postgres_hook import PostgresHook
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
 
+from helpers.connection_pool import ConnectionPool
+from helpers.quality_checkpoint import QualityCheckpoint, check_id
+from helpers.quality_history import ANOMALY_ACTIONS, QualityHistory
+from helpers.quality_sampling import SAMPLING_DIALECTS, estimate_rows, sample_clause, sample_fraction, wilson_interval
+from helpers.query_plans import PlanGuard
 from helpers.test_helpers import TestHelpers
+from hooks.instrumented_postgres import InstrumentedPostgresHook, statement_fingerprint
+
+QualityCheck = namedtuple('QualityCheck', ['name', 'sql', 'handler', 'tables', 'key'], defaults=[None])
 
 
 class DataQualityOperator(BaseOperator):
@@ -12,8 +23,48 @@ class DataQualityOperator(BaseOperator):
 
     For example one test could be a SQL statement that checks if certain column contains NULL values by counting all the
     rows that have NULL in the column. We do not want to have any NULLs so expected result would be 0 and the test would
-    compare the SQL statement's outcome to the expected result."""
+    compare the SQL statement's outcome to the expected result.
+
+    With the `profile` param set, the row count and null value tests are fed from a single aggregate scan per table
+    rather than two COUNT(*) queries per column. `profile_stats` optionally adds per-column min, max and approximate
+    distinct counts to the summary. Postgres has no approximate distinct count, so it counts distinct values exactly.
+
+    Every check is a single query. Checks run on a small pool of reused connections to `conn_id`, spread across up to
+    `max_workers` threads, each bounded by an optional `check_timeout` in seconds. Results are reported in the order the
+    checks were planned. README-style checks can be supplied in tests_to_run as `custom_checks`, a list of dicts with a
+    `check_sql`, its `expected_result`, an optional `name` and optionally the `tables` it reads.
+
+    With the `checkpoint` param set, every check's outcome is recorded per DAG run and try in `checkpoint_table` with a
+    fingerprint of the state of the tables it reads; see QualityCheckpoint. A retry then skips the checks that passed
+    against tables that haven't changed since, and re-runs only the failed, errored and stale ones. `dialect` picks
+    where table state is read from.
+
+    Tables listed in tests_to_run's `sampling`, with their `sample_rows` and `confidence`, are checked from a sample of
+    about `sample_rows` rows when the catalog estimates they are larger: the row count is estimated, and each column's
+    null ratio is estimated with a confidence interval. Only columns whose interval overlaps the null threshold, or an
+    empty sample, are then profiled exactly, so checking a large table costs about the same as checking a small one.
+    Only Postgres samples; Redshift can't without reading every block, so it checks those tables exactly.
+
+    With the `plan_check` param set to 'warn' or 'fail', each check's query is EXPLAINed before the checks run and its
+    plan compared with the one recorded on the previous run; see PlanGuard.
+
+    Tables listed in tests_to_run's `history`, each with the `key` column whose max marks how far it's loaded, have a
+    snapshot of their row count, max key and catalog counters recorded per run, along with the row and null counts the
+    checks arrive at; see QualityHistory. Their row count test is answered from the snapshot. A table whose snapshot
+    matches its last passing one isn't profiled again, unless its `skip_unchanged` is False. A row count delta outside
+    the band learned from earlier runs (`band` median absolute deviations wide once there are `min_history` deltas)
+    fails the run, or only warns with `on_anomaly` set to 'warn'."""
     ui_color = '#89DA59'
+    profile_stats = {
+        'min': "MIN({})",
+        'max': "MAX({})",
+        'approx_distinct': "APPROXIMATE COUNT(DISTINCT {})",
+    }
+    dialect_profile_stats = {
+        'redshift': profile_stats,
+        'postgres': dict(profile_stats, approx_distinct="COUNT(DISTINCT {})"),
+    }
+    max_null_pct = 70
 
     @apply_defaults
     def __init__(self,
@@ -31,16 +82,74 @@ class DataQualityOperator(BaseOperator):
         self.null_checks_summary = []
         self.null_successes = []
         self.null_failures = []
+        self.custom_checks_summary = []
+        self.checkpointed_summary = []
+        self.history_summary = []
+        self.metrics = []
+        self.table_passed = {}
 
     def execute(self, context):
-        tests_to_run = context["params"]["tests_to_run"]
+        params = context["params"]
+        tests_to_run = params["tests_to_run"]
+        max_workers = params.get('max_workers', 1)
         self.log.info(f"Preparing the following tests: {tests_to_run}")
-        if 'test_row_counts' in tests_to_run:
-            self.test_row_counts(tests_to_run['test_row_counts'])
-        if 'test_null_values' in tests_to_run:
-            for table, columns in tests_to_run['test_null_values'].items():
-                for column in columns:
-                    self.test_null_values(table, column)
+
+        redshift = InstrumentedPostgresHook(postgres_conn_id=self.conn_id, context=context)
+        pool = ConnectionPool(redshift, size=max_workers)
+        try:
+            history, states = None, {}
+            if tests_to_run.get('history'):
+                history = QualityHistory.for_task(redshift, context, params)
+                tests_to_run, states = self.apply_history(history, tests_to_run)
+
+            sampling, dialect = tests_to_run.get('sampling', {}), params.get('dialect', 'redshift')
+            if sampling and dialect not in SAMPLING_DIALECTS:
+                self.log.info(f"{dialect} can't sample without a full scan; checking {sorted(sampling)} exactly")
+                tests_to_run, sampling = dict(tests_to_run, sampling={}), {}
+            estimates = estimate_rows(redshift, list(sampling), dialect) if sampling else {}
+            checks = self.plan_checks(tests_to_run, params, estimates)
+
+            checkpoint, check_fingerprints = None, {}
+            if params.get('checkpoint', False):
+                checkpoint = QualityCheckpoint.for_task(redshift, context, params.get('dialect', 'redshift'),
+                                                        params.get('checkpoint_table', 'etl_quality_results'))
+            guard = PlanGuard.for_task(redshift, self.log, context, params.get('plan_check'),
+                                       params.get('plan_cost_ratio', 2.0), params.get('plan_table', 'etl_query_plans'),
+                                       params.get('plan_retention_days', 90))
+
+            # Sampled checks can hand columns whose estimate is too close to call to exact checks, run in a second round
+            results = []
+            while checks:
+                if checkpoint:
+                    checks, fingerprints = self.skip_passed_checks(checkpoint, checks)
+                    check_fingerprints.update(fingerprints)
+                for check in checks if guard else []:
+                    guard.check(check.name, check.sql, statement_fingerprint(check.sql))
+                outcomes = self.run_checks(pool, checks, max_workers, params.get('check_timeout'))
+
+                follow_ups = []
+                for check, outcome in zip(checks, outcomes):
+                    failures = len(self.failed_tests) + len(self.null_failures)
+                    if isinstance(outcome, Exception):
+                        self.check_errored(check, outcome)
+                        deferred = []
+                    else:
+                        deferred = check.handler(outcome) or []
+                    # A check that deferred to exact checks isn't settled, so it's recorded as not passed and re-run
+                    passed = len(self.failed_tests) + len(self.null_failures) == failures
+                    results.append((check, passed and not deferred))
+                    for table in check.tables if not passed else []:
+                        self.table_passed[table] = False
+                    follow_ups.extend(deferred)
+                checks = follow_ups
+
+            if checkpoint:
+                checkpoint.record(results, check_fingerprints)
+            if history:
+                history.record(states, self.metrics, self.table_passed)
+        finally:
+            pool.close()
+            redshift.push_metrics()
 
         self.display_quality_check_results()
         if self.any_tests_failed:
@@ -55,6 +164,9 @@ class DataQualityOperator(BaseOperator):
         {newline.join(self.row_counts_summary)}
         {newline.join(self.null_successes)}
         {newline.join(self.null_checks_summary)}
+        {newline.join(self.custom_checks_summary)}
+        {newline.join(self.checkpointed_summary)}
+        {newline.join(self.history_summary)}
         {TestHelpers.end_block}
         """
         self.log.info(message)
@@ -73,52 +185,357 @@ class DataQualityOperator(BaseOperator):
         """
         self.log.error(message)
 
-    def test_row_counts(self, tables):
+    def plan_checks(self, tests_to_run, params, estimates=None):
+        """
+        Turns tests_to_run into an ordered list of independent checks, each of which is a single query
+        :param tests_to_run: the tests_to_run dict, i.e. TestHelpers.tests_to_run
+        :param params: the task params, used for the profiling options and dialect
+        :param estimates: dict of table -> estimated rows, for the tables to be sampled
+        :return: list of QualityCheck
+        """
+        row_count_tables = tests_to_run.get('test_row_counts', [])
+        null_value_tests = tests_to_run.get('test_null_values', {})
+
+        checks, sampled = [], set()
+        for table, config in tests_to_run.get('sampling', {}).items():
+            fraction = sample_fraction((estimates or {}).get(table), config.get('sample_rows', 100000))
+            if fraction is None or (table not in row_count_tables and table not in null_value_tests):
+                continue
+            columns = null_value_tests.get(table, [])
+            sample_sql = DataQualityOperator.build_profile_sql(table, columns, [], sample_clause(fraction))
+            # Identified by the unsampled query, since the fraction moves with the estimate between tries
+            checks.append(QualityCheck(f"sampled profile of {table}", sample_sql,
+                                       partial(self.check_sample, table, columns, config, fraction,
+                                               table in row_count_tables),
+                                       [table], DataQualityOperator.build_profile_sql(table, columns, [])))
+            sampled.add(table)
+        row_count_tables = [table for table in row_count_tables if table not in sampled]
+        null_value_tests = {table: columns for table, columns in null_value_tests.items() if table not in sampled}
+
+        if params.get('profile', False):
+            stats, dialect = params.get('profile_stats', []), params.get('dialect', 'redshift')
+            for table, columns in null_value_tests.items():
+                checks.append(QualityCheck(f"profile of {table}",
+                                           DataQualityOperator.build_profile_sql(table, columns, stats,
+                                                                                 dialect=dialect),
+                                           partial(self.check_profile, table, columns, stats,
+                                                   table in row_count_tables),
+                                           [table]))
+            row_count_tables = [table for table in row_count_tables if table not in null_value_tests]
+            null_value_tests = {}
+
+        for table in row_count_tables:
+            checks.append(QualityCheck(f"test_row_counts on {table}",
+                                       f"SELECT COUNT(*) FROM {table}",
+                                       partial(self.check_row_count_records, table),
+                                       [table]))
+        for table, columns in null_value_tests.items():
+            for column in columns:
+                checks.append(QualityCheck(f"test_null_values for {column} column in {table}",
+                                           DataQualityOperator.build_profile_sql(table, [column], []),
+                                           partial(self.check_profile, table, [column], [], False),
+                                           [table]))
+        for custom_check in tests_to_run.get('custom_checks', []):
+            checks.append(QualityCheck(custom_check.get('name', custom_check['check_sql']),
+                                       custom_check['check_sql'],
+                                       partial(self.check_expected_result, custom_check),
+                                       custom_check.get('tables', [])))
+        return checks
+
+    def apply_history(self, history, tests_to_run):
+        """
+        Snapshots the tables in tests_to_run's `history` and compares them with their history: answers their row count
+        tests, flags row count deltas outside the learned band and drops the profiling of unchanged tables
+        :param history: the run's QualityHistory
+        :param tests_to_run: the tests_to_run dict, i.e. TestHelpers.tests_to_run
+        :return: tuple of the tests_to_run left to plan and dict of table -> its state, from table_states
+        """
+        config = tests_to_run['history']
+        for table, options in config.items():
+            if options.get('on_anomaly', 'fail') not in ANOMALY_ACTIONS:
+                raise ValueError(f"on_anomaly for {table} must be one of {ANOMALY_ACTIONS}, "
+                                 f"not {options['on_anomaly']!r}")
+        states = history.table_states(config)
+        snapshots = history.snapshots(list(states))
+
+        unchanged = set()
+        for table, state in states.items():
+            if table in tests_to_run.get('test_row_counts', []):
+                failures = len(self.failed_tests)
+                self.check_row_count(table, state['row_count'])
+                if len(self.failed_tests) > failures:
+                    self.table_passed[table] = False
+
+            last = QualityHistory.last_passing(snapshots[table])
+            band = QualityHistory.row_count_band(snapshots[table], config[table])
+            if last and band:
+                delta = state['row_count'] - last['row_count']
+                if not band[0] <= delta <= band[1]:
+                    self.flag_anomaly(table, delta, band, last['run_id'], config[table].get('on_anomaly', 'fail'))
+
+            if config[table].get('skip_unchanged', True) and last and last['fingerprint'] == state['fingerprint']:
+                unchanged.add(table)
+                self.history_summary.append(f"{table} is unchanged since passing on {last['run_id']} "
+                                            f"({state['row_count']} rows, max {config[table]['key']} "
+                                            f"{state['max_key']}); skipped profiling")
+
+        null_value_tests = tests_to_run.get('test_null_values', {})
+        return dict(tests_to_run,
+                    test_row_counts=[table for table in tests_to_run.get('test_row_counts', []) if table not in states],
+                    test_null_values={table: columns for table, columns in null_value_tests.items()
+                                      if table not in unchanged},
+                    sampling={table: options for table, options in tests_to_run.get('sampling', {}).items()
+                              if table not in unchanged}), states
+
+    def flag_anomaly(self, table, delta, band, run_id, on_anomaly):
+        """
+        Records a row count delta outside the band learned from history
+        :param table: the table whose row count moved unexpectedly
+        :param delta: the change in its row count since its last passing snapshot
+        :param band: tuple of the bounds the delta was expected in
+        :param run_id: the run of the last passing snapshot
+        :param on_anomaly: 'fail' to fail the run or 'warn' to only report it
+        :return: None
+        """
+        message = f"row count delta of {table} is {delta:+d} since {run_id}, " \
+                  f"outside the expected {band[0]:+.0f} to {band[1]:+.0f}"
+        if on_anomaly == 'fail':
+            self.any_tests_failed = True
+            self.table_passed[table] = False
+            self.failed_tests.append(f"test_row_count_delta failed. The {message}")
+        else:
+            self.log.warning(f"The {message}")
+            self.history_summary.append(f"WARNING: the {message}")
+
+    def skip_passed_checks(self, checkpoint, checks):
+        """
+        Drops the checks that passed on an earlier try of the run against tables that haven't changed since
+        :param checkpoint: the run's QualityCheckpoint
+        :param checks: list of QualityCheck
+        :return: tuple of the checks to run and dict of check id -> table state fingerprint for every check
+        """
+        to_run, skipped, check_fingerprints = checkpoint.plan(checks)
+        for check in checks:
+            if check_id(check) in skipped:
+                self.checkpointed_summary.append(f"{check.name} passed on try {skipped[check_id(check)]} "
+                                                 f"and its tables are unchanged; skipped")
+        self.log.info(f"Skipping {len(skipped)} checks that already passed; running {len(to_run)}")
+        return to_run, check_fingerprints
+
+    def run_checks(self, pool, checks, max_workers=1, timeout=None):
+        """
+        Runs the checks' queries, in parallel when max_workers > 1. Results are returned in the same order as the
+        checks regardless of which finishes first, so the summary is deterministic.
+        :param pool: the ConnectionPool to run the queries on
+        :param checks: list of QualityCheck
+        :param max_workers: how many checks may run at once
+        :param timeout: optional per-check statement timeout in seconds
+        :return: list with the records, or the exception raised, for each check
+        """
+        if max_workers <= 1:
+            return [self.run_check(pool, check, timeout) for check in checks]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(self.run_check, pool, check, timeout) for check in checks]
+            return [future.result() for future in futures]
+
+    def run_check(self, pool, check, timeout=None):
         """
-        Tests whether a table contains rows after ETL and returns the number of rows. A table fails if there are 0 rows.
-        :param tables: a list of tables against which to run the check
-        :return: If no rows exist returns an error; otherwise, count of rows
+        Runs a single check's query on a pooled connection
+        :param pool: the ConnectionPool to run the query on
+        :param check: the QualityCheck to run
+        :param timeout: optional statement timeout in seconds
+        :return: the query's records, or the exception it raised
+        """
+        self.log.info(f"Running {check.name}")
+        try:
+            return pool.get_records(check.sql, timeout)
+        except Exception as e:
+            return e
+
+    def check_errored(self, check, error):
+        """
+        Records a check whose query could not be run, e.g. because it hit the statement timeout
+        :param check: the QualityCheck that errored
+        :param error: the exception raised by its query
+        :return: None
+        """
+        self.any_tests_failed = True
+        self.failed_tests.append(f"{check.name} errored: {error}")
+
+    def check_row_count_records(self, table, records):
+        """
+        Records the outcome of a COUNT(*) query for test_row_counts
+        :param table: the table that was counted
+        :param records: the query's records
+        :return: None
+        """
+        self.check_row_count(table, records[0][0] if records else 0)
+
+    def check_profile(self, table, columns, stats, count_rows, records):
+        """
+        Feeds the row count and null value tests from the result of a profiling query
+        :param table: the table that was profiled
+        :param columns: the columns that were profiled
+        :param stats: the extra per-column stats that were collected
+        :param count_rows: True if the row count should also be recorded as a test_row_counts result
+        :param records: the profiling query's records
+        :return: None
+        """
+        profile = DataQualityOperator.parse_profile(records[0], columns, stats)
+        if count_rows:
+            self.check_row_count(table, profile['row_count'])
+        for column in columns:
+            column_profile = profile['columns'][column]
+            self.check_null_values(table, column, column_profile.pop('nulls'), profile['row_count'], column_profile)
+
+    def check_sample(self, table, columns, config, fraction, count_rows, records):
+        """
+        Feeds the row count and null value tests from a sampled profiling query. Null ratios are estimated with a Wilson
+        confidence interval at the configured `confidence`; columns whose interval overlaps the null threshold are left
+        to an exact profile, as is the whole table if the sample came back empty.
+        :param table: the table that was sampled
+        :param columns: the columns that were profiled
+        :param config: the table's sampling config, with its sample_rows and confidence
+        :param fraction: the fraction of the table that was sampled
+        :param count_rows: True if the row count should also be recorded as a test_row_counts result
+        :param records: the sampled profiling query's records
+        :return: list of the exact QualityChecks to run instead, if any
+        """
+        profile = DataQualityOperator.parse_profile(records[0], columns, [])
+        sampled_rows = profile['row_count']
+        if not sampled_rows:
+            self.log.info(f"The sample of {table} is empty; profiling it exactly")
+            return [self.exact_profile_check(table, columns, count_rows)]
+
+        confidence = config.get('confidence', 0.95)
+        estimated_rows = round(sampled_rows / fraction)
+        if count_rows:
+            self.check_row_count(table, estimated_rows, estimated=True)
+
+        exact_columns = []
+        for column in columns:
+            nulls = profile['columns'][column]['nulls']
+            low, high = wilson_interval(nulls, sampled_rows, confidence)
+            if low * 100 < DataQualityOperator.max_null_pct <= high * 100:
+                exact_columns.append(column)
+                continue
+            self.check_null_values(table, column, round(nulls / fraction), estimated_rows,
+                                   {'sampled_rows': sampled_rows,
+                                    f"{confidence:.0%}_interval": f"{low * 100:.2f}% to {high * 100:.2f}%"},
+                                   estimated=True)
+        if exact_columns:
+            self.log.info(f"Null ratios of {exact_columns} in {table} are too close to call; profiling them exactly")
+            return [self.exact_profile_check(table, exact_columns, False)]
+        return []
+
+    def exact_profile_check(self, table, columns, count_rows):
+        """
+        :param table: the table to profile
+        :param columns: the columns to profile
+        :param count_rows: True if the row count should also be recorded as a test_row_counts result
+        :return: a QualityCheck that profiles the columns over the whole table
+        """
+        return QualityCheck(f"exact profile of {', '.join(columns) or 'rows'} in {table}",
+                            DataQualityOperator.build_profile_sql(table, columns, []),
+                            partial(self.check_profile, table, columns, [], count_rows),
+                            [table])
+
+    def check_expected_result(self, custom_check, records):
+        """
+        Compares the first value returned by a user-supplied check to its expected result
+        :param custom_check: dict with the check_sql, expected_result and an optional name
+        :param records: the check query's records
+        :return: None
+        """
+        name = custom_check.get('name', custom_check['check_sql'])
+        result = records[0][0] if records and records[0] else None
+        expected = custom_check['expected_result']
+        if result != expected:
+            self.any_tests_failed = True
+            self.failed_tests.append(f"{name} failed. Expected {expected} but got {result}")
+        else:
+            self.custom_checks_summary.append(f"{name} passed with {result}")
+
+    @staticmethod
+    def parse_profile(record, columns, stats):
+        """
+        Splits a row returned by a profiling query back out into the row count and per-column stats
+        :param record: the profiling query's single row
+        :param columns: the columns that were profiled
+        :param stats: the extra per-column stats that were collected
+        :return: dict of the row count and a dict of stats for each column
+        """
+        values = iter(record[1:])
+        return {'row_count': record[0],
+                'columns': {column: {stat: next(values) for stat in ['nulls'] + list(stats)} for column in columns}}
+
+    @staticmethod
+    def build_profile_sql(table, columns, stats, sample='', dialect='redshift'):
+        """
+        Builds a single aggregate query that profiles a table. The row count comes first, followed by the null count
+        and then each requested stat for every column, in the order given.
+        :param table: the table to profile
+        :param columns: the columns to profile
+        :param stats: extra per-column stats to collect; any of 'min', 'max' and 'approx_distinct'
+        :param sample: an optional clause that samples the table, from sample_clause
+        :param dialect: 'redshift' or 'postgres', which picks how the stats are computed
+        :return: the profiling query
+        """
+        profile_stats = DataQualityOperator.dialect_profile_stats[dialect]
+        unknown_stats = set(stats) - set(profile_stats)
+        if unknown_stats:
+            raise ValueError(f"Unknown profile stats {sorted(unknown_stats)}")
+
+        select_list = ['COUNT(*)']
+        for column in columns:
+            select_list.append(f'COUNT(*) - COUNT("{column}")')
+            select_list.extend(profile_stats[stat].format(f'"{column}"') for stat in stats)
+        select_list = ',\n               '.join(select_list)
+        return f"""
+        SELECT {select_list}
+        FROM {table} {sample}
+        """
+
+    def check_row_count(self, table, row_count, estimated=False):
+        """
+        Records the outcome of a row count test. A table fails if there are 0 rows.
+        :param table: the table that was counted
+        :param row_count: the number of rows in the table
+        :param estimated: True if the row count was estimated from a sample
+        :return: None
         """
         test_name = 'test_row_counts'
+        self.metrics.append((table, None, 'estimated_row_count' if estimated else 'row_count', row_count))
 
-        self.row_counts_failed = False
-        redshift_hook = PostgresHook("redshift")
-        for table in tables:
-            self.log.info(f"Running {test_name} on {table}")
-            records = redshift_hook.get_records(f"SELECT COUNT(*) FROM {table}")
-            if not records:
-                self.row_counts_failed = True
-                self.any_tests_failed = True
-                self.failed_tests.append(f"{test_name} failed on {table}")
-                message = f"{test_name} failed. {table} returned no results"
-            else:
-                message = f"{test_name} on table {table} passed with {records[0][0]} records"
-
-            self.failed_tests.append(message) if self.row_counts_failed else self.row_counts_summary.append(message)
-
-    def test_null_values(self, table, column):
-        """
-        Determines how many of a column's rows are null. A column must consist of >70% to constitute a failure
-        :param table: the table against which to run the check
-        :param column: the column against which to run the check
-        :return: If no rows exist returns an error; otherwise, count of rows
+        self.row_counts_failed = row_count < 1
+        if self.row_counts_failed:
+            self.any_tests_failed = True
+            self.failed_tests.append(f"{test_name} failed. {table} returned no results")
+        else:
+            estimate = ' (estimated from a sample)' if estimated else ''
+            self.row_counts_summary.append(f"{test_name} on table {table} passed with {row_count} records{estimate}")
+
+    def check_null_values(self, table, column, null_count, row_count, stats=None, estimated=False):
+        """
+        Records the outcome of a null value test. A column must consist of >70% to constitute a failure
+        :param table: the table the column belongs to
+        :param column: the column that was checked
+        :param null_count: the number of null rows in the column
+        :param row_count: the number of rows in the table
+        :param stats: optional dict of extra column stats to include in the summary
+        :param estimated: True if the null count was estimated from a sample
+        :return: None
         """
         test_name = 'test_null_values'
+        self.metrics.append((table, column, 'estimated_null_count' if estimated else 'null_count', null_count))
 
         self.null_counts_failed = False
-        redshift_hook = PostgresHook("redshift")
-        null_records = redshift_hook.get_records(f"SELECT COUNT(*) FROM {table} where {column} is null")
-        all_records = redshift_hook.get_records(f"SELECT COUNT(*) FROM {table}")
-        self.log.info(f"Running {test_name} for {column} column in {table}")
-
-        null_count = null_records[0][0]
-        row_count = all_records[0][0]
-        pct_null = ((null_count / row_count) * 100)
-        outcome = 'failed' if pct_null >= 70 else 'passed'
+        pct_null = ((null_count / row_count) * 100) if row_count else 0.0
+        outcome = 'failed' if pct_null >= DataQualityOperator.max_null_pct else 'passed'
 
         message = f"{test_name} on column {column} in table {table} {outcome}. " \
                   f"{pct_null:.2f}% of the records are null"
-        # self.log.info(f"{column} {table} {null_count} {row_count} {pct_null}")
         if outcome == 'failed':
             self.null_counts_failed = True
             self.any_tests_failed = True
@@ -130,3 +547,5 @@ class DataQualityOperator(BaseOperator):
         self.null_checks_summary.append(f"COUNT OF NULL ROWS: {null_count}")
         self.null_checks_summary.append(f"COUNT OF ALL ROWS: {row_count}")
         self.null_checks_summary.append(f"PERCENT NULL: {pct_null:.2f}%")
+        for stat, value in (stats or {}).items():
+            self.null_checks_summary.append(f"{stat.upper().replace('_', ' ')}: {value}")
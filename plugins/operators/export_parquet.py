@@ -0,0 +1,228 @@
+import json
+import os
+import tempfile
+from contextlib import closing
+
+from airflow.hooks.base_hook import BaseHook
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from helpers.execution_window import PARTITION_SIZES, execution_window, partition_starts, window_predicate
+from helpers.export_target import export_target
+from helpers.load_ledger import quote
+from hooks.instrumented_postgres import InstrumentedPostgresHook
+
+
+class ParquetExportOperator(BaseOperator):
+    """
+    Exports a table, or the result of a `sql` query, as Parquet files partitioned by date under `target`, an
+    s3://bucket/prefix URL or (on Postgres) a local directory, so downstream consumers can read them without querying
+    the warehouse. Files are laid out Hive style, e.g. `<target>/export_date=2018-11-01/part-...parquet`, where the
+    partition name is `partition_name`.
+
+    A day is exported once, by the run whose execution window ends it, so the hourly DAG exports each day at midnight
+    and a daily backfill with each of its runs. Runs whose window ends mid-day do nothing. Every export replaces the
+    whole partition of each day it writes, so the hourly and backfill DAGs write the same files for a day rather than
+    copies of its rows. Clearing a run whose window ends mid-day doesn't re-export its day; clear the day's last run.
+
+    With a `partition_column`, each day the window touches is exported from the rows that fall in it.
+    `partition_column_type` is 'timestamp' or 'epoch_ms', as for the stage operator. Without one, the whole table is
+    exported as that day's snapshot into the partition of the window's last day, so a dimension is exported once a day
+    rather than every hour.
+
+    Every day's export writes a manifest to `<target>/_manifests/<day>.json` listing its files, their sizes and row
+    counts in COPY manifest form, along with the total rows. Files listed by the day's previous manifest that weren't
+    written again are deleted, so retries and re-runs are idempotent.
+
+    On Redshift each day is exported with a parallel UNLOAD, one or more files per slice; if no `iam_role` is given, it
+    is read from the `iam_role` extra of the conn_id connection. With `backend` set to 'postgres', each day is streamed
+    through a server-side cursor in batches of `batch_rows` and written with pyarrow one row group per batch, so memory
+    use is bounded by the batch size rather than the export.
+    """
+    ui_color = '#A3C4BC'
+    backends = ('redshift', 'postgres')
+    unload_sql = """
+        UNLOAD ('{}')
+        TO '{}'
+        IAM_ROLE '{}'
+        FORMAT AS PARQUET
+        MANIFEST VERBOSE
+        ALLOWOVERWRITE
+    """
+
+    @apply_defaults
+    def __init__(self,
+                 conn_id="redshift",
+                 params=None,
+                 *args,
+                 **kwargs):
+        super(ParquetExportOperator, self).__init__(*args, **kwargs)
+
+        if params is None:
+            params = {}
+        self.conn_id = conn_id
+        self.table = params.get('table', None)
+        self.sql = params.get('sql', None)
+        self.columns = params.get('columns', None)
+        self.target = params.get('target', None)
+        self.partition_column = params.get('partition_column', None)
+        self.partition_column_type = params.get('partition_column_type', 'timestamp')
+        self.partition_name = params.get('partition_name', 'export_date')
+        self.manifest_prefix = params.get('manifest_prefix', '_manifests')
+        self.backend = params.get('backend', 'redshift')
+        self.iam_role = params.get('iam_role', None)
+        self.aws_conn_id = params.get('aws_conn_id', 'aws_default')
+        self.batch_rows = params.get('batch_rows', 50000)
+        self.compression = params.get('compression', 'snappy')
+
+        if bool(self.table) == bool(self.sql):
+            raise ValueError("Exactly one of table and sql must be given")
+        if not self.target:
+            raise ValueError("A target to export to is required")
+        if self.backend not in ParquetExportOperator.backends:
+            raise ValueError(f"backend must be one of {ParquetExportOperator.backends}, not {self.backend!r}")
+        if self.backend == 'redshift' and not self.target.startswith('s3://'):
+            raise ValueError(f"Redshift can only UNLOAD to S3, not {self.target!r}")
+        if self.partition_column_type not in ('timestamp', 'epoch_ms'):
+            raise ValueError(f"partition_column_type must be 'timestamp' or 'epoch_ms', "
+                             f"not {self.partition_column_type!r}")
+
+    def execute(self, context):
+        start, end = execution_window(context)
+        days = self.export_days(start, end)
+        if not days:
+            self.log.info(f"{start} to {end} doesn't end a day; its days are exported by the run that does")
+            return None
+
+        target = export_target(self.target, self.aws_conn_id)
+        redshift = InstrumentedPostgresHook(postgres_conn_id=self.conn_id, context=context)
+        manifests = []
+        try:
+            if self.backend == 'redshift' and not self.iam_role:
+                self.iam_role = BaseHook.get_connection(self.conn_id).extra_dejson.get('iam_role')
+            for day, predicate in days:
+                if self.backend == 'postgres':
+                    files = self.export_streaming(redshift, target, day, predicate)
+                else:
+                    files = self.export_unload(redshift, target, day, predicate)
+                manifests.append(self.replace_partition(target, day, files))
+        finally:
+            redshift.push_metrics()
+        return manifests
+
+    def export_days(self, start, end):
+        """
+        Lists the days a run exports: none unless its window ends at midnight, and otherwise every day the window
+        touches, or just its last day for a snapshot
+        :param start: the window's start (inclusive)
+        :param end: the window's end (exclusive)
+        :return: list of (day, predicate) with the predicate that selects that day's rows, or None for a snapshot
+        """
+        if end != end.replace(hour=0, minute=0, second=0, microsecond=0):
+            return []
+        if not self.partition_column:
+            return [((end - PARTITION_SIZES['day']).date(), None)]
+        return [(day_start.date(), window_predicate(self.partition_column, day_start,
+                                                    day_start + PARTITION_SIZES['day'], self.partition_column_type))
+                for day_start in partition_starts(start, end, 'day')]
+
+    def select_sql(self, predicate):
+        """
+        :param predicate: the predicate selecting the rows to export, or None for all of them
+        :return: the query whose rows are exported
+        """
+        source = self.table or f"({self.sql}) export_source"
+        select_list = ', '.join(self.columns) if self.columns else '*'
+        where = f" WHERE {predicate}" if predicate else ''
+        return f"SELECT {select_list} FROM {source}{where}"
+
+    def partition_prefix(self, day):
+        """
+        :param day: the partition's date
+        :return: the key prefix of the partition's files
+        """
+        return f"{self.partition_name}={day:%Y-%m-%d}/part-"
+
+    def replace_partition(self, target, day, files):
+        """
+        Writes a day's manifest and then deletes the files its previous export wrote that weren't written again
+        :param target: the export target
+        :param day: the partition's date
+        :param files: list of dicts with the key, size and rows of every file the export wrote
+        :return: the manifest's URL
+        """
+        manifest_key = f"{self.manifest_prefix}/{day:%Y-%m-%d}.json"
+        previous = target.read_string(manifest_key)
+        rows = sum(file['rows'] for file in files)
+        manifest = {'day': f"{day:%Y-%m-%d}",
+                    'rows': rows,
+                    'entries': [{'url': target.url(file['key']),
+                                 'mandatory': True,
+                                 'meta': {'content_length': file['size'], 'record_count': file['rows']}}
+                                for file in files]}
+        target.put_string(json.dumps(manifest), manifest_key)
+
+        if previous:
+            written = {target.url(file['key']) for file in files}
+            stale = [entry['url'][len(target.url('')):] for entry in json.loads(previous)['entries']
+                     if entry['url'] not in written]
+            target.delete(stale)
+            if stale:
+                self.log.info(f"Deleted {len(stale)} files left over from {day}'s previous export")
+
+        self.log.info(f"Exported {rows} rows for {day} in {len(files)} files listed in {target.url(manifest_key)}")
+        return target.url(manifest_key)
+
+    def export_unload(self, redshift, target, day, predicate):
+        """
+        UNLOADs a day in parallel, then reads the files written from the manifest UNLOAD writes next to them, which is
+        removed so readers of the partition only see Parquet files
+        :param redshift: the hook to run the UNLOAD with
+        :param target: the S3ExportTarget
+        :param day: the partition's date
+        :param predicate: the predicate selecting the day's rows, or None for a snapshot
+        :return: list of dicts with the key, size and rows of every file written
+        """
+        prefix = self.partition_prefix(day)
+        self.log.info(f"Unloading {self.table or 'query'} rows for {day} to {target.url(prefix)}")
+        redshift.run(ParquetExportOperator.unload_sql.format(quote(self.select_sql(predicate)), target.url(prefix),
+                                                             self.iam_role))
+        unload_manifest = target.read_string(f"{prefix}manifest")
+        if unload_manifest is None:
+            return []
+        target.delete([f"{prefix}manifest"])
+        return [{'key': entry['url'][len(target.url('')):],
+                 'size': entry['meta']['content_length'],
+                 'rows': entry['meta']['record_count']} for entry in json.loads(unload_manifest)['entries']]
+
+    def export_streaming(self, postgres, target, day, predicate):
+        """
+        Streams a day through a server-side cursor into one Parquet file, written to a temp file and then moved or
+        uploaded into place
+        :param postgres: the hook to read with
+        :param target: the export target
+        :param day: the partition's date
+        :param predicate: the predicate selecting the day's rows, or None for a snapshot
+        :return: list of dicts with the key, size and rows of every file written
+        """
+        # pyarrow is only needed on the Postgres backend, so Redshift-only deployments don't have to install it
+        from helpers.parquet_writer import write_cursor
+
+        key = f"{self.partition_prefix(day)}0000.parquet"
+        fd, path = tempfile.mkstemp(suffix='.parquet')
+        os.close(fd)
+        try:
+            with closing(postgres.get_conn()) as conn:
+                with conn.cursor(name=f"export_{day:%Y%m%d}") as cursor:
+                    cursor.execute(self.select_sql(predicate))
+                    rows = write_cursor(cursor, path, self.batch_rows, self.compression)
+                conn.rollback()
+            if not rows:
+                return []
+            size = os.path.getsize(path)
+            target.put_file(path, key)
+            self.log.info(f"Wrote {rows} rows for {day} to {target.url(key)}")
+            return [{'key': key, 'size': size, 'rows': rows}]
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
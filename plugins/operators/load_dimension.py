@@ -1,7 +1,12 @@
-from airflow.hooks.postgres_hook import PostgresHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
 
+from helpers.dimension_merge import DimensionMerge
+from helpers.query_plans import PLAN_CHECK_MODES, PlanGuard
+from helpers.table_swap import swap_statements
+from helpers.transaction import run_transaction
+from hooks.instrumented_postgres import InstrumentedPostgresHook, statement_fingerprint
+
 
 class LoadDimensionOperator(BaseOperator):
     """With dimension and fact operators, you can utilize the provided SQL helper class to run data transformations.
@@ -11,9 +16,21 @@ class LoadDimensionOperator(BaseOperator):
 
     Dimension loads are often done with the truncate-insert pattern where the target table is emptied before the load.
     Thus, you could also have a parameter that allows switching between insert modes when loading dimensions.
+
+    The `mode` param picks the insert mode: 'append' (the default), 'truncate' (or the `truncate` param), 'swap' or
+    'merge'. Truncate deletes and inserts in one transaction. Swap builds the new contents in a shadow table and renames
+    it into place, so readers never see an empty table and no deleted rows are left to vacuum. Merge loads the query
+    into a temp table, compares it to the table by the natural `key` using a hash of the other columns, and in one
+    transaction updates only the changed rows and inserts only the new keys. With `latest` set, the query returns one
+    more column after the table's, whose highest value picks the row kept for each key. The inserted, updated and
+    unchanged counts are logged and returned.
+
+    With the `plan_check` param set to 'warn' or 'fail', the query is EXPLAINed before it runs and its plan is compared
+    with the one recorded on the previous run, as in LoadFactOperator.
     """
     ui_color = '#80BD9E'
     append_sql = "INSERT INTO {} {}"
+    modes = ('append', 'truncate', 'swap', 'merge')
 
     @apply_defaults
     def __init__(self,
@@ -28,12 +45,59 @@ class LoadDimensionOperator(BaseOperator):
         self.sql = sql
         self.truncate = params.get('truncate', False)
         self.table = params.get('table', None)
+        self.mode = params.get('mode', 'truncate' if self.truncate else 'append')
+        self.key = params.get('key', None)
+        self.latest = params.get('latest', False)
+        self.dialect = params.get('dialect', 'redshift')
+        self.plan_check = params.get('plan_check', None)
+        self.plan_cost_ratio = params.get('plan_cost_ratio', 2.0)
+        self.plan_table = params.get('plan_table', 'etl_query_plans')
+        self.plan_retention_days = params.get('plan_retention_days', 90)
+
+        if self.mode not in LoadDimensionOperator.modes:
+            raise ValueError(f"mode must be one of {LoadDimensionOperator.modes}, not {self.mode!r}")
+        if self.plan_check is not None and self.plan_check not in PLAN_CHECK_MODES:
+            raise ValueError(f"plan_check must be one of {PLAN_CHECK_MODES}, not {self.plan_check!r}")
+        if self.mode == 'merge' and not self.key:
+            raise ValueError("A natural key is required to merge into a dimension")
 
     def execute(self, context):
-        redshift = PostgresHook(postgres_conn_id=self.conn_id)
-        if self.truncate:
-            self.log.info(f"Clearing data from table {self.table}")
-            redshift.run(f"DELETE FROM {self.table}")
+        redshift = InstrumentedPostgresHook(postgres_conn_id=self.conn_id, context=context)
+        try:
+            guard = PlanGuard.for_task(redshift, self.log, context, self.plan_check, self.plan_cost_ratio,
+                                       self.plan_table, self.plan_retention_days)
+            if guard:
+                guard.check(self.table, self.sql, statement_fingerprint(self.sql))
+
+            if self.mode == 'merge':
+                return self.merge(redshift)
+            if self.mode == 'swap':
+                self.log.info(f"Rebuilding table {self.table} in a shadow table and swapping it into place")
+                redshift.run(swap_statements(self.table, self.sql, self.dialect))
+                return
+
+            statements = []
+            if self.mode == 'truncate':
+                self.log.info(f"Clearing data from table {self.table}")
+                statements.append(f"DELETE FROM {self.table}")
+
+            self.log.info(f"Loading data into destination Redshift table {self.table}")
+            statements.append(LoadDimensionOperator.append_sql.format(self.table, self.sql))
+            redshift.run(statements)
+        finally:
+            redshift.push_metrics()
+
+    def merge(self, redshift):
+        """
+        Merges the results of the query into the table by natural key
+        :param redshift: the hook to run the statements with
+        :return: dict of how many rows were staged, inserted, updated and unchanged
+        """
+        columns = DimensionMerge.table_columns(redshift, self.table)
+        merge = DimensionMerge(self.table, self.key, columns, self.latest)
 
-        self.log.info(f"Loading data into destination Redshift table {self.table}")
-        redshift.run(LoadDimensionOperator.append_sql.format(self.table, self.sql))
+        self.log.info(f"Merging data into destination Redshift table {self.table} on {self.key}")
+        counts = DimensionMerge.summarize(run_transaction(redshift, merge.statements(self.sql)))
+        self.log.info(f"Merged {counts['staged']} rows into {self.table}: {counts['inserted']} inserted, "
+                      f"{counts['updated']} updated, {counts['unchanged']} unchanged")
+        return counts
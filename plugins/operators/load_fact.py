@@ -1,7 +1,11 @@
-from airflow.hooks.postgres_hook import PostgresHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
 
+from helpers.execution_window import execution_window, window_fields, window_predicate
+from helpers.query_plans import PLAN_CHECK_MODES, PlanGuard
+from helpers.table_swap import swap_statements
+from hooks.instrumented_postgres import InstrumentedPostgresHook, statement_fingerprint
+
 
 class LoadFactOperator(BaseOperator):
     """
@@ -11,9 +15,24 @@ class LoadFactOperator(BaseOperator):
     results of the transformation.
 
     Fact tables are usually so massive that they should only allow append type functionality.
+
+    The `mode` param picks how the table is loaded:
+    - 'append' (the default) inserts the results of the query
+    - 'full' (or the `truncate` param) deletes everything and rebuilds the table from the query
+    - 'swap' also rebuilds the table, but in a shadow table that is renamed into place, so readers never see it empty
+      and no deleted rows are left to vacuum
+    - 'incremental' loads only the run's execution window. The query is formatted with the fields from `window_fields`,
+      e.g. SqlQueries.songplay_table_insert_window, and the rows of the table whose `window_column` falls in the window
+      are replaced, so retries are idempotent.
+    Every mode runs in one transaction.
+
+    With the `plan_check` param set to 'warn' or 'fail', the load's query is EXPLAINed before it runs and its plan is
+    compared with the one recorded on the previous run; see PlanGuard. `plan_cost_ratio` sets how large a rise in the
+    estimated cost counts as a regression, and `plan_retention_days` how long superseded plans are kept.
     """
     ui_color = '#F98866'
     append_sql = "INSERT INTO {} {}"
+    modes = ('append', 'full', 'swap', 'incremental')
 
     @apply_defaults
     def __init__(self,
@@ -29,12 +48,47 @@ class LoadFactOperator(BaseOperator):
         self.sql = sql
         self.truncate = params.get('truncate', False)
         self.table = params.get('table', None)
+        self.mode = params.get('mode', 'full' if self.truncate else 'append')
+        self.window_column = params.get('window_column', 'start_time')
+        self.dialect = params.get('dialect', 'redshift')
+        self.plan_check = params.get('plan_check', None)
+        self.plan_cost_ratio = params.get('plan_cost_ratio', 2.0)
+        self.plan_table = params.get('plan_table', 'etl_query_plans')
+        self.plan_retention_days = params.get('plan_retention_days', 90)
+
+        if self.mode not in LoadFactOperator.modes:
+            raise ValueError(f"mode must be one of {LoadFactOperator.modes}, not {self.mode!r}")
+        if self.plan_check is not None and self.plan_check not in PLAN_CHECK_MODES:
+            raise ValueError(f"plan_check must be one of {PLAN_CHECK_MODES}, not {self.plan_check!r}")
 
     def execute(self, context):
-        redshift = PostgresHook(postgres_conn_id=self.conn_id)
-        if self.truncate:
-            self.log.info(f"Clearing data from table {self.table}")
-            redshift.run(f"DELETE FROM {self.table}")
+        redshift = InstrumentedPostgresHook(postgres_conn_id=self.conn_id, context=context)
+        try:
+            sql = self.sql
+            if self.mode == 'incremental':
+                start, end = execution_window(context)
+                sql = sql.format(**window_fields(start, end))
+
+            guard = PlanGuard.for_task(redshift, self.log, context, self.plan_check, self.plan_cost_ratio,
+                                       self.plan_table, self.plan_retention_days)
+            if guard:
+                guard.check(self.table, sql, statement_fingerprint(sql))
+
+            if self.mode == 'swap':
+                self.log.info(f"Rebuilding table {self.table} in a shadow table and swapping it into place")
+                redshift.run(swap_statements(self.table, sql, self.dialect))
+                return
+
+            statements = []
+            if self.mode == 'full':
+                self.log.info(f"Clearing data from table {self.table}")
+                statements.append(f"DELETE FROM {self.table}")
+            elif self.mode == 'incremental':
+                self.log.info(f"Replacing rows of table {self.table} from {start} to {end}")
+                statements.append(f"DELETE FROM {self.table} WHERE {window_predicate(self.window_column, start, end)}")
 
-        self.log.info(f"Loading data into destination Redshift table {self.table}")
-        redshift.run(LoadFactOperator.append_sql.format(self.table, self.sql))
+            self.log.info(f"Loading data into destination Redshift table {self.table}")
+            statements.append(LoadFactOperator.append_sql.format(self.table, sql))
+            redshift.run(statements)
+        finally:
+            redshift.push_metrics()
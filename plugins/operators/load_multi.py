@@ -0,0 +1,139 @@
+import time
+from collections import OrderedDict
+
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from helpers.dimension_merge import DimensionMerge
+from helpers.sql_queries import SqlQueries
+from helpers.transaction import transaction
+from hooks.instrumented_postgres import InstrumentedPostgresHook
+
+
+class MultiTargetLoadOperator(BaseOperator):
+    """
+    Loads several tables from the staging tables they share in a single task. Targets are grouped by source table and
+    each source is scanned once, copying just the columns its targets need (and, if every target filters it, just the
+    rows they keep) into a temp table that all of its targets are then populated from. Everything runs in one
+    transaction on one connection, so readers never see a half-loaded set of dimensions.
+
+    The `targets` param maps each table to a spec like those in SqlQueries.dimension_targets: the `source` table, the
+    source `columns` it needs, the `select` list and an optional `filter`. Each spec may also set a `mode` of 'append',
+    'truncate' (the default) or 'merge', with the natural `key` to merge on and optionally the source column whose
+    `latest` value picks the row kept for each key. The row count and load time of every target are logged and
+    returned. `dialect`, 'redshift' or 'postgres', picks how a `select` extracts the day of the week.
+    """
+    ui_color = '#80BD9E'
+    modes = ('append', 'truncate', 'merge')
+
+    @apply_defaults
+    def __init__(self,
+                 conn_id="redshift",
+                 params=None,
+                 *args,
+                 **kwargs):
+        super(MultiTargetLoadOperator, self).__init__(*args, **kwargs)
+
+        self.conn_id = conn_id
+        self.targets = params.get('targets', {})
+        self.dialect = params.get('dialect', 'redshift')
+
+        if self.dialect not in SqlQueries.weekday_part:
+            raise ValueError(f"dialect must be one of {sorted(SqlQueries.weekday_part)}, not {self.dialect!r}")
+
+        for table, spec in self.targets.items():
+            if spec.get('mode', 'truncate') not in MultiTargetLoadOperator.modes:
+                raise ValueError(f"mode for {table} must be one of {MultiTargetLoadOperator.modes}")
+            if spec.get('mode') == 'merge' and not spec.get('key'):
+                raise ValueError(f"A natural key is required to merge into {table}")
+
+    def execute(self, context):
+        redshift = InstrumentedPostgresHook(postgres_conn_id=self.conn_id, context=context)
+        try:
+            table_columns = {table: DimensionMerge.table_columns(redshift, table)
+                             for table, spec in self.targets.items() if spec.get('mode') == 'merge'}
+
+            results = OrderedDict()
+            with transaction(redshift) as cursor:
+                for source, targets in MultiTargetLoadOperator.group_by_source(self.targets).items():
+                    staged_table = f"{source}_fused"
+                    started = time.monotonic()
+                    cursor.execute(MultiTargetLoadOperator.stage_sql(source, staged_table, targets.values()))
+                    self.log.info(f"Staged {cursor.rowcount} rows of {source} for {', '.join(targets)} "
+                                  f"in {time.monotonic() - started:.2f}s")
+
+                    for table, spec in targets.items():
+                        started = time.monotonic()
+                        rows = self.load_target(cursor, table, spec, staged_table, table_columns.get(table))
+                        results[table] = {'rows': rows, 'seconds': round(time.monotonic() - started, 3)}
+                        self.log.info(f"Loaded {rows} rows into {table} from {source} "
+                                      f"in {results[table]['seconds']:.2f}s")
+                    cursor.execute(f"DROP TABLE {staged_table}")
+            return results
+        finally:
+            redshift.push_metrics()
+
+    def load_target(self, cursor, table, spec, staged_table, columns=None):
+        """
+        Populates one target from its source's staged temp table
+        :param cursor: the cursor of the open transaction
+        :param table: the target table
+        :param spec: the target's spec
+        :param staged_table: the temp table holding the source's staged rows
+        :param columns: the target's columns, needed for merge mode
+        :return: the number of rows inserted (or inserted and updated, when merging)
+        """
+        mode = spec.get('mode', 'truncate')
+        select = spec['select'].format(weekday=SqlQueries.weekday_part[self.dialect])
+        latest = spec.get('latest') if mode == 'merge' else None
+        if latest:
+            select += f', "{latest}"'
+        sql = f"SELECT {select} FROM {staged_table}"
+        if spec.get('filter'):
+            sql += f" WHERE {spec['filter']}"
+
+        if mode == 'merge':
+            row_counts = []
+            merge = DimensionMerge(table, spec['key'], columns, latest=bool(latest))
+            for statement in merge.statements(sql):
+                cursor.execute(statement)
+                row_counts.append(cursor.rowcount)
+            counts = DimensionMerge.summarize(row_counts)
+            return counts['inserted'] + counts['updated']
+
+        if mode == 'truncate':
+            cursor.execute(f"DELETE FROM {table}")
+        cursor.execute(f"INSERT INTO {table} {sql}")
+        return cursor.rowcount
+
+    @staticmethod
+    def group_by_source(targets):
+        """
+        :param targets: dict of table -> spec
+        :return: ordered dict of source table -> ordered dict of the table -> spec of the targets that read from it
+        """
+        grouped = OrderedDict()
+        for table, spec in targets.items():
+            grouped.setdefault(spec['source'], OrderedDict())[table] = spec
+        return grouped
+
+    @staticmethod
+    def stage_sql(source, staged_table, specs):
+        """
+        Builds the statement that copies the columns (and rows, if every target is filtered) needed by a source's
+        targets into a temp table
+        :param source: the source table
+        :param staged_table: the temp table to create
+        :param specs: the specs of the targets that read from the source
+        :return: the CREATE TEMP TABLE AS statement
+        """
+        specs = list(specs)
+        columns = []
+        for spec in specs:
+            columns.extend(column for column in spec['columns'] if column not in columns)
+        column_list = ', '.join(f'"{column}"' for column in columns)
+
+        sql = f"CREATE TEMP TABLE {staged_table} AS SELECT {column_list} FROM {source}"
+        if all(spec.get('filter') for spec in specs):
+            sql += ' WHERE ' + ' OR '.join(f"({spec['filter']})" for spec in specs)
+        return sql
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from helpers.execution_window import PARTITION_SIZES, execution_window, sql_timestamp, window_predicate
+from helpers.sql_queries import SqlQueries
+from hooks.instrumented_postgres import InstrumentedPostgresHook
+
+
+class LoadTimeDimensionOperator(BaseOperator):
+    """
+    Keeps a time dimension up to date without rescanning the whole fact table each run.
+
+    In 'incremental' mode (the default) only start_time values that aren't in the table yet are inserted, using
+    SqlQueries.time_table_insert_incremental. With `window` set (the default) only songplays from the run's execution
+    window are considered, so the cost of a run depends on that hour's plays rather than on all of history.
+
+    In 'calendar' mode a row for every hour or day (`granularity`) from `calendar_start` up to `calendar_end` is
+    generated in Python and written in a few multi-row INSERTs, replacing that range of the table in one transaction.
+
+    `dialect` picks how the day of the week is extracted: 'redshift' or 'postgres'.
+    """
+    ui_color = '#80BD9E'
+    calendar_insert_sql = """INSERT INTO {} (start_time, "hour", "day", week, "month", "year", weekday) VALUES\n{}"""
+    insert_batch_size = 5000
+    modes = ('incremental', 'calendar')
+
+    @apply_defaults
+    def __init__(self,
+                 conn_id="redshift",
+                 params=None,
+                 *args,
+                 **kwargs):
+        super(LoadTimeDimensionOperator, self).__init__(*args, **kwargs)
+
+        self.conn_id = conn_id
+        self.table = params.get('table', 'time')
+        self.mode = params.get('mode', 'incremental')
+        self.window = params.get('window', True)
+        self.calendar_start = params.get('calendar_start', None)
+        self.calendar_end = params.get('calendar_end', None)
+        self.granularity = params.get('granularity', 'hour')
+        self.dialect = params.get('dialect', 'redshift')
+
+        if self.mode not in LoadTimeDimensionOperator.modes:
+            raise ValueError(f"mode must be one of {LoadTimeDimensionOperator.modes}, not {self.mode!r}")
+        if self.granularity not in PARTITION_SIZES:
+            raise ValueError(f"granularity must be one of {sorted(PARTITION_SIZES)}, not {self.granularity!r}")
+        if self.dialect not in SqlQueries.weekday_part:
+            raise ValueError(f"dialect must be one of {sorted(SqlQueries.weekday_part)}, not {self.dialect!r}")
+        if self.mode == 'calendar' and not (self.calendar_start and self.calendar_end):
+            raise ValueError("calendar_start and calendar_end are required to generate a calendar")
+
+    def execute(self, context):
+        redshift = InstrumentedPostgresHook(postgres_conn_id=self.conn_id, context=context)
+        try:
+            if self.mode == 'calendar':
+                self.generate_calendar(redshift)
+                return
+
+            window_filter = '1 = 1'
+            if self.window:
+                start, end = execution_window(context)
+                window_filter = window_predicate('songplays.start_time', start, end)
+                self.log.info(f"Adding new start times from {start} to {end} to {self.table}")
+            else:
+                self.log.info(f"Adding all new start times to {self.table}")
+            insert_sql = SqlQueries.time_table_insert_incremental.format(
+                table=self.table, window_filter=window_filter, weekday=SqlQueries.weekday_part[self.dialect])
+            redshift.run(f"INSERT INTO {self.table} {insert_sql}")
+        finally:
+            redshift.push_metrics()
+
+    def generate_calendar(self, redshift):
+        """
+        Replaces the calendar range of the table with freshly generated rows
+        :param redshift: the hook to run the statements with
+        :return: None
+        """
+        start, end = LoadTimeDimensionOperator.parse_date(self.calendar_start), \
+            LoadTimeDimensionOperator.parse_date(self.calendar_end)
+        rows = LoadTimeDimensionOperator.calendar_rows(start, end, PARTITION_SIZES[self.granularity])
+        self.log.info(f"Generating {len(rows)} {self.granularity} rows in {self.table} from {start} to {end}")
+
+        statements = [f"DELETE FROM {self.table} WHERE {window_predicate('start_time', start, end)}"]
+        for i in range(0, len(rows), self.insert_batch_size):
+            values = ',\n'.join(f"({sql_timestamp(row[0])}, {row[1]}, {row[2]}, {row[3]}, '{row[4]}', {row[5]}, "
+                                f"'{row[6]}')" for row in rows[i:i + self.insert_batch_size])
+            statements.append(LoadTimeDimensionOperator.calendar_insert_sql.format(self.table, values))
+        redshift.run(statements)
+
+    @staticmethod
+    def calendar_rows(start, end, step):
+        """
+        Generates the time dimension columns for every step from start up to end
+        :param start: the first timestamp (inclusive)
+        :param end: the last timestamp (exclusive)
+        :param step: the timedelta between rows
+        :return: list of (start_time, hour, day, week, month, year, weekday) tuples, with weekday counted from Sunday
+            as 0 to match extract(dayofweek ...) and extract(dow ...)
+        """
+        count = int((end - start) / step)
+        timestamps = [start + step * i for i in range(count)]
+        return [(ts, ts.hour, ts.day, ts.isocalendar()[1], ts.month, ts.year, (ts.weekday() + 1) % 7)
+                for ts in timestamps]
+
+    @staticmethod
+    def parse_date(value):
+        """
+        :param value: a datetime, or a 'YYYY-MM-DD' string
+        :return: the value as a datetime
+        """
+        return value if isinstance(value, datetime) else datetime.strptime(value, '%Y-%m-%d')
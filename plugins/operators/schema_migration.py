@@ -0,0 +1,94 @@
+from datetime import datetime
+
+from airflow.hooks.postgres_hook import PostgresHook
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from helpers.execution_window import sql_timestamp
+from helpers.load_ledger import quote
+from helpers.schema_migrations import MIGRATIONS_DIR, load_migrations, pending_migrations
+from helpers.transaction import transaction
+
+
+class SchemaMigrationOperator(BaseOperator):
+    """
+    Brings the warehouse schema up to date by applying the versioned DDL files in `migrations_path` that have not been
+    applied yet, recording the version and fingerprint of each in the `migrations_table`.
+
+    When nothing is pending the task only reads the migrations table, so it takes no catalog locks and completes almost
+    immediately. Otherwise the pending migrations are applied in one transaction holding a lock on the migrations table,
+    after re-reading what has been applied under that lock, so concurrent runs apply each migration exactly once. A
+    migration whose DDL has changed since it was applied fails the task rather than being silently skipped. The `dialect`
+    param ('redshift' or 'postgres') picks between migrations written for each.
+    """
+    ui_color = '#C8A2C8'
+    exists_sql = """
+        SELECT COUNT(*)
+        FROM information_schema.tables
+        WHERE table_name = '{}'
+    """
+    applied_sql = "SELECT version, fingerprint FROM {}"
+    create_sql = """
+        CREATE TABLE IF NOT EXISTS {}
+        (
+            version     varchar(32)  NOT NULL,
+            name        varchar(256) NOT NULL,
+            fingerprint char(64)     NOT NULL,
+            applied_at  timestamp    NOT NULL
+        )
+    """
+    record_sql = """
+        INSERT INTO {} (version, name, fingerprint, applied_at)
+        VALUES ('{}', '{}', '{}', {})
+    """
+
+    @apply_defaults
+    def __init__(self,
+                 conn_id="redshift",
+                 params=None,
+                 *args,
+                 **kwargs):
+        super(SchemaMigrationOperator, self).__init__(*args, **kwargs)
+
+        if params is None:
+            params = {}
+        self.conn_id = conn_id
+        self.migrations_path = params.get('migrations_path', MIGRATIONS_DIR)
+        self.migrations_table = params.get('migrations_table', 'schema_migrations')
+        self.dialect = params.get('dialect', 'redshift')
+
+    def execute(self, context):
+        redshift = PostgresHook(postgres_conn_id=self.conn_id)
+        migrations = load_migrations(self.migrations_path, self.dialect)
+
+        applied = {}
+        if redshift.get_records(SchemaMigrationOperator.exists_sql.format(self.migrations_table))[0][0]:
+            applied = dict(redshift.get_records(SchemaMigrationOperator.applied_sql.format(self.migrations_table)))
+        if not pending_migrations(migrations, applied):
+            self.log.info(f"Schema is up to date at version {migrations[-1].version if migrations else None}")
+            return []
+
+        return self.migrate(redshift, migrations)
+
+    def migrate(self, redshift, migrations):
+        """
+        Applies the pending migrations in one transaction, under a lock on the migrations table
+        :param redshift: the hook to run the migrations with
+        :param migrations: list of every Migration, in order
+        :return: list of the versions applied
+        """
+        with transaction(redshift) as cursor:
+            cursor.execute(SchemaMigrationOperator.create_sql.format(self.migrations_table))
+            cursor.execute(f"LOCK TABLE {self.migrations_table}")
+            cursor.execute(SchemaMigrationOperator.applied_sql.format(self.migrations_table))
+            pending = pending_migrations(migrations, dict(cursor.fetchall()))
+
+            for migration in pending:
+                self.log.info(f"Applying migration {migration.version} ({migration.name})")
+                cursor.execute(migration.sql)
+                cursor.execute(SchemaMigrationOperator.record_sql.format(
+                    self.migrations_table, migration.version, quote(migration.name), migration.fingerprint,
+                    sql_timestamp(datetime.utcnow())))
+
+        self.log.info(f"Applied {len(pending)} migrations")
+        return [migration.version for migration in pending]
@@ -1,10 +1,21 @@
-from airflow.hooks.postgres_hook import PostgresHook
+import json
+
+from airflow.hooks.S3_hook import S3Hook
+from airflow.hooks.base_hook import BaseHook
 from airflow.models import BaseOperator
 from airflow.utils.decorators import apply_defaults
 
+from helpers.execution_window import PARTITION_SIZES, execution_window, partition_starts, render_keys, \
+    window_predicate
+from helpers.load_ledger import FileLoadLedger, TableLoadLedger, changed_objects
+from helpers.s3_objects import build_manifest, list_objects
+from helpers.s3_stream import S3JsonStreamLoader, parse_jsonpaths
+from helpers.transaction import transaction
+from hooks.instrumented_postgres import InstrumentedPostgresHook
+from sensors.s3_readiness import S3ReadinessSensor
+
 
 class StageToRedshiftOperator(BaseOperator):
-    #TODO: add param for date partitions
     """
     The stage operator is expected to be able to load any JSON formatted files from S3 to Amazon Redshift.
     The operator creates and runs a SQL COPY statement based on the parameters provided. The operator's
@@ -13,15 +24,56 @@ class StageToRedshiftOperator(BaseOperator):
     The parameters should be used to distinguish between JSON file. Another important requirement of the
     stage operator is containing a templated field that allows it to load timestamped files from S3 based on the
     execution time and run backfills.
+
+    By default the whole staging table is cleared and the whole s3_key prefix is copied. With the `partition` param set
+    to 'hour' or 'day', s3_key is rendered once per partition of the run's execution window using the fields from
+    `partition_fields`, e.g. 'log_data/{year}/{month}/{ds}-events.json', and only that slice is replaced: rows whose
+    `partition_column` falls in the partitions are deleted and the partitions are copied in the same transaction.
+
+    With the `ledger` param set to 'table' or 'file', the rendered s3_key prefix is listed and compared against a ledger
+    of the keys, ETags and sizes already loaded into the table (the `ledger_table` in the warehouse, or the JSON lines
+    file at `ledger_path`). Only new objects are copied, through a manifest written to `manifest_bucket` under
+    `manifest_prefix`, and the staging table is appended to rather than cleared. Objects are recorded in the ledger only
+    once the COPY has succeeded, so retries and backfills just pick up whatever has not been loaded yet. An object that
+    changed since it was loaded can't be copied again without duplicating the rows of its earlier load, so it fails the
+    task, or with `on_changed` set to 'warn' is logged and left out of the load.
+
+    If no `iam_role` is given, it is read from the `iam_role` extra of the conn_id connection when the task runs.
+
+    To load a manifest written by another task instead, e.g. the parts from S3CompactionOperator, set `manifest_key` (and
+    `manifest_bucket` if it lives elsewhere); `options` should then include GZIP for compressed parts.
+
+    Setting `backend` to 'postgres' stages into plain Postgres, which can't COPY from S3: the same objects are streamed
+    from S3 by `workers` threads, mapped to columns with the same `json_format` (JSONPaths file or 'auto') and fed to
+    COPY FROM STDIN in batches of at most `batch_bytes`, in one transaction with the same deletes and ledger updates.
+
+    To stage only what downstream loads read, set a `filter` predicate and/or the `columns` to keep. Each load is then
+    copied into a temp table and only the matching rows' projected columns are inserted into the staging table (other
+    columns are left NULL), in the same transaction. The kept and dropped row counts are logged and returned. On
+    Postgres the temp table's columns are all varchar and cast to the table's types as rows are moved, with empty
+    strings in non-text columns read as NULL, so values like the empty userId of logged out events don't fail the COPY.
+
+    When an S3ReadinessSensor gates the task, set `objects_from` to its task id: the objects it found (under the same
+    rendered keys) are pulled from XCom and loaded, through a manifest on Redshift, instead of listing the keys again.
     """
     ui_color = '#358140'
-    template_fields = ("s3_key",)
+    template_fields = ("s3_key", "manifest_key")
+    backends = ('redshift', 'postgres')
+    changed_actions = ('fail', 'warn')
+    text_types = ('character varying', 'character', 'text')
+    columns_sql = """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = '{}' AND table_name = '{}'
+        ORDER BY ordinal_position
+    """
     copy_sql = """
             COPY {}
             FROM '{}'
             IAM_ROLE '{}'
             FORMAT AS JSON '{}'
             {}
+            {}
         """
 
     @apply_defaults
@@ -41,22 +93,315 @@ class StageToRedshiftOperator(BaseOperator):
         self.table = params.get('table', None)
         self.json_format = params.get('json_format', 'auto')
         self.additional_options = params.get('options', '')
+        self.partition = params.get('partition', None)
+        self.partition_column = params.get('partition_column', None)
+        self.partition_column_type = params.get('partition_column_type', 'epoch_ms')
+        self.ledger = params.get('ledger', None)
+        self.ledger_table = params.get('ledger_table', 'stage_load_ledger')
+        self.ledger_path = params.get('ledger_path', None)
+        self.on_changed = params.get('on_changed', 'fail')
+        self.manifest_bucket = params.get('manifest_bucket', self.s3_bucket)
+        self.manifest_prefix = params.get('manifest_prefix', 'manifests')
+        self.manifest_key = params.get('manifest_key', None)
+        self.aws_conn_id = params.get('aws_conn_id', 'aws_default')
+        self.backend = params.get('backend', 'redshift')
+        self.workers = params.get('workers', 4)
+        self.batch_bytes = params.get('batch_bytes', 8 * 1024 * 1024)
+        self.filter = params.get('filter', None)
+        self.columns = params.get('columns', None)
+        self.objects_from = params.get('objects_from', None)
+        self.filtered = bool(self.filter or self.columns)
+        self.copy_table = f"{self.table.split('.')[-1]}_raw" if self.filtered else self.table
+
+        if self.backend not in StageToRedshiftOperator.backends:
+            raise ValueError(f"backend must be one of {StageToRedshiftOperator.backends}, not {self.backend!r}")
+        if self.partition and not self.partition_column:
+            raise ValueError("A partition_column is required to replace a partition of the staging table")
+        if self.ledger not in (None, 'table', 'file'):
+            raise ValueError(f"ledger must be 'table' or 'file', not {self.ledger!r}")
+        if self.ledger == 'file' and not self.ledger_path:
+            raise ValueError("A ledger_path is required for a file ledger")
+        if self.on_changed not in StageToRedshiftOperator.changed_actions:
+            raise ValueError(f"on_changed must be one of {StageToRedshiftOperator.changed_actions}, "
+                             f"not {self.on_changed!r}")
+        if self.ledger and self.partition:
+            raise ValueError("The ledger appends new objects to the staging table and can't be combined with partition")
+        if self.objects_from and self.manifest_key:
+            raise ValueError("A manifest_key lists the objects to load and can't be combined with objects_from")
 
     def execute(self, context):
-        redshift = PostgresHook(postgres_conn_id=self.conn_id)
-        self.log.info("Clearing data from destination Redshift table")
-        redshift.run(f"DELETE FROM {self.table}")
+        redshift = InstrumentedPostgresHook(postgres_conn_id=self.conn_id, context=context)
+        try:
+            if self.backend == 'postgres':
+                return self.stage_streaming(redshift, context)
+            if not self.iam_role:
+                self.iam_role = BaseHook.get_connection(self.conn_id).extra_dejson.get('iam_role')
+            if self.partition:
+                return self.stage_partitions(redshift, context)
+            if self.ledger:
+                return self.stage_new_objects(redshift, context)
+
+            self.log.info("Clearing data from destination Redshift table")
+            statements = [f"DELETE FROM {self.table}"]
+
+            if self.manifest_key:
+                statements.append(self.build_copy_sql(self.manifest_key.format(**context), manifest=True))
+                return self.run_load(redshift, statements)
 
+            objects = self.sensed_objects(context)
+            if objects is not None:
+                if objects:
+                    statements.append(self.build_copy_sql(self.write_manifest(context, objects), manifest=True))
+                return self.run_load(redshift, statements)
+
+            rendered_key = self.s3_key.format(**context)
+            self.log.info(f'context: {context}')
+            self.log.info(f'rendered_key: {rendered_key}')
+            statements.append(self.build_copy_sql(rendered_key))
+            return self.run_load(redshift, statements)
+        finally:
+            redshift.push_metrics()
+
+    def stage_partitions(self, redshift, context):
+        """
+        Replaces the slice of the staging table covered by the run's partitions with a fresh COPY of each partition's
+        key. The delete and the copy run in one transaction, so a retry never leaves a partially loaded slice. When the
+        window spans several partitions, e.g. in a backfill, their objects are listed and loaded by one manifest COPY.
+        :param redshift: the hook to run the statements with
+        :param context: the task context
+        :return: the filter's kept and dropped row counts, if filtering
+        """
+        starts = partition_starts(*execution_window(context), self.partition)
+        slice_start, slice_end = starts[0], starts[-1] + PARTITION_SIZES[self.partition]
+        self.log.info(f"Replacing {self.partition} partitions {slice_start} to {slice_end} of {self.table}")
+
+        statements = [f"DELETE FROM {self.table} WHERE "
+                      f"{window_predicate(self.partition_column, slice_start, slice_end, self.partition_column_type)}"]
+        rendered_keys = render_keys(self.s3_key, context, self.partition)
+        self.log.info(f'rendered_keys: {rendered_keys}')
+        objects = self.sensed_objects(context)
+        if objects is None and len(rendered_keys) == 1:
+            statements.append(self.build_copy_sql(rendered_keys[0]))
+        else:
+            if objects is None:
+                objects = self.list_sources(S3Hook(aws_conn_id=self.aws_conn_id).get_conn(), rendered_keys)
+            self.log.info(f"Found {len(objects)} objects in {len(rendered_keys)} partitions")
+            if objects:
+                statements.append(self.build_copy_sql(self.write_manifest(context, objects), manifest=True))
+        return self.run_load(redshift, statements)
+
+    def stage_new_objects(self, redshift, context):
+        """
+        Copies only the objects under the rendered prefix that the ledger has not seen, via a manifest, and records them
+        in the ledger once the COPY succeeds
+        :param redshift: the hook to run the statements with
+        :param context: the task context
+        :return: the filter's kept and dropped row counts, if filtering
+        """
         rendered_key = self.s3_key.format(**context)
-        self.log.info(f'context: {context}')
-        self.log.info(f'rendered_key: {rendered_key}')
-        s3_path = f"s3://{self.s3_bucket}/{rendered_key}"
-        self.log.info(f"Copying data from {s3_path} to Redshift table {self.table}")
-        formatted_sql = StageToRedshiftOperator.copy_sql.format(
-            self.table,
+        ledger = TableLoadLedger(redshift, self.ledger_table) if self.ledger == 'table' else \
+            FileLoadLedger(self.ledger_path)
+
+        objects = self.sensed_objects(context)
+        if objects is None:
+            objects = self.list_sources(S3Hook(aws_conn_id=self.aws_conn_id).get_conn(), [rendered_key])
+        new_objects = self.unloaded_objects(objects, ledger)
+        self.log.info(f"{len(new_objects)} of {len(objects)} objects under {rendered_key} are new")
+        if not new_objects:
+            return
+
+        manifest_key = self.write_manifest(context, new_objects)
+        counts = self.run_load(redshift, [self.build_copy_sql(manifest_key, manifest=True)] +
+                               ledger.record_statements(self.table, new_objects))
+        ledger.recorded(self.table, new_objects)
+        return counts
+
+    def unloaded_objects(self, objects, ledger):
+        """
+        Compares objects against the ledger. Objects that changed since they were loaded fail the task, or with
+        `on_changed` set to 'warn' are logged and skipped, since copying them again would duplicate their earlier rows.
+        :param objects: list of dicts with the key, etag and size of each object
+        :param ledger: the ledger of objects already loaded
+        :return: list of the objects not loaded yet
+        """
+        new_objects, changed = changed_objects(objects, ledger.loaded(self.table))
+        if changed:
+            keys = ', '.join(obj['key'] for obj in changed[:5]) + (', ...' if len(changed) > 5 else '')
+            message = f"{len(changed)} objects changed since they were loaded into {self.table} ({keys}); copying " \
+                      f"them again would duplicate their earlier rows, so reload the table from scratch instead"
+            if self.on_changed == 'fail':
+                raise ValueError(message)
+            self.log.warning(f"Skipping {message}")
+        return new_objects
+
+    def stage_streaming(self, postgres, context):
+        """
+        Stages into Postgres by streaming the objects each mode would have copied through COPY FROM STDIN: the rendered
+        partitions' objects, the ledger's new objects, the manifest's entries or everything under the rendered prefix
+        :param postgres: the hook to run the statements with
+        :param context: the task context
+        :return: the filter's kept and dropped row counts, if filtering
+        """
+        client = S3Hook(aws_conn_id=self.aws_conn_id).get_conn()
+        statements, ledger, objects = [], None, None
+        sensed = self.sensed_objects(context)
+        if self.partition:
+            starts = partition_starts(*execution_window(context), self.partition)
+            slice_start, slice_end = starts[0], starts[-1] + PARTITION_SIZES[self.partition]
+            predicate = window_predicate(self.partition_column, slice_start, slice_end, self.partition_column_type)
+            statements.append(f"DELETE FROM {self.table} WHERE {predicate}")
+            if sensed is None:
+                sensed = self.list_sources(client, render_keys(self.s3_key, context, self.partition))
+            sources = [(self.s3_bucket, obj['key']) for obj in sensed]
+        elif self.ledger:
+            ledger = TableLoadLedger(postgres, self.ledger_table) if self.ledger == 'table' else \
+                FileLoadLedger(self.ledger_path)
+            if sensed is None:
+                sensed = self.list_sources(client, render_keys(self.s3_key, context))
+            objects = self.unloaded_objects(sensed, ledger)
+            sources = [(self.s3_bucket, obj['key']) for obj in objects]
+        elif self.manifest_key:
+            statements.append(f"DELETE FROM {self.table}")
+            manifest = client.get_object(Bucket=self.manifest_bucket, Key=self.manifest_key.format(**context))
+            urls = [entry['url'] for entry in json.loads(manifest['Body'].read())['entries']]
+            sources = [tuple(url[len('s3://'):].split('/', 1)) for url in urls]
+        else:
+            statements.append(f"DELETE FROM {self.table}")
+            if sensed is None:
+                sensed = self.list_sources(client, render_keys(self.s3_key, context))
+            sources = [(self.s3_bucket, obj['key']) for obj in sensed]
+
+        jsonpaths = None
+        if self.json_format != 'auto':
+            bucket, key = self.json_format[len('s3://'):].split('/', 1)
+            jsonpaths = parse_jsonpaths(client.get_object(Bucket=bucket, Key=key)['Body'].read())
+        schema, _, name = self.table.rpartition('.')
+        column_types = postgres.get_records(StageToRedshiftOperator.columns_sql.format(schema or 'public', name))
+        columns = [column for column, _ in column_types]
+        loader = S3JsonStreamLoader(client, columns, jsonpaths, compressed='GZIP' in self.additional_options.upper(),
+                                    workers=self.workers, batch_bytes=self.batch_bytes)
+
+        self.log.info(f"Streaming {len(sources)} objects from S3 into Postgres table {self.table}")
+        counts = None
+        with transaction(postgres) as cursor:
+            if self.filtered:
+                # Untyped, so values the filter drops, e.g. the empty userId of logged out events, can't fail the COPY
+                raw_columns = ', '.join(f'"{column}" varchar' for column in columns)
+                cursor.execute(f"CREATE TEMP TABLE {self.copy_table} ({raw_columns})")
+            for statement in statements:
+                cursor.execute(statement)
+            rows = loader.copy(cursor, self.copy_table, sources)
+            if ledger:
+                for statement in ledger.record_statements(self.table, objects) if objects else []:
+                    cursor.execute(statement)
+            if self.filtered:
+                counts = self.apply_filter(cursor, column_types)
+        if ledger and objects:
+            ledger.recorded(self.table, objects)
+        self.log.info(f"Streamed {rows} rows into {self.copy_table}")
+        return counts
+
+    def sensed_objects(self, context):
+        """
+        :param context: the task context
+        :return: the objects the `objects_from` sensor found, or None if there is no sensor or it pushed nothing
+        """
+        if not self.objects_from:
+            return None
+        objects = context['ti'].xcom_pull(task_ids=self.objects_from, key=S3ReadinessSensor.xcom_key)
+        if objects is not None:
+            self.log.info(f"Loading the {len(objects)} objects found by {self.objects_from}")
+        return objects
+
+    def list_sources(self, client, rendered_keys):
+        """
+        :param client: a boto3 S3 client
+        :param rendered_keys: the rendered keys to list
+        :return: list of dicts with the key, etag and size of every object under the keys
+        """
+        return [obj for key in rendered_keys for obj in list_objects(client, self.s3_bucket, key)]
+
+    def write_manifest(self, context, objects):
+        """
+        Writes a COPY manifest of exactly the given objects to `manifest_bucket`
+        :param context: the task context
+        :param objects: list of dicts with the key and size of each object
+        :return: the manifest's key
+        """
+        manifest_key = f"{self.manifest_prefix}/{self.table}/{context['ts_nodash']}.manifest"
+        S3Hook(aws_conn_id=self.aws_conn_id).load_string(build_manifest(self.s3_bucket, objects), manifest_key,
+                                                         self.manifest_bucket, replace=True)
+        return manifest_key
+
+    def run_load(self, redshift, statements):
+        """
+        Runs a load's statements, whose COPY targets `copy_table`, in one transaction. When filtering, that is a temp
+        table the raw rows are copied into before only the matching rows' projected columns are moved to the table.
+        :param redshift: the hook to run the statements with
+        :param statements: list of the load's statements
+        :return: the filter's kept and dropped row counts, if filtering
+        """
+        if not self.filtered:
+            redshift.run(statements)
+            return None
+
+        with transaction(redshift) as cursor:
+            cursor.execute(f"CREATE TEMP TABLE {self.copy_table} (LIKE {self.table})")
+            for statement in statements:
+                cursor.execute(statement)
+            return self.apply_filter(cursor)
+
+    def apply_filter(self, cursor, column_types=None):
+        """
+        Moves the rows matching `filter` from the raw temp table into the table, copying only the projected `columns`.
+        An untyped raw table's columns are cast to the table's types first, so the filter compares typed values.
+        :param cursor: the cursor of the load's transaction
+        :param column_types: list of (column, data_type) of the table, if the raw table's columns are all varchar
+        :return: dict of how many rows were kept and dropped
+        """
+        cursor.execute(f"SELECT COUNT(*) FROM {self.copy_table}")
+        total = cursor.fetchone()[0]
+
+        source = self.copy_table
+        if column_types:
+            casts = ', '.join(StageToRedshiftOperator.typed_column(column, data_type)
+                              for column, data_type in column_types)
+            source = f"(SELECT {casts} FROM {self.copy_table}) typed"
+        column_list = ', '.join(f'"{column}"' for column in self.columns) if self.columns else '*'
+        insert_columns = f" ({column_list})" if self.columns else ''
+        where = f" WHERE {self.filter}" if self.filter else ''
+        cursor.execute(f"INSERT INTO {self.table}{insert_columns} SELECT {column_list} FROM {source}{where}")
+        kept = cursor.rowcount
+        cursor.execute(f"DROP TABLE {self.copy_table}")
+
+        self.log.info(f"Kept {kept} and dropped {total - kept} of the {total} rows copied for {self.table}")
+        return {'kept': kept, 'dropped': total - kept}
+
+    @staticmethod
+    def typed_column(column, data_type):
+        """
+        :param column: a column of the untyped raw table
+        :param data_type: the column's type in the table
+        :return: the column cast to its type, reading an empty string as NULL unless it's a text column
+        """
+        if data_type in StageToRedshiftOperator.text_types:
+            return f'"{column}"'
+        return f"CAST(NULLIF(\"{column}\", '') AS {data_type}) AS \"{column}\""
+
+    def build_copy_sql(self, rendered_key, manifest=False):
+        """
+        Builds the COPY statement for a rendered key
+        :param rendered_key: the S3 key or prefix to copy, relative to the bucket
+        :param manifest: True if rendered_key is a manifest in manifest_bucket listing the objects to copy
+        :return: the COPY statement
+        """
+        s3_path = f"s3://{self.manifest_bucket if manifest else self.s3_bucket}/{rendered_key}"
+        self.log.info(f"Copying data from {s3_path} to Redshift table {self.copy_table}")
+        return StageToRedshiftOperator.copy_sql.format(
+            self.copy_table,
             s3_path,
             self.iam_role,
             self.json_format,
+            'MANIFEST' if manifest else '',
             self.additional_options
         )
-        redshift.run(formatted_sql)
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from airflow.exceptions import AirflowSkipException
+from airflow.hooks.postgres_hook import PostgresHook
+from airflow.models import BaseOperator
+from airflow.utils.decorators import apply_defaults
+
+from helpers.execution_window import execution_window, sql_timestamp
+
+
+class WindowCoverageOperator(BaseOperator):
+    """
+    Lets a backfill load a long range of execution dates as a few large windows instead of one run per hour.
+
+    In 'mark' mode, placed at the end of a backfill DAG whose schedule_interval is the window size, the run's whole
+    execution window is recorded in the `coverage_table` once everything upstream has succeeded. In 'check' mode, placed
+    near the start of the regular hourly DAG, the task is skipped (and with it everything downstream) when the run's
+    window falls inside a window that has already been covered, so those runs finish without doing any work.
+    """
+    ui_color = '#E8E8E8'
+    check_sql = """
+        SELECT COUNT(*)
+        FROM {}
+        WHERE window_start <= {}
+            AND window_end >= {}
+    """
+    mark_sql = """
+        INSERT INTO {} (dag_id, window_start, window_end, covered_at)
+        VALUES ('{}', {}, {}, {})
+    """
+    modes = ('check', 'mark')
+
+    @apply_defaults
+    def __init__(self,
+                 conn_id="redshift",
+                 params=None,
+                 *args,
+                 **kwargs):
+        super(WindowCoverageOperator, self).__init__(*args, **kwargs)
+
+        if params is None:
+            params = {}
+        self.conn_id = conn_id
+        self.mode = params.get('mode', 'check')
+        self.coverage_table = params.get('coverage_table', 'etl_window_coverage')
+
+        if self.mode not in WindowCoverageOperator.modes:
+            raise ValueError(f"mode must be one of {WindowCoverageOperator.modes}, not {self.mode!r}")
+
+    def execute(self, context):
+        redshift = PostgresHook(postgres_conn_id=self.conn_id)
+        start, end = execution_window(context)
+        if self.mode == 'mark':
+            self.log.info(f"Marking {start} to {end} as covered")
+            redshift.run(WindowCoverageOperator.mark_sql.format(
+                self.coverage_table, context['dag'].dag_id, sql_timestamp(start), sql_timestamp(end),
+                sql_timestamp(datetime.utcnow())))
+            return
+
+        records = redshift.get_records(WindowCoverageOperator.check_sql.format(
+            self.coverage_table, sql_timestamp(start), sql_timestamp(end)))
+        if records and records[0][0]:
+            raise AirflowSkipException(f"{start} to {end} was already loaded by a backfill")
+        self.log.info(f"{start} to {end} has not been covered by a backfill")
@@ -0,0 +1,5 @@
+from sensors.s3_readiness import S3ReadinessSensor
+
+__all__ = [
+    'S3ReadinessSensor'
+]
@@ -0,0 +1,62 @@
+from fnmatch import fnmatchcase
+
+from airflow.hooks.S3_hook import S3Hook
+from airflow.sensors.base_sensor_operator import BaseSensorOperator
+from airflow.utils.decorators import apply_defaults
+
+from helpers.execution_window import render_keys
+from helpers.s3_objects import list_objects
+
+
+class S3ReadinessSensor(BaseSensorOperator):
+    """
+    Waits for a run's data to land in S3 before it is staged. s3_key is rendered exactly as StageToRedshiftOperator
+    renders it, once per `partition` of the run's execution window if one is given, and the sensor succeeds once every
+    rendered key has at least `min_objects` objects totalling at least `min_bytes`. Only keys matching the optional
+    `key_pattern` (a shell-style wildcard such as '*-events.json') are counted.
+
+    It runs in reschedule mode by default, so it gives up its worker slot between pokes. When it succeeds, the objects
+    it found are pushed to XCom under `xcom_key` as dicts of key, etag and size; point the stage operator's
+    `objects_from` at this task to load exactly those objects without listing the keys again.
+    """
+    ui_color = '#F0EDE4'
+    template_fields = ("s3_key",)
+    xcom_key = 's3_objects'
+
+    @apply_defaults
+    def __init__(self,
+                 params=None,
+                 mode='reschedule',
+                 *args,
+                 **kwargs):
+        super(S3ReadinessSensor, self).__init__(mode=mode, *args, **kwargs)
+
+        if params is None:
+            params = {}
+        self.aws_conn_id = params.get('aws_conn_id', 'aws_default')
+        self.s3_bucket = params.get('s3_bucket', None)
+        self.s3_key = params.get('s3_key', None)
+        self.partition = params.get('partition', None)
+        self.key_pattern = params.get('key_pattern', None)
+        self.min_objects = params.get('min_objects', 1)
+        self.min_bytes = params.get('min_bytes', 0)
+
+        if not self.s3_bucket or not self.s3_key:
+            raise ValueError("An s3_bucket and s3_key are required")
+
+    def poke(self, context):
+        client = S3Hook(aws_conn_id=self.aws_conn_id).get_conn()
+        found, ready = [], True
+        for rendered_key in render_keys(self.s3_key, context, self.partition):
+            objects = [obj for obj in list_objects(client, self.s3_bucket, rendered_key)
+                       if not self.key_pattern or fnmatchcase(obj['key'], self.key_pattern)]
+            size = sum(obj['size'] for obj in objects)
+            self.log.info(f"Found {len(objects)} objects, {size} bytes, under s3://{self.s3_bucket}/{rendered_key}")
+            if len(objects) < self.min_objects or size < self.min_bytes:
+                self.log.info(f"Waiting for at least {self.min_objects} objects and {self.min_bytes} bytes")
+                ready = False
+            found.extend(objects)
+
+        if ready:
+            context['ti'].xcom_push(key=S3ReadinessSensor.xcom_key, value=found)
+        return ready
@@ -0,0 +1,191 @@
+CREATE TABLE IF NOT EXISTS public.events_stage
+(
+    artist          varchar(256),
+    auth            varchar(256),
+    first_name      varchar(256),
+    gender          varchar(256),
+    item_in_session int4,
+    last_name       varchar(256),
+    length          numeric(18, 0),
+    "level"         varchar(256),
+    location        varchar(256),
+    "method"        varchar(256),
+    page            varchar(256),
+    registration    numeric(18, 0),
+    session_id      int4,
+    song            varchar(256),
+    status          int4,
+    ts              int8,
+    user_agent      varchar(256),
+    user_id         int4
+);
+
+CREATE INDEX IF NOT EXISTS events_stage_sortkey_idx ON public.events_stage (ts);
+
+CREATE TABLE IF NOT EXISTS public.songs_stage
+(
+    num_songs        int4,
+    artist_id        varchar(256),
+    artist_name      varchar(256),
+    artist_latitude  numeric(18, 0),
+    artist_longitude numeric(18, 0),
+    artist_location  varchar(256),
+    song_id          varchar(256),
+    title            varchar(256),
+    duration         numeric(18, 0),
+    "year"           int4
+);
+
+CREATE TABLE IF NOT EXISTS public.songplays
+(
+    play_id    varchar(32)  NOT NULL,
+    start_time timestamp    NOT NULL,
+    user_id    int4         NOT NULL,
+    "level"    varchar(256),
+    song_id    varchar(256),
+    artist_id  varchar(256),
+    session_id int4,
+    location   varchar(256),
+    user_agent varchar(256),
+    CONSTRAINT songplays_pkey PRIMARY KEY (play_id)
+);
+
+CREATE INDEX IF NOT EXISTS songplays_sortkey_idx ON public.songplays (start_time);
+
+CREATE TABLE IF NOT EXISTS public.users
+(
+    user_id    int4         NOT NULL,
+    first_name varchar(256),
+    last_name  varchar(256),
+    gender     varchar(256),
+    "level"    varchar(256),
+    CONSTRAINT users_pkey PRIMARY KEY (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS public.songs
+(
+    song_id   varchar(256)   NOT NULL,
+    title     varchar(256),
+    artist_id varchar(256),
+    "year"    int4,
+    duration  numeric(18, 0),
+    CONSTRAINT songs_pkey PRIMARY KEY (song_id)
+);
+
+CREATE TABLE IF NOT EXISTS public.artists
+(
+    artist_id varchar(256)   NOT NULL,
+    name      varchar(256),
+    location  varchar(256),
+    latitude  numeric(18, 0),
+    longitude numeric(18, 0)
+);
+
+CREATE INDEX IF NOT EXISTS artists_sortkey_idx ON public.artists (artist_id);
+
+CREATE TABLE IF NOT EXISTS public."time"
+(
+    start_time timestamp    NOT NULL,
+    "hour"     int4,
+    "day"      int4,
+    week       int4,
+    "month"    varchar(256),
+    "year"     int4,
+    weekday    varchar(256),
+    CONSTRAINT time_pkey PRIMARY KEY (start_time)
+);
+
+CREATE TABLE IF NOT EXISTS public.song_match
+(
+    song_key  char(32)     NOT NULL,
+    song_id   varchar(256) NOT NULL,
+    artist_id varchar(256),
+    CONSTRAINT song_match_pkey PRIMARY KEY (song_key)
+);
+
+CREATE TABLE IF NOT EXISTS public.calendar
+(
+    start_time timestamp    NOT NULL,
+    "hour"     int4,
+    "day"      int4,
+    week       int4,
+    "month"    varchar(256),
+    "year"     int4,
+    weekday    varchar(256),
+    CONSTRAINT calendar_pkey PRIMARY KEY (start_time)
+);
+
+CREATE TABLE IF NOT EXISTS public.stage_load_ledger
+(
+    target_table varchar(256)  NOT NULL,
+    s3_key       varchar(1024) NOT NULL,
+    etag         varchar(64)   NOT NULL,
+    size         int8          NOT NULL,
+    loaded_at    timestamp     NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS stage_load_ledger_sortkey_idx ON public.stage_load_ledger (target_table, loaded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_window_coverage
+(
+    dag_id       varchar(256) NOT NULL,
+    window_start timestamp    NOT NULL,
+    window_end   timestamp    NOT NULL,
+    covered_at   timestamp    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_window_coverage_sortkey_idx ON public.etl_window_coverage (window_start);
+
+CREATE TABLE IF NOT EXISTS public.etl_query_plans
+(
+    dag_id                varchar(256)   NOT NULL,
+    task_id               varchar(256)   NOT NULL,
+    statement_fingerprint char(16)       NOT NULL,
+    plan_fingerprint      char(16)       NOT NULL,
+    total_cost            float8         NOT NULL,
+    plan                  varchar(65535),
+    captured_at           timestamp      NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_query_plans_sortkey_idx ON public.etl_query_plans (dag_id, task_id, captured_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_results
+(
+    dag_id            varchar(256)  NOT NULL,
+    run_id            varchar(256)  NOT NULL,
+    try_number        int4          NOT NULL,
+    check_id          char(16)      NOT NULL,
+    check_name        varchar(1024) NOT NULL,
+    table_fingerprint char(16),
+    passed            boolean       NOT NULL,
+    recorded_at       timestamp     NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_quality_results_sortkey_idx ON public.etl_quality_results (dag_id, run_id, recorded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_snapshots
+(
+    dag_id      varchar(256) NOT NULL,
+    run_id      varchar(256) NOT NULL,
+    table_name  varchar(256) NOT NULL,
+    fingerprint char(16)     NOT NULL,
+    row_count   int8         NOT NULL,
+    max_key     varchar(256),
+    passed      boolean      NOT NULL,
+    recorded_at timestamp    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_quality_snapshots_sortkey_idx ON public.etl_quality_snapshots (dag_id, table_name, recorded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_metrics
+(
+    dag_id       varchar(256) NOT NULL,
+    run_id       varchar(256) NOT NULL,
+    table_name   varchar(256) NOT NULL,
+    column_name  varchar(256),
+    metric       varchar(64)  NOT NULL,
+    metric_value float8       NOT NULL,
+    recorded_at  timestamp    NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS etl_quality_metrics_sortkey_idx ON public.etl_quality_metrics (dag_id, table_name, recorded_at);
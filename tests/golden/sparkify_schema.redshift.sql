@@ -0,0 +1,202 @@
+CREATE TABLE IF NOT EXISTS public.events_stage
+(
+    artist          varchar(256)   ENCODE zstd,
+    auth            varchar(256)   ENCODE zstd,
+    first_name      varchar(256)   ENCODE zstd,
+    gender          varchar(256)   ENCODE zstd,
+    item_in_session int4           ENCODE az64,
+    last_name       varchar(256)   ENCODE zstd,
+    length          numeric(18, 0) ENCODE az64,
+    "level"         varchar(256)   ENCODE zstd,
+    location        varchar(256)   ENCODE zstd,
+    "method"        varchar(256)   ENCODE zstd,
+    page            varchar(256)   ENCODE zstd,
+    registration    numeric(18, 0) ENCODE az64,
+    session_id      int4           ENCODE az64,
+    song            varchar(256)   ENCODE zstd,
+    status          int4           ENCODE az64,
+    ts              int8           ENCODE raw,
+    user_agent      varchar(256)   ENCODE zstd,
+    user_id         int4           ENCODE az64
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (ts);
+
+CREATE TABLE IF NOT EXISTS public.songs_stage
+(
+    num_songs        int4           ENCODE az64,
+    artist_id        varchar(256)   ENCODE zstd,
+    artist_name      varchar(256)   ENCODE zstd,
+    artist_latitude  numeric(18, 0) ENCODE az64,
+    artist_longitude numeric(18, 0) ENCODE az64,
+    artist_location  varchar(256)   ENCODE zstd,
+    song_id          varchar(256)   ENCODE zstd,
+    title            varchar(256)   ENCODE zstd,
+    duration         numeric(18, 0) ENCODE az64,
+    "year"           int4           ENCODE az64
+)
+DISTSTYLE EVEN;
+
+CREATE TABLE IF NOT EXISTS public.songplays
+(
+    play_id    varchar(32)  ENCODE zstd NOT NULL,
+    start_time timestamp    ENCODE raw NOT NULL,
+    user_id    int4         ENCODE az64 NOT NULL,
+    "level"    varchar(256) ENCODE zstd,
+    song_id    varchar(256) ENCODE zstd,
+    artist_id  varchar(256) ENCODE zstd,
+    session_id int4         ENCODE az64,
+    location   varchar(256) ENCODE zstd,
+    user_agent varchar(256) ENCODE zstd,
+    CONSTRAINT songplays_pkey PRIMARY KEY (play_id)
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (start_time);
+
+CREATE TABLE IF NOT EXISTS public.users
+(
+    user_id    int4         ENCODE raw NOT NULL,
+    first_name varchar(256) ENCODE zstd,
+    last_name  varchar(256) ENCODE zstd,
+    gender     varchar(256) ENCODE zstd,
+    "level"    varchar(256) ENCODE zstd,
+    CONSTRAINT users_pkey PRIMARY KEY (user_id)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (user_id);
+
+CREATE TABLE IF NOT EXISTS public.songs
+(
+    song_id   varchar(256)   ENCODE raw NOT NULL,
+    title     varchar(256)   ENCODE zstd,
+    artist_id varchar(256)   ENCODE zstd,
+    "year"    int4           ENCODE az64,
+    duration  numeric(18, 0) ENCODE az64,
+    CONSTRAINT songs_pkey PRIMARY KEY (song_id)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (song_id);
+
+CREATE TABLE IF NOT EXISTS public.artists
+(
+    artist_id varchar(256)   ENCODE raw NOT NULL,
+    name      varchar(256)   ENCODE zstd,
+    location  varchar(256)   ENCODE zstd,
+    latitude  numeric(18, 0) ENCODE az64,
+    longitude numeric(18, 0) ENCODE az64
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (artist_id);
+
+CREATE TABLE IF NOT EXISTS public."time"
+(
+    start_time timestamp    ENCODE raw NOT NULL,
+    "hour"     int4         ENCODE az64,
+    "day"      int4         ENCODE az64,
+    week       int4         ENCODE az64,
+    "month"    varchar(256) ENCODE zstd,
+    "year"     int4         ENCODE az64,
+    weekday    varchar(256) ENCODE zstd,
+    CONSTRAINT time_pkey PRIMARY KEY (start_time)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (start_time);
+
+CREATE TABLE IF NOT EXISTS public.song_match
+(
+    song_key  char(32)     ENCODE raw NOT NULL,
+    song_id   varchar(256) ENCODE zstd NOT NULL,
+    artist_id varchar(256) ENCODE zstd,
+    CONSTRAINT song_match_pkey PRIMARY KEY (song_key)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (song_key);
+
+CREATE TABLE IF NOT EXISTS public.calendar
+(
+    start_time timestamp    ENCODE raw NOT NULL,
+    "hour"     int4         ENCODE az64,
+    "day"      int4         ENCODE az64,
+    week       int4         ENCODE az64,
+    "month"    varchar(256) ENCODE zstd,
+    "year"     int4         ENCODE az64,
+    weekday    varchar(256) ENCODE zstd,
+    CONSTRAINT calendar_pkey PRIMARY KEY (start_time)
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (start_time);
+
+CREATE TABLE IF NOT EXISTS public.stage_load_ledger
+(
+    target_table varchar(256)  ENCODE raw NOT NULL,
+    s3_key       varchar(1024) ENCODE zstd NOT NULL,
+    etag         varchar(64)   ENCODE zstd NOT NULL,
+    size         int8          ENCODE az64 NOT NULL,
+    loaded_at    timestamp     ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (target_table, loaded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_window_coverage
+(
+    dag_id       varchar(256) ENCODE zstd NOT NULL,
+    window_start timestamp    ENCODE raw NOT NULL,
+    window_end   timestamp    ENCODE az64 NOT NULL,
+    covered_at   timestamp    ENCODE az64 NOT NULL
+)
+DISTSTYLE ALL
+COMPOUND SORTKEY (window_start);
+
+CREATE TABLE IF NOT EXISTS public.etl_query_plans
+(
+    dag_id                varchar(256)   ENCODE raw NOT NULL,
+    task_id               varchar(256)   ENCODE zstd NOT NULL,
+    statement_fingerprint char(16)       ENCODE zstd NOT NULL,
+    plan_fingerprint      char(16)       ENCODE zstd NOT NULL,
+    total_cost            float8         ENCODE zstd NOT NULL,
+    plan                  varchar(65535) ENCODE zstd,
+    captured_at           timestamp      ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, task_id, captured_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_results
+(
+    dag_id            varchar(256)  ENCODE raw NOT NULL,
+    run_id            varchar(256)  ENCODE zstd NOT NULL,
+    try_number        int4          ENCODE az64 NOT NULL,
+    check_id          char(16)      ENCODE zstd NOT NULL,
+    check_name        varchar(1024) ENCODE zstd NOT NULL,
+    table_fingerprint char(16)      ENCODE zstd,
+    passed            boolean       ENCODE raw NOT NULL,
+    recorded_at       timestamp     ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, run_id, recorded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_snapshots
+(
+    dag_id      varchar(256) ENCODE raw NOT NULL,
+    run_id      varchar(256) ENCODE zstd NOT NULL,
+    table_name  varchar(256) ENCODE zstd NOT NULL,
+    fingerprint char(16)     ENCODE zstd NOT NULL,
+    row_count   int8         ENCODE az64 NOT NULL,
+    max_key     varchar(256) ENCODE zstd,
+    passed      boolean      ENCODE raw NOT NULL,
+    recorded_at timestamp    ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, table_name, recorded_at);
+
+CREATE TABLE IF NOT EXISTS public.etl_quality_metrics
+(
+    dag_id       varchar(256) ENCODE raw NOT NULL,
+    run_id       varchar(256) ENCODE zstd NOT NULL,
+    table_name   varchar(256) ENCODE zstd NOT NULL,
+    column_name  varchar(256) ENCODE zstd,
+    metric       varchar(64)  ENCODE zstd NOT NULL,
+    metric_value float8       ENCODE zstd NOT NULL,
+    recorded_at  timestamp    ENCODE az64 NOT NULL
+)
+DISTSTYLE EVEN
+COMPOUND SORTKEY (dag_id, table_name, recorded_at);
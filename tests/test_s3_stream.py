@@ -0,0 +1,134 @@
+import json
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'plugins'))
+
+from helpers.s3_stream import S3JsonStreamLoader, compile_jsonpath, extract, iter_documents, \
+    parse_jsonpaths, text_value  # noqa: E402
+
+
+def split_every(data, size):
+    """
+    :param data: the bytes to split
+    :param size: the chunk size
+    :return: list of chunks of at most size bytes
+    """
+    return [data[pos:pos + size] for pos in range(0, len(data), size)]
+
+
+class JsonPathsTest(unittest.TestCase):
+    """
+    Checks that JSONPaths files are read the way Redshift's COPY reads them, and that missing values come out as None.
+    """
+
+    def test_compile_jsonpath(self):
+        cases = {
+            "$['artist']": ['artist'],
+            '$["song"]["title"]': ['song', 'title'],
+            '$.song.title': ['song', 'title'],
+            "$['tags'][0]": ['tags', 0],
+            "$.song['artist name'][ 2 ]": ['song', 'artist name', 2],
+        }
+        for expression, steps in cases.items():
+            with self.subTest(expression=expression):
+                self.assertEqual(compile_jsonpath(expression), steps)
+
+    def test_compile_jsonpath_rejects_invalid_paths(self):
+        for expression in ("['artist']", '$.', '$[artist]', "$['artist'"):
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError):
+                    compile_jsonpath(expression)
+
+    def test_parse_jsonpaths(self):
+        content = json.dumps({'jsonpaths': ["$['artist']", '$.song.title', "$['tags'][1]"]})
+        self.assertEqual(parse_jsonpaths(content), [['artist'], ['song', 'title'], ['tags', 1]])
+
+    def test_extract(self):
+        document = {'artist': 'Muse', 'song': {'title': 'Uprising'}, 'tags': ['rock', 'alt'], 'length': None}
+        cases = [
+            (['artist'], 'Muse'),
+            (['song', 'title'], 'Uprising'),
+            (['tags', 1], 'alt'),
+            (['length'], None),
+            (['missing'], None),
+            (['tags', 5], None),
+            (['artist', 'name'], None),
+            (['artist', 0], 'M'),
+        ]
+        for steps, value in cases:
+            with self.subTest(steps=steps):
+                self.assertEqual(extract(document, steps), value)
+
+    def test_rows_follow_jsonpaths_or_match_columns_by_name(self):
+        document = {'Artist': 'Muse', 'song': {'title': 'Uprising'}}
+        loader = S3JsonStreamLoader(None, ['artist', 'title'], parse_jsonpaths(
+            json.dumps({'jsonpaths': ["$['Artist']", '$.song.title']})))
+        self.assertEqual(list(loader.rows([document])), ['Muse\tUprising\n'])
+        loader = S3JsonStreamLoader(None, ['artist', 'title'])
+        self.assertEqual(list(loader.rows([document])), ['Muse\t\\N\n'])
+
+
+class TextValueTest(unittest.TestCase):
+    """
+    Checks that values are escaped for COPY's text format, so a value can't end its field or row early.
+    """
+
+    def test_text_value(self):
+        cases = [
+            (None, '\\N'),
+            ('', ''),
+            ('\\N', '\\\\N'),
+            ('a\tb', 'a\\tb'),
+            ('a\nb', 'a\\nb'),
+            ('a\r\nb', 'a\\r\\nb'),
+            ('C:\\music', 'C:\\\\music'),
+            ('tab\\t', 'tab\\\\t'),
+            (42, '42'),
+            (1.5, '1.5'),
+            (True, 'true'),
+            ({'a': 'b\tc'}, '{"a": "b\\\\tc"}'),
+            (['x', None], '["x", null]'),
+        ]
+        for value, field in cases:
+            with self.subTest(value=value):
+                self.assertEqual(text_value(value), field)
+
+
+class IterDocumentsTest(unittest.TestCase):
+    """
+    Checks that documents are decoded however the stream is split into chunks, including mid-document and in the middle
+    of a multi-byte character.
+    """
+    documents = [{'artist': 'Sigur Rós', 'tags': ['post-rock']}, {'artist': 'Björk', 'length': 215.5}, {}, [1, 2]]
+
+    def test_newline_delimited_documents_split_across_chunks(self):
+        data = '\n'.join(json.dumps(document, ensure_ascii=False) for document in self.documents).encode('utf-8')
+        for size in range(1, len(data) + 1):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_documents(split_every(data, size))), self.documents)
+
+    def test_concatenated_documents_split_across_chunks(self):
+        data = ''.join(json.dumps(document, ensure_ascii=False) for document in self.documents).encode('utf-8')
+        for size in (1, 2, 3, 7, len(data)):
+            with self.subTest(size=size):
+                self.assertEqual(list(iter_documents(split_every(data, size))), self.documents)
+
+    def test_empty_stream(self):
+        self.assertEqual(list(iter_documents([])), [])
+        self.assertEqual(list(iter_documents([b'\n', b'  '])), [])
+
+    def test_document_too_large(self):
+        data = json.dumps({'lyrics': 'x' * 100}).encode('utf-8')
+        with self.assertRaises(ValueError):
+            list(iter_documents(split_every(data, 10), max_document_bytes=50))
+
+    def test_malformed_document(self):
+        with self.assertRaises(ValueError):
+            list(iter_documents([b'{"artist": "Muse"}\n{"artist": ']))
+
+
+if __name__ == '__main__':
+    unittest.main()
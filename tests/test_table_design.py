@@ -0,0 +1,38 @@
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'plugins'))
+
+from helpers.sparkify_tables import SPARKIFY_TABLES  # noqa: E402
+from helpers.table_design import DIALECTS, schema_ddl  # noqa: E402
+
+GOLDEN_DIR = os.path.join(ROOT, 'tests', 'golden')
+
+
+class SchemaDdlTest(unittest.TestCase):
+    """
+    Compares the DDL rendered from SPARKIFY_TABLES with the reviewed golden files, so a change to a table's layout shows
+    up as a diff of its DDL. After an intended change, regenerate them with UPDATE_GOLDEN=1 and review the diff.
+    """
+
+    def test_schema_ddl_matches_golden(self):
+        for dialect in DIALECTS:
+            with self.subTest(dialect=dialect):
+                path = os.path.join(GOLDEN_DIR, f"sparkify_schema.{dialect}.sql")
+                ddl = schema_ddl(SPARKIFY_TABLES, dialect)
+                if os.environ.get('UPDATE_GOLDEN'):
+                    with open(path, 'w') as golden_file:
+                        golden_file.write(ddl)
+                with open(path) as golden_file:
+                    self.assertEqual(golden_file.read(), ddl)
+
+    def test_schema_ddl_is_deterministic(self):
+        for dialect in DIALECTS:
+            with self.subTest(dialect=dialect):
+                self.assertEqual(schema_ddl(SPARKIFY_TABLES, dialect), schema_ddl(SPARKIFY_TABLES, dialect))
+
+
+if __name__ == '__main__':
+    unittest.main()